@@ -0,0 +1,29 @@
+"""users.ledger_version
+
+Versão do extrato de cada usuário (app/db/ledger.py), chave dos caches
+de análises derivadas.
+
+Revision ID: 5f2c869d76a5
+Revises: 8184d9881e5d
+Create Date: 2026-10-19 09:10:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '5f2c869d76a5'
+down_revision: Union[str, None] = '8184d9881e5d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('users', sa.Column('ledger_version', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('users') as batch_op:
+        batch_op.drop_column('ledger_version')
@@ -0,0 +1,42 @@
+"""chat sessions in ai_chat_history
+
+Sessão de conversa carregada no servidor: id da sessão, posição do turno
+e resumo dos turnos antigos. (session_id, turn_index) é único: de dois
+turnos simultâneos na mesma sessão só o primeiro é gravado.
+
+Revision ID: f70697f2154b
+Revises: 5f2c869d76a5
+Create Date: 2026-10-19 09:20:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = 'f70697f2154b'
+down_revision: Union[str, None] = '5f2c869d76a5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table('ai_chat_history') as batch_op:
+        batch_op.add_column(sa.Column('session_id', postgresql.UUID(as_uuid=True), nullable=True))
+        batch_op.add_column(sa.Column('turn_index', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('context_summary', sa.Text(), nullable=True))
+        batch_op.add_column(sa.Column('summary_until_turn', sa.Integer(), nullable=True))
+        batch_op.create_index('ix_ai_chat_history_session_id', ['session_id'])
+        batch_op.create_unique_constraint('uq_ai_chat_history_session_turn', ['session_id', 'turn_index'])
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('ai_chat_history') as batch_op:
+        batch_op.drop_constraint('uq_ai_chat_history_session_turn', type_='unique')
+        batch_op.drop_index('ix_ai_chat_history_session_id')
+        batch_op.drop_column('summary_until_turn')
+        batch_op.drop_column('context_summary')
+        batch_op.drop_column('turn_index')
+        batch_op.drop_column('session_id')
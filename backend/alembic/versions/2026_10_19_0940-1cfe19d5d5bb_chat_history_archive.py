@@ -0,0 +1,48 @@
+"""chat history keyset index and ai_chat_archive
+
+Índice (user_id, created_at, id) para paginar o histórico por chave e
+tabela de conversas arquivadas pelo job de retenção.
+
+Revision ID: 1cfe19d5d5bb
+Revises: 67830e6e40f2
+Create Date: 2026-10-19 09:40:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = '1cfe19d5d5bb'
+down_revision: Union[str, None] = '67830e6e40f2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_ai_chat_history_user_created', 'ai_chat_history', ['user_id', 'created_at', 'id'])
+
+    op.create_table(
+        'ai_chat_archive',
+        sa.Column('id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('user_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('session_id', postgresql.UUID(as_uuid=True), nullable=True),
+        sa.Column('started_at', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('ended_at', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('turn_count', sa.Integer(), nullable=False),
+        sa.Column('payload', sa.LargeBinary(), nullable=False),
+        sa.Column('archived_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_ai_chat_archive_session_id', 'ai_chat_archive', ['session_id'])
+    op.create_index('ix_ai_chat_archive_user_ended', 'ai_chat_archive', ['user_id', 'ended_at', 'id'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_ai_chat_archive_user_ended', table_name='ai_chat_archive')
+    op.drop_index('ix_ai_chat_archive_session_id', table_name='ai_chat_archive')
+    op.drop_table('ai_chat_archive')
+    op.drop_index('ix_ai_chat_history_user_created', table_name='ai_chat_history')
@@ -0,0 +1,64 @@
+"""projection branches and overrides
+
+Variações de cenário (projections.parent_id) e overrides sobre os itens
+herdados. Nesta etapa os itens ainda estão em `transactions`; a revisão
+seguinte os move para `projection_items` e troca a FK de item_id. A FK tem
+o nome padrão do Postgres para bater com bases criadas por create_all.
+
+Revision ID: 9f883a865af8
+Revises: 7f7c56f1df88
+Create Date: 2026-10-19 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = '9f883a865af8'
+down_revision: Union[str, None] = '7f7c56f1df88'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table('projections') as batch_op:
+        batch_op.add_column(sa.Column('parent_id', postgresql.UUID(as_uuid=True), nullable=True))
+        batch_op.create_foreign_key(
+            'projections_parent_id_fkey', 'projections', ['parent_id'], ['id'], ondelete='CASCADE'
+        )
+        batch_op.create_index('ix_projections_parent_id', ['parent_id'])
+
+    op.create_table(
+        'projection_overrides',
+        sa.Column('id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('projection_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('item_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('action', sa.String(), nullable=False),
+        sa.Column('date', sa.Date(), nullable=True),
+        sa.Column('description', sa.Text(), nullable=True),
+        sa.Column('amount', sa.Numeric(10, 2), nullable=True),
+        sa.Column('category_id', postgresql.UUID(as_uuid=True), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+        sa.ForeignKeyConstraint(['category_id'], ['categories.id'], ondelete='SET NULL'),
+        sa.ForeignKeyConstraint(
+            ['item_id'], ['transactions.id'], name='projection_overrides_item_id_fkey', ondelete='CASCADE'
+        ),
+        sa.ForeignKeyConstraint(['projection_id'], ['projections.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('projection_id', 'item_id', name='uq_projection_overrides_projection_item'),
+    )
+    op.create_index('ix_projection_overrides_projection_id', 'projection_overrides', ['projection_id'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_projection_overrides_projection_id', table_name='projection_overrides')
+    op.drop_table('projection_overrides')
+
+    with op.batch_alter_table('projections') as batch_op:
+        batch_op.drop_index('ix_projections_parent_id')
+        batch_op.drop_constraint('projections_parent_id_fkey', type_='foreignkey')
+        batch_op.drop_column('parent_id')
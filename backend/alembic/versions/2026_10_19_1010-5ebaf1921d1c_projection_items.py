@@ -0,0 +1,89 @@
+"""projection_items
+
+Move os itens de projeção de `transactions` para `projection_items`, para
+as consultas do extrato real não varrerem dados simulados. Os ids são
+preservados e a FK de projection_overrides.item_id passa a apontar para a
+tabela nova antes de as linhas saírem de `transactions` (senão o ON DELETE
+CASCADE levaria os overrides junto). O downgrade faz o caminho inverso na
+mesma ordem, devolvendo is_manual e mantendo os overrides.
+
+Revision ID: 5ebaf1921d1c
+Revises: 9f883a865af8
+Create Date: 2026-10-19 10:10:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = '5ebaf1921d1c'
+down_revision: Union[str, None] = '9f883a865af8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+COLUMNS = ("id", "user_id", "projection_id", "date", "description", "amount",
+           "category_id", "is_manual", "created_at", "updated_at")
+
+# Tabelas "leves": não dependem dos modelos, que podem mudar depois
+transactions = sa.table(
+    "transactions",
+    *(sa.column(name) for name in COLUMNS),
+    sa.column("is_projection", sa.Boolean),
+)
+projection_items = sa.table("projection_items", *(sa.column(name) for name in COLUMNS))
+
+
+def _point_overrides_to(target: str) -> None:
+    with op.batch_alter_table('projection_overrides') as batch_op:
+        batch_op.drop_constraint('projection_overrides_item_id_fkey', type_='foreignkey')
+        batch_op.create_foreign_key(
+            'projection_overrides_item_id_fkey', target, ['item_id'], ['id'], ondelete='CASCADE'
+        )
+
+
+def upgrade() -> None:
+    op.create_table(
+        'projection_items',
+        sa.Column('id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('user_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('projection_id', postgresql.UUID(as_uuid=True), nullable=True),
+        sa.Column('date', sa.Date(), nullable=False),
+        sa.Column('description', sa.Text(), nullable=False),
+        sa.Column('amount', sa.Numeric(10, 2), nullable=False),
+        sa.Column('category_id', postgresql.UUID(as_uuid=True), nullable=True),
+        sa.Column('is_manual', sa.Boolean(), server_default=sa.true(), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+        sa.ForeignKeyConstraint(['category_id'], ['categories.id'], ondelete='SET NULL'),
+        sa.ForeignKeyConstraint(['projection_id'], ['projections.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_projection_items_user_id', 'projection_items', ['user_id'])
+    op.create_index('ix_projection_items_projection_date', 'projection_items', ['projection_id', 'date'])
+
+    # is_manual era anulável em transactions
+    source = sa.select(
+        *(transactions.c[name] for name in COLUMNS if name != "is_manual"),
+        sa.func.coalesce(transactions.c.is_manual, sa.true()),
+    ).where(transactions.c.is_projection == sa.true())
+    op.execute(
+        sa.insert(projection_items).from_select(
+            [name for name in COLUMNS if name != "is_manual"] + ["is_manual"], source
+        )
+    )
+    _point_overrides_to('projection_items')
+    op.execute(sa.delete(transactions).where(transactions.c.is_projection == sa.true()))
+
+
+def downgrade() -> None:
+    source = sa.select(*(projection_items.c[name] for name in COLUMNS), sa.true())
+    op.execute(sa.insert(transactions).from_select([*COLUMNS, "is_projection"], source))
+    _point_overrides_to('transactions')
+
+    op.drop_index('ix_projection_items_projection_date', table_name='projection_items')
+    op.drop_index('ix_projection_items_user_id', table_name='projection_items')
+    op.drop_table('projection_items')
@@ -1,28 +1,135 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from typing import List
+import json
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional, Tuple
+from uuid import UUID
 from datetime import datetime
 
 from app.db.session import get_db
-from app.core.deps import get_current_user
-from app.models.user import User
-from app.models.ai_chat import AIChatHistory
-from app.models.transaction import Transaction
+from app.db.ledger import get_ledger_version
+from app.core.deps import get_current_user, get_read_db
+from app.core.principal import Principal
+from app.models.ai_chat import AIChatHistory, AIChatArchive
 from app.services.llm_service import llm_service
-from app.schemas.ai_chat import ChatRequest, ChatResponse, AIChatHistoryResponse
+from app.services.context_service import context_builder
+from app.services.conversation_service import (
+    ConversationContext,
+    conversation_manager,
+    estimate_tokens,
+    MESSAGE_OVERHEAD_TOKENS
+)
+from app.services.chat_history import history_page, archive_page, decompress_turns
+from app.schemas.ai_chat import (
+    ChatRequest,
+    ChatResponse,
+    AIChatHistoryResponse,
+    AIChatHistoryPage,
+    AIChatArchivePage,
+    AIChatArchiveSummary,
+    AIChatArchiveDetail
+)
 
 router = APIRouter()
 
 
+def _sse(event: str, data: dict) -> str:
+    """Formata um evento Server-Sent Events"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+
+
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "X-Accel-Buffering": "no",  # Não deixar proxy (nginx) bufferizar o stream
+}
+
+
+async def _prepare_conversation(
+    db: AsyncSession,
+    user_id,
+    chat_request: ChatRequest,
+    financial_context: str
+) -> ConversationContext:
+    """
+    Carrega a sessão (ou inicia uma nova com o histórico do cliente) e corta
+    o histórico para caber no orçamento de tokens do prompt.
+    """
+    client_history = [
+        {"role": msg.role, "content": msg.content}
+        for msg in chat_request.conversation_history or []
+    ]
+    conversation = await conversation_manager.load(
+        db, user_id, chat_request.session_id, client_history
+    )
+    if conversation is None:
+        archived = (await db.execute(
+            select(AIChatArchive.id).where(
+                AIChatArchive.user_id == user_id,
+                AIChatArchive.session_id == chat_request.session_id
+            ).limit(1)
+        )).first()
+        if archived:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Sessão arquivada é somente leitura; inicie uma nova sessão"
+            )
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Sessão de chat não encontrada"
+        )
+
+    reserved = (
+        estimate_tokens(llm_service.system_prompt(financial_context))
+        + estimate_tokens(chat_request.message)
+        + 2 * MESSAGE_OVERHEAD_TOKENS
+    )
+    return conversation_manager.fit(conversation, reserved)
+
+
+async def _save_turn(
+    db: AsyncSession,
+    user_id,
+    message: str,
+    response: str,
+    conversation: ConversationContext
+) -> AIChatHistory:
+    chat_history = AIChatHistory(
+        user_id=user_id,
+        message=message,
+        response=response,
+        model=llm_service.model,
+        session_id=conversation.session_id,
+        turn_index=conversation.turn_index,
+        context_summary=conversation_manager.summary_for_storage(conversation),
+        summary_until_turn=conversation.summary_until_turn
+    )
+    db.add(chat_history)
+    try:
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Outro turno desta sessão foi gravado ao mesmo tempo; envie a mensagem de novo"
+        )
+    return chat_history
+
+
 @router.post("/chat", response_model=ChatResponse)
 async def chat_with_ai(
     chat_request: ChatRequest,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+    read_db: AsyncSession = Depends(get_read_db)
 ):
     """
     Chat com LLM sobre dados financeiros.
     O LLM tem contexto das transações do usuário.
+
+    Sessões movidas para o arquivo pelo job de retenção são somente
+    leitura: continuar uma delas retorna 409.
     """
     try:
         # Verificar disponibilidade do LLM
@@ -32,33 +139,27 @@ async def chat_with_ai(
                 detail="Serviço de IA não disponível. Certifique-se de que o Ollama está rodando."
             )
 
-        # Preparar histórico de conversação
-        conversation_history = []
-        if chat_request.conversation_history:
-            conversation_history = [
-                {"role": msg.role, "content": msg.content}
-                for msg in chat_request.conversation_history
-            ]
+        # Resumo financeiro na réplica; sessão e histórico no primário
+        financial_context = await context_builder.build(read_db, current_user.id)
+        # Preparar histórico de conversação (sessão + orçamento de tokens)
+        conversation = await _prepare_conversation(db, current_user.id, chat_request, financial_context)
 
-        # Obter resposta do LLM
+        # Obter resposta do LLM, com o resumo financeiro como contexto
         response = await llm_service.chat(
             message=chat_request.message,
-            conversation_history=conversation_history
+            conversation_history=conversation.history,
+            user_id=str(current_user.id),
+            financial_context=financial_context,
+            conversation_summary=conversation.summary
         )
 
         # Salvar no histórico
-        chat_history = AIChatHistory(
-            user_id=current_user.id,
-            message=chat_request.message,
-            response=response,
-            model=llm_service.model
-        )
-        db.add(chat_history)
-        db.commit()
+        await _save_turn(db, current_user.id, chat_request.message, response, conversation)
 
         return {
             "message": response,
-            "timestamp": datetime.utcnow()
+            "timestamp": datetime.utcnow(),
+            "session_id": conversation.session_id
         }
 
     except HTTPException:
@@ -70,11 +171,25 @@ async def chat_with_ai(
         )
 
 
+async def _analysis_context(db: AsyncSession, read_db: AsyncSession, user_id: UUID) -> Tuple[str, int]:
+    """
+    Resumo financeiro e versão do extrato para o cache de respostas.
+
+    A versão vem do primário. Se a réplica ainda não chegou nela, o resumo
+    também sai do primário: senão uma resposta calculada sobre o extrato
+    antigo ficaria em cache com a versão nova.
+    """
+    version = await get_ledger_version(db, user_id)
+    source = read_db if await get_ledger_version(read_db, user_id) >= version else db
+    return await context_builder.build(source, user_id), version
+
+
 @router.post("/analyze")
 async def analyze_transactions(
     question: str,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+    read_db: AsyncSession = Depends(get_read_db)
 ):
     """
     Análise de transações com pergunta específica.
@@ -87,48 +202,14 @@ async def analyze_transactions(
                 detail="Serviço de IA não disponível"
             )
 
-        # Buscar transações do usuário (últimos 3 meses)
-        from datetime import date, timedelta
-        three_months_ago = date.today() - timedelta(days=90)
-
-        transactions = db.query(Transaction).filter(
-            Transaction.user_id == current_user.id,
-            Transaction.is_projection == False,
-            Transaction.date >= three_months_ago
-        ).all()
-
-        # Criar resumo das transações
-        if not transactions:
-            summary = "Nenhuma transação registrada nos últimos 3 meses."
-        else:
-            total_income = sum(t.amount for t in transactions if t.amount > 0)
-            total_expenses = sum(abs(t.amount) for t in transactions if t.amount < 0)
-
-            # Agrupar por categoria
-            by_category = {}
-            for t in transactions:
-                cat_name = t.category.name if t.category else "Sem categoria"
-                if cat_name not in by_category:
-                    by_category[cat_name] = {"count": 0, "total": 0}
-                by_category[cat_name]["count"] += 1
-                by_category[cat_name]["total"] += abs(t.amount)
-
-            summary = f"""
-RESUMO FINANCEIRO (Últimos 3 meses):
-- Total de transações: {len(transactions)}
-- Receitas totais: R$ {total_income:.2f}
-- Despesas totais: R$ {total_expenses:.2f}
-- Saldo: R$ {total_income - total_expenses:.2f}
-
-GASTOS POR CATEGORIA:
-"""
-            for cat, data in sorted(by_category.items(), key=lambda x: x[1]["total"], reverse=True):
-                summary += f"- {cat}: R$ {data['total']:.2f} ({data['count']} transações)\n"
-
-        # Obter análise do LLM
+        summary, ledger_version = await _analysis_context(db, read_db, current_user.id)
+
+        # Obter análise do LLM (perguntas repetidas com o extrato inalterado vêm do cache)
         response = await llm_service.analyze_transactions(
             transactions_summary=summary,
-            user_question=question
+            user_question=question,
+            user_id=str(current_user.id),
+            ledger_version=ledger_version
         )
 
         return {
@@ -146,18 +227,239 @@ GASTOS POR CATEGORIA:
         )
 
 
-@router.get("/chat/history", response_model=List[AIChatHistoryResponse])
+@router.post("/chat/stream")
+async def chat_with_ai_stream(
+    chat_request: ChatRequest,
+    request: Request,
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+    read_db: AsyncSession = Depends(get_read_db)
+):
+    """
+    Chat com LLM em streaming (Server-Sent Events).
+
+    Eventos:
+    - token: {"content": "..."} a cada pedaço gerado
+    - done: {"message": "<resposta completa>", "timestamp": ..., "session_id": ...}
+    - error: {"detail": "..."}
+
+    Se o cliente desconectar, a geração é interrompida e nada é salvo.
+    O histórico só é gravado quando a resposta termina. Sessões arquivadas
+    são somente leitura (409), como em /chat.
+    """
+    if not llm_service.check_availability():
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Serviço de IA não disponível. Certifique-se de que o Ollama está rodando."
+        )
+
+    financial_context = await context_builder.build(read_db, current_user.id)
+    conversation = await _prepare_conversation(db, current_user.id, chat_request, financial_context)
+
+    async def event_stream():
+        chunks = []
+        completed = False
+        tokens = llm_service.chat_stream(
+            message=chat_request.message,
+            conversation_history=conversation.history,
+            user_id=str(current_user.id),
+            financial_context=financial_context,
+            conversation_summary=conversation.summary
+        )
+        try:
+            async for token in tokens:
+                if await request.is_disconnected():
+                    break
+                chunks.append(token)
+                yield _sse("token", {"content": token})
+            else:
+                completed = True
+        except Exception as e:
+            yield _sse("error", {"detail": f"Erro ao processar chat: {str(e)}"})
+        finally:
+            await tokens.aclose()
+
+        if not completed:
+            return
+
+        response = "".join(chunks)
+        try:
+            await _save_turn(db, current_user.id, chat_request.message, response, conversation)
+        except HTTPException as e:
+            yield _sse("error", {"detail": e.detail})
+            return
+
+        yield _sse("done", {
+            "message": response,
+            "timestamp": datetime.utcnow(),
+            "session_id": conversation.session_id
+        })
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+
+@router.post("/analyze/stream")
+async def analyze_transactions_stream(
+    question: str,
+    request: Request,
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+    read_db: AsyncSession = Depends(get_read_db)
+):
+    """
+    Análise de transações em streaming (Server-Sent Events).
+    Mesmos eventos de /chat/stream; o evento done traz a resposta completa.
+    """
+    if not llm_service.check_availability():
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Serviço de IA não disponível"
+        )
+
+    summary, ledger_version = await _analysis_context(db, read_db, current_user.id)
+
+    async def event_stream():
+        chunks = []
+        completed = False
+        tokens = llm_service.analyze_stream(
+            transactions_summary=summary,
+            user_question=question,
+            user_id=str(current_user.id),
+            ledger_version=ledger_version
+        )
+        try:
+            async for token in tokens:
+                if await request.is_disconnected():
+                    break
+                chunks.append(token)
+                yield _sse("token", {"content": token})
+            else:
+                completed = True
+        except Exception as e:
+            yield _sse("error", {"detail": f"Erro ao analisar: {str(e)}"})
+        finally:
+            await tokens.aclose()
+
+        if completed:
+            yield _sse("done", {
+                "question": question,
+                "answer": "".join(chunks),
+                "timestamp": datetime.utcnow()
+            })
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+
+@router.get("/chat/history", response_model=AIChatHistoryPage)
 async def get_chat_history(
-    limit: int = 50,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Histórico de conversas com a IA, mais recentes primeiro.
+    Paginação por cursor (`next_cursor`) e só prévias dos textos.
+    """
+    try:
+        return await history_page(db, current_user.id, limit, cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+
+@router.get("/chat/history/{chat_id}", response_model=AIChatHistoryResponse)
+async def get_chat_turn(
+    chat_id: UUID,
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
-    """Retorna histórico de conversas com a IA"""
-    history = db.query(AIChatHistory).filter(
-        AIChatHistory.user_id == current_user.id
-    ).order_by(AIChatHistory.created_at.desc()).limit(limit).all()
+    """Texto completo de um turno do histórico"""
+    turn = (await db.execute(
+        select(AIChatHistory).where(
+            AIChatHistory.id == chat_id,
+            AIChatHistory.user_id == current_user.id
+        )
+    )).scalar_one_or_none()
 
-    return history
+    if not turn:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Mensagem não encontrada"
+        )
+
+    return turn
+
+
+@router.get("/chat/archive", response_model=AIChatArchivePage)
+async def get_chat_archive(
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Conversas antigas movidas para o arquivo pelo job de retenção"""
+    try:
+        return await archive_page(db, current_user.id, limit, cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+
+@router.get("/chat/archive/{archive_id}", response_model=AIChatArchiveDetail)
+async def get_archived_chat(
+    archive_id: UUID,
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Turnos de uma conversa arquivada"""
+    archive = (await db.execute(
+        select(AIChatArchive).where(
+            AIChatArchive.id == archive_id,
+            AIChatArchive.user_id == current_user.id
+        )
+    )).scalar_one_or_none()
+
+    if not archive:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Conversa arquivada não encontrada"
+        )
+
+    summary = AIChatArchiveSummary.model_validate(archive).model_dump()
+    return {**summary, "turns": decompress_turns(archive.payload)}
+
+
+@router.get("/chat/sessions/{session_id}", response_model=List[AIChatHistoryResponse])
+async def get_chat_session(
+    session_id: UUID,
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Retorna os turnos de uma sessão de chat, em ordem"""
+    turns = (await db.execute(
+        select(AIChatHistory).where(
+            AIChatHistory.user_id == current_user.id,
+            AIChatHistory.session_id == session_id
+        ).order_by(AIChatHistory.turn_index)
+    )).scalars().all()
+
+    if turns:
+        return turns
+
+    # Sessão antiga: pode ter ido para o arquivo
+    archive = (await db.execute(
+        select(AIChatArchive).where(
+            AIChatArchive.user_id == current_user.id,
+            AIChatArchive.session_id == session_id
+        ).limit(1)
+    )).scalar_one_or_none()
+
+    if not archive:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Sessão de chat não encontrada"
+        )
+
+    return [{**turn, "session_id": session_id} for turn in decompress_turns(archive.payload)]
 
 
 @router.get("/status")
@@ -168,5 +470,12 @@ async def get_ai_status():
     return {
         "available": available,
         "model": llm_service.model if available else None,
-        "message": "Serviço de IA disponível" if available else "Ollama não está rodando"
+        "message": "Serviço de IA disponível" if available else "Ollama não está rodando",
+        "health": llm_service.health.snapshot(),
+        "model_load": llm_service.warmer.snapshot(),
+        "queue": {
+            "in_flight": llm_service.scheduler.in_flight,
+            "max_in_flight": llm_service.scheduler.max_in_flight,
+            "queue_depth": llm_service.scheduler.queue_depth()
+        }
     }
@@ -1,23 +1,56 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import timedelta
 
 from app.db.session import get_db
 from app.core.deps import get_current_user
-from app.core.security import verify_password, get_password_hash, create_access_token
+from app.core.principal import Principal
+from app.core.security import create_access_token
 from app.core.config import settings
 from app.models.user import User
 from app.schemas.user import UserCreate, UserResponse, UserLogin, Token
+from app.services.password_hasher import password_hasher, PasswordHasherSaturated
 
 router = APIRouter()
 
 
+async def _hash_or_429(coroutine):
+    """Aguarda o pool de bcrypt; 429 quando a fila está cheia"""
+    try:
+        return await coroutine
+    except PasswordHasherSaturated:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many authentication requests, try again shortly",
+            headers={"Retry-After": "1"},
+        )
+
+
+async def _authenticate(db: AsyncSession, email: str, password: str) -> User:
+    """Confere email/senha e refaz o hash se o custo do bcrypt mudou"""
+    user = (await db.execute(select(User).where(User.email == email))).scalar_one_or_none()
+    valid = False
+    if user:
+        valid, new_hash = await _hash_or_429(password_hasher.verify(password, user.hashed_password))
+        if valid and new_hash:
+            user.hashed_password = new_hash
+            await db.commit()
+    if not valid:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Incorrect email or password",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return user
+
+
 @router.post("/register", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
-async def register(user_data: UserCreate, db: Session = Depends(get_db)):
+async def register(user_data: UserCreate, db: AsyncSession = Depends(get_db)):
     """Registrar novo usuário"""
     # Verificar se email já existe
-    existing_user = db.query(User).filter(User.email == user_data.email).first()
+    existing_user = (await db.execute(select(User).where(User.email == user_data.email))).scalar_one_or_none()
     if existing_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -25,7 +58,7 @@ async def register(user_data: UserCreate, db: Session = Depends(get_db)):
         )
 
     # Criar novo usuário
-    hashed_password = get_password_hash(user_data.password)
+    hashed_password = await _hash_or_429(password_hasher.hash(user_data.password))
     new_user = User(
         email=user_data.email,
         name=user_data.name,
@@ -33,23 +66,16 @@ async def register(user_data: UserCreate, db: Session = Depends(get_db)):
     )
 
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await db.commit()
+    await db.refresh(new_user)
 
     return new_user
 
 
 @router.post("/login", response_model=Token)
-async def login(user_data: UserLogin, db: Session = Depends(get_db)):
+async def login(user_data: UserLogin, db: AsyncSession = Depends(get_db)):
     """Login e retornar token JWT"""
-    # Buscar usuário
-    user = db.query(User).filter(User.email == user_data.email).first()
-    if not user or not verify_password(user_data.password, user.hashed_password):
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Incorrect email or password",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
+    user = await _authenticate(db, user_data.email, user_data.password)
 
     # Criar token
     access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
@@ -64,16 +90,10 @@ async def login(user_data: UserLogin, db: Session = Depends(get_db)):
 @router.post("/login/form", response_model=Token)
 async def login_form(
     form_data: OAuth2PasswordRequestForm = Depends(),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Login com OAuth2PasswordRequestForm (para Swagger UI)"""
-    user = db.query(User).filter(User.email == form_data.username).first()
-    if not user or not verify_password(form_data.password, user.hashed_password):
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Incorrect email or password",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
+    user = await _authenticate(db, form_data.username, form_data.password)
 
     access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
@@ -85,6 +105,6 @@ async def login_form(
 
 
 @router.get("/me", response_model=UserResponse)
-async def get_current_user_info(current_user: User = Depends(get_current_user)):
+async def get_current_user_info(current_user: Principal = Depends(get_current_user)):
     """Obter informações do usuário autenticado"""
     return current_user
@@ -1,10 +1,11 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from uuid import UUID
 
 from app.db.session import get_db
 from app.core.deps import get_current_user
-from app.models.user import User
+from app.core.principal import Principal
 from app.models.category import Category
 from app.schemas.category import CategoryCreate, CategoryUpdate, CategoryResponse
 
@@ -13,13 +14,15 @@ router = APIRouter()
 
 @router.get("/", response_model=list[CategoryResponse])
 async def list_categories(
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
     """Listar todas as categorias do usuário"""
-    categories = db.query(Category).filter(
-        Category.user_id == current_user.id
-    ).order_by(Category.name).all()
+    categories = (await db.execute(
+        select(Category).where(
+            Category.user_id == current_user.id
+        ).order_by(Category.name)
+    )).scalars().all()
 
     return categories
 
@@ -27,14 +30,16 @@ async def list_categories(
 @router.get("/{category_id}", response_model=CategoryResponse)
 async def get_category(
     category_id: UUID,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
     """Obter categoria por ID"""
-    category = db.query(Category).filter(
-        Category.id == category_id,
-        Category.user_id == current_user.id
-    ).first()
+    category = (await db.execute(
+        select(Category).where(
+            Category.id == category_id,
+            Category.user_id == current_user.id
+        )
+    )).scalar_one_or_none()
 
     if not category:
         raise HTTPException(
@@ -48,8 +53,8 @@ async def get_category(
 @router.post("/", response_model=CategoryResponse, status_code=status.HTTP_201_CREATED)
 async def create_category(
     category_data: CategoryCreate,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
     """Criar nova categoria"""
     new_category = Category(
@@ -58,8 +63,8 @@ async def create_category(
     )
 
     db.add(new_category)
-    db.commit()
-    db.refresh(new_category)
+    await db.commit()
+    await db.refresh(new_category)
 
     return new_category
 
@@ -68,14 +73,16 @@ async def create_category(
 async def update_category(
     category_id: UUID,
     category_data: CategoryUpdate,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
     """Atualizar categoria"""
-    category = db.query(Category).filter(
-        Category.id == category_id,
-        Category.user_id == current_user.id
-    ).first()
+    category = (await db.execute(
+        select(Category).where(
+            Category.id == category_id,
+            Category.user_id == current_user.id
+        )
+    )).scalar_one_or_none()
 
     if not category:
         raise HTTPException(
@@ -87,8 +94,8 @@ async def update_category(
     for field, value in update_data.items():
         setattr(category, field, value)
 
-    db.commit()
-    db.refresh(category)
+    await db.commit()
+    await db.refresh(category)
 
     return category
 
@@ -96,14 +103,16 @@ async def update_category(
 @router.delete("/{category_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_category(
     category_id: UUID,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
     """Deletar categoria"""
-    category = db.query(Category).filter(
-        Category.id == category_id,
-        Category.user_id == current_user.id
-    ).first()
+    category = (await db.execute(
+        select(Category).where(
+            Category.id == category_id,
+            Category.user_id == current_user.id
+        )
+    )).scalar_one_or_none()
 
     if not category:
         raise HTTPException(
@@ -111,7 +120,7 @@ async def delete_category(
             detail="Category not found"
         )
 
-    db.delete(category)
-    db.commit()
+    await db.delete(category)
+    await db.commit()
 
     return None
@@ -1,68 +1,115 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlalchemy.orm import Session
-from typing import List, Optional
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Literal, Optional
 from uuid import UUID
 from datetime import date, timedelta
+from decimal import Decimal
 from calendar import monthrange
 
 from app.db.session import get_db
-from app.core.deps import get_current_user
-from app.models.user import User
+from app.core.deps import check_category_owner, get_current_user, get_read_db
+from app.core.principal import Principal
 from app.models.projection import Projection
-from app.models.transaction import Transaction
+from app.models.projection_rule import ProjectionRule
+from app.services.projection_service import projection_service
+from app.services.cashflow_simulation import cashflow_simulator
+from app.core.config import settings
 from app.schemas.projection import (
     ProjectionCreate,
     ProjectionUpdate,
     ProjectionResponse,
-    ProjectionWithStats
+    ProjectionWithStats,
+    ProjectionRuleCreate,
+    ProjectionRuleUpdate,
+    ProjectionRuleResponse,
+    ProjectionOccurrence,
+    ProjectionOccurrenceList,
+    ProjectionItem
 )
+from app.schemas.transaction import TransactionUpdate
 
 router = APIRouter()
 
 
 @router.get("/", response_model=List[ProjectionWithStats])
 async def list_projections(
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_read_db)
 ):
-    """Lista todos os cenários de projeção do usuário"""
-    projections = db.query(Projection).filter(
-        Projection.user_id == current_user.id
-    ).order_by(Projection.created_at.desc()).all()
-
-    result = []
-    for proj in projections:
-        # Calcular estatísticas
-        transactions = db.query(Transaction).filter(
-            Transaction.projection_id == proj.id,
-            Transaction.is_projection == True
-        ).all()
-
-        total_income = sum(t.amount for t in transactions if t.amount > 0)
-        total_expenses = sum(abs(t.amount) for t in transactions if t.amount < 0)
-
-        result.append({
-            **proj.__dict__,
-            "total_transactions": len(transactions),
-            "total_income": float(total_income),
-            "total_expenses": float(total_expenses),
-            "balance": float(total_income - total_expenses)
-        })
+    """Lista todos os cenários de projeção do usuário (com estatísticas, em uma consulta)"""
+    return await projection_service.list_with_stats(db, current_user.id)
+
+
+@router.get("/simulate")
+async def simulate_cash_flow(
+    months: int = Query(24, ge=12, le=60, description="Horizonte da simulação em meses"),
+    paths: int = Query(None, ge=100, description="Caminhos simulados (padrão SIMULATION_DEFAULT_PATHS)"),
+    lookback_months: int = Query(None, ge=3, le=36, description="Meses de histórico usados no ajuste"),
+    annual_inflation: float = Query(0.0, ge=0, le=1, description="Reajuste anual das despesas (0.05 = 5%)"),
+    starting_balance: Optional[float] = Query(None, description="Saldo inicial (padrão: saldo das transações reais)"),
+    seed: Optional[int] = Query(None, ge=0, description="Semente para resultados reproduzíveis"),
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """
+    Simulação Monte Carlo do saldo futuro a partir do histórico real.
+    Retorna faixas de percentis (p5 a p95) mês a mês e do saldo final.
+    """
+    paths = min(paths or settings.SIMULATION_DEFAULT_PATHS, settings.SIMULATION_MAX_PATHS)
+    result = await cashflow_simulator.simulate(
+        db,
+        current_user.id,
+        months=months,
+        paths=paths,
+        lookback_months=lookback_months,
+        annual_inflation=annual_inflation,
+        starting_balance=starting_balance,
+        seed=seed
+    )
+
+    if result is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Sem histórico de meses completos para simular"
+        )
 
     return result
 
 
+@router.get("/compare")
+async def compare_projections_with_real(
+    projection_ids: List[UUID] = Query(..., description="Cenários comparados (repetir o parâmetro)"),
+    granularity: Literal["month", "week"] = Query("month", description="Agrupamento dos períodos"),
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """Projetado vs real de vários cenários em uma chamada (uma consulta agregada)"""
+    if len(projection_ids) > settings.PROJECTION_COMPARE_MAX:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Máximo de {settings.PROJECTION_COMPARE_MAX} cenários por comparação"
+        )
+
+    comparisons = await projection_service.compare(db, current_user.id, projection_ids, granularity)
+
+    if len(comparisons) != len(set(projection_ids)):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Projeção não encontrada"
+        )
+
+    return {"projections": comparisons}
+
+
 @router.get("/{projection_id}", response_model=ProjectionWithStats)
 async def get_projection(
     projection_id: UUID,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_read_db)
 ):
     """Obtém detalhes de um cenário de projeção"""
-    projection = db.query(Projection).filter(
-        Projection.id == projection_id,
-        Projection.user_id == current_user.id
-    ).first()
+    projection = await projection_service.get_with_stats(db, current_user.id, projection_id)
 
     if not projection:
         raise HTTPException(
@@ -70,29 +117,14 @@ async def get_projection(
             detail="Projeção não encontrada"
         )
 
-    # Calcular estatísticas
-    transactions = db.query(Transaction).filter(
-        Transaction.projection_id == projection.id,
-        Transaction.is_projection == True
-    ).all()
-
-    total_income = sum(t.amount for t in transactions if t.amount > 0)
-    total_expenses = sum(abs(t.amount) for t in transactions if t.amount < 0)
-
-    return {
-        **projection.__dict__,
-        "total_transactions": len(transactions),
-        "total_income": float(total_income),
-        "total_expenses": float(total_expenses),
-        "balance": float(total_income - total_expenses)
-    }
+    return projection
 
 
 @router.post("/", response_model=ProjectionResponse, status_code=status.HTTP_201_CREATED)
 async def create_projection(
     projection_data: ProjectionCreate,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
     """Cria novo cenário de projeção"""
     new_projection = Projection(
@@ -101,8 +133,8 @@ async def create_projection(
     )
 
     db.add(new_projection)
-    db.commit()
-    db.refresh(new_projection)
+    await db.commit()
+    await db.refresh(new_projection)
 
     return new_projection
 
@@ -112,12 +144,15 @@ async def create_projection_from_month(
     year: int,
     month: int,
     name: str = Query(..., description="Nome do cenário"),
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    months: int = Query(1, ge=1, le=24, description="Quantidade de meses copiados a partir de year/month"),
+    scale: Decimal = Query(Decimal("1"), gt=0, le=10, description="Fator aplicado aos valores (1.05 = +5%)"),
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
     """
-    Cria cenário de projeção duplicando transações de um mês real.
+    Cria cenário de projeção duplicando transações de um ou mais meses reais.
     Útil para simular "E se o próximo mês fosse igual a este?"
+    (opcionalmente com reajuste, ex.: scale=1.05 para +5% de inflação).
     """
     # Validar mês
     if month < 1 or month > 12:
@@ -126,48 +161,41 @@ async def create_projection_from_month(
             detail="Mês inválido"
         )
 
-    # Criar projeção
-    _, last_day = monthrange(year, month)
+    # Período de origem: do primeiro dia de year/month ao último dia do último mês
+    last_index = year * 12 + (month - 1) + (months - 1)
+    end_year, end_month = divmod(last_index, 12)
+    end_month += 1
     start_date = date(year, month, 1)
-    end_date = date(year, month, last_day)
+    end_date = date(end_year, end_month, monthrange(end_year, end_month)[1])
+
+    description = f"Projeção baseada em {month:02d}/{year}"
+    if months > 1:
+        description += f" a {end_month:02d}/{end_year}"
+    if scale != 1:
+        description += f" (valores x{scale.normalize()})"
 
     projection = Projection(
         user_id=current_user.id,
         name=name,
-        description=f"Projeção baseada em {month:02d}/{year}",
+        description=description,
         start_date=start_date,
         end_date=end_date,
         is_active=True
     )
 
-    db.add(projection)
-    db.commit()
-    db.refresh(projection)
-
-    # Buscar transações do mês real
-    real_transactions = db.query(Transaction).filter(
-        Transaction.user_id == current_user.id,
-        Transaction.is_projection == False,
-        Transaction.date >= start_date,
-        Transaction.date <= end_date
-    ).all()
-
-    # Duplicar transações para a projeção
-    for trans in real_transactions:
-        proj_transaction = Transaction(
-            user_id=current_user.id,
-            projection_id=projection.id,
-            date=trans.date,
-            description=trans.description,
-            amount=trans.amount,
-            category_id=trans.category_id,
-            is_manual=True,
-            is_projection=True
+    # Projeção e cópia das transações na mesma transação do banco
+    try:
+        db.add(projection)
+        await db.flush()
+        await projection_service.copy_real_transactions(
+            db, current_user.id, projection.id, start_date, end_date, scale
         )
-        db.add(proj_transaction)
-
-    db.commit()
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        raise
 
+    await db.refresh(projection)
     return projection
 
 
@@ -175,14 +203,16 @@ async def create_projection_from_month(
 async def update_projection(
     projection_id: UUID,
     projection_data: ProjectionUpdate,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
     """Atualiza cenário de projeção"""
-    projection = db.query(Projection).filter(
-        Projection.id == projection_id,
-        Projection.user_id == current_user.id
-    ).first()
+    projection = (await db.execute(
+        select(Projection).where(
+            Projection.id == projection_id,
+            Projection.user_id == current_user.id
+        )
+    )).scalar_one_or_none()
 
     if not projection:
         raise HTTPException(
@@ -194,8 +224,8 @@ async def update_projection(
     for field, value in update_data.items():
         setattr(projection, field, value)
 
-    db.commit()
-    db.refresh(projection)
+    await db.commit()
+    await db.refresh(projection)
 
     return projection
 
@@ -203,14 +233,16 @@ async def update_projection(
 @router.delete("/{projection_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_projection(
     projection_id: UUID,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
-    """Deleta cenário de projeção e todas as transações associadas"""
-    projection = db.query(Projection).filter(
-        Projection.id == projection_id,
-        Projection.user_id == current_user.id
-    ).first()
+    """Deleta cenário de projeção e todos os itens associados"""
+    projection = (await db.execute(
+        select(Projection).where(
+            Projection.id == projection_id,
+            Projection.user_id == current_user.id
+        )
+    )).scalar_one_or_none()
 
     if not projection:
         raise HTTPException(
@@ -218,75 +250,291 @@ async def delete_projection(
             detail="Projeção não encontrada"
         )
 
-    db.delete(projection)
-    db.commit()
+    has_children = (await db.execute(
+        select(Projection.id).where(Projection.parent_id == projection.id).limit(1)
+    )).first()
+    if has_children:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Cenário possui variações; exclua as variações primeiro"
+        )
+
+    await db.delete(projection)
+    await db.commit()
+
+    return None
+
+
+async def _get_user_projection(db: AsyncSession, user: Principal, projection_id: UUID) -> Projection:
+    projection = (await db.execute(
+        select(Projection).where(
+            Projection.id == projection_id,
+            Projection.user_id == user.id
+        )
+    )).scalar_one_or_none()
+
+    if not projection:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Projeção não encontrada"
+        )
+
+    return projection
+
+
+@router.post("/{projection_id}/branch", response_model=ProjectionResponse, status_code=status.HTTP_201_CREATED)
+async def branch_projection(
+    projection_id: UUID,
+    name: str = Query(..., description="Nome da variação"),
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Cria variação do cenário (copy-on-write): nenhuma transação é copiada.
+    A variação enxerga os itens do pai e guarda só o que mudar.
+    """
+    parent = await _get_user_projection(db, current_user, projection_id)
+
+    if await projection_service.chain_depth(db, current_user.id, parent.id) + 1 >= settings.PROJECTION_MAX_DEPTH:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Limite de {settings.PROJECTION_MAX_DEPTH} níveis de variação atingido"
+        )
+
+    branch = Projection(
+        user_id=current_user.id,
+        parent_id=parent.id,
+        name=name,
+        description=f"Variação de {parent.name}",
+        start_date=parent.start_date,
+        end_date=parent.end_date,
+        is_active=True
+    )
+
+    db.add(branch)
+    await db.commit()
+    await db.refresh(branch)
+
+    return branch
+
+
+@router.get("/{projection_id}/items", response_model=List[ProjectionItem])
+async def list_projection_items(
+    projection_id: UUID,
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Itens efetivos do cenário (próprios e herdados, com overrides aplicados)"""
+    await _get_user_projection(db, current_user, projection_id)
+    return await projection_service.list_items(db, current_user.id, projection_id)
+
+
+@router.put("/{projection_id}/items/{item_id}", response_model=ProjectionItem)
+async def update_projection_item(
+    projection_id: UUID,
+    item_id: UUID,
+    item_data: TransactionUpdate,
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Altera item do cenário; item herdado vira override, sem alterar o cenário pai"""
+    projection = await _get_user_projection(db, current_user, projection_id)
+
+    changes = item_data.model_dump(exclude_unset=True, exclude_none=True)
+    await check_category_owner(db, current_user, changes.get("category_id"))
+    if not await projection_service.override_item(db, projection, item_id, changes):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Item não encontrado no cenário"
+        )
+
+    await db.commit()
+
+    return (await projection_service.list_items(db, current_user.id, projection_id, item_id))[0]
+
+
+@router.delete("/{projection_id}/items/{item_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_projection_item(
+    projection_id: UUID,
+    item_id: UUID,
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Remove item do cenário; item herdado só deixa de valer nesta variação"""
+    projection = await _get_user_projection(db, current_user, projection_id)
+
+    if not await projection_service.override_item(db, projection, item_id):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Item não encontrado no cenário"
+        )
+
+    await db.commit()
 
     return None
 
 
+@router.get("/{projection_id}/rules", response_model=List[ProjectionRuleResponse])
+async def list_projection_rules(
+    projection_id: UUID,
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Lista os itens recorrentes do cenário"""
+    await _get_user_projection(db, current_user, projection_id)
+    return (await db.execute(
+        select(ProjectionRule).where(
+            ProjectionRule.projection_id == projection_id
+        ).order_by(ProjectionRule.start_date, ProjectionRule.created_at)
+    )).scalars().all()
+
+
+@router.post("/{projection_id}/rules", response_model=ProjectionRuleResponse, status_code=status.HTTP_201_CREATED)
+async def create_projection_rule(
+    projection_id: UUID,
+    rule_data: ProjectionRuleCreate,
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Cria item recorrente no cenário (ex.: parcela mensal por 5 anos com
+    reajuste anual). Uma linha só: as ocorrências são geradas na consulta.
+    """
+    await _get_user_projection(db, current_user, projection_id)
+    await check_category_owner(db, current_user, rule_data.category_id)
+
+    rule = ProjectionRule(
+        user_id=current_user.id,
+        projection_id=projection_id,
+        **rule_data.model_dump()
+    )
+
+    db.add(rule)
+    await db.commit()
+    await db.refresh(rule)
+
+    return rule
+
+
+@router.put("/{projection_id}/rules/{rule_id}", response_model=ProjectionRuleResponse)
+async def update_projection_rule(
+    projection_id: UUID,
+    rule_id: UUID,
+    rule_data: ProjectionRuleUpdate,
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Atualiza item recorrente do cenário"""
+    rule = (await db.execute(
+        select(ProjectionRule).where(
+            ProjectionRule.id == rule_id,
+            ProjectionRule.projection_id == projection_id,
+            ProjectionRule.user_id == current_user.id
+        )
+    )).scalar_one_or_none()
+
+    if not rule:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Regra não encontrada"
+        )
+
+    update_data = rule_data.model_dump(exclude_unset=True)
+    if "category_id" in update_data:
+        await check_category_owner(db, current_user, update_data["category_id"])
+    for field, value in update_data.items():
+        setattr(rule, field, value)
+
+    if rule.end_date is not None and rule.end_date < rule.start_date:
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="end_date deve ser posterior a start_date"
+        )
+
+    await db.commit()
+    await db.refresh(rule)
+
+    return rule
+
+
+@router.delete("/{projection_id}/rules/{rule_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_projection_rule(
+    projection_id: UUID,
+    rule_id: UUID,
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Remove item recorrente do cenário"""
+    deleted = (await db.execute(
+        delete(ProjectionRule).where(
+            ProjectionRule.id == rule_id,
+            ProjectionRule.projection_id == projection_id,
+            ProjectionRule.user_id == current_user.id
+        ),
+        execution_options={"synchronize_session": False}
+    )).rowcount
+
+    if not deleted:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Regra não encontrada"
+        )
+
+    await db.commit()
+
+    return None
+
+
+@router.get("/{projection_id}/occurrences", response_model=ProjectionOccurrenceList)
+async def list_projection_occurrences(
+    projection_id: UUID,
+    start_date: Optional[date] = Query(None, description="Início (padrão: início do cenário)"),
+    end_date: Optional[date] = Query(None, description="Fim (padrão: fim do cenário)"),
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """Ocorrências das regras recorrentes no período, em ordem de data"""
+    projection = await _get_user_projection(db, current_user, projection_id)
+    rules, occurrences = await projection_service.rule_occurrences(db, projection, start_date, end_date)
+
+    limit = settings.PROJECTION_OCCURRENCES_LIMIT
+    order = occurrences.dates.argsort(kind="stable")[:limit]
+    items = [
+        ProjectionOccurrence(
+            rule_id=rules[occurrences.rule_index[i]].id,
+            date=occurrences.dates[i].item(),
+            description=rules[occurrences.rule_index[i]].description,
+            amount=float(occurrences.amounts[i]),
+            category_id=rules[occurrences.rule_index[i]].category_id
+        )
+        for i in order
+    ]
+
+    return ProjectionOccurrenceList(
+        occurrences=items,
+        total=len(occurrences),
+        truncated=len(occurrences) > limit
+    )
+
+
 @router.get("/{projection_id}/compare")
 async def compare_projection_with_real(
     projection_id: UUID,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    granularity: Literal["month", "week"] = Query("month", description="Agrupamento dos períodos"),
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_read_db)
 ):
     """
     Compara projeção com dados reais do mesmo período.
-    Útil para ver "Projetado vs Real".
+    Útil para ver "Projetado vs Real" (totais, por categoria e por período).
     """
-    projection = db.query(Projection).filter(
-        Projection.id == projection_id,
-        Projection.user_id == current_user.id
-    ).first()
+    comparison = await projection_service.compare(db, current_user.id, [projection_id], granularity)
 
-    if not projection:
+    if not comparison:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Projeção não encontrada"
         )
 
-    # Transações da projeção
-    proj_transactions = db.query(Transaction).filter(
-        Transaction.projection_id == projection.id,
-        Transaction.is_projection == True
-    ).all()
-
-    proj_income = sum(t.amount for t in proj_transactions if t.amount > 0)
-    proj_expenses = sum(abs(t.amount) for t in proj_transactions if t.amount < 0)
-
-    # Transações reais do mesmo período
-    real_transactions = []
-    real_income = 0
-    real_expenses = 0
-
-    if projection.start_date and projection.end_date:
-        real_transactions = db.query(Transaction).filter(
-            Transaction.user_id == current_user.id,
-            Transaction.is_projection == False,
-            Transaction.date >= projection.start_date,
-            Transaction.date <= projection.end_date
-        ).all()
-
-        real_income = sum(t.amount for t in real_transactions if t.amount > 0)
-        real_expenses = sum(abs(t.amount) for t in real_transactions if t.amount < 0)
-
-    return {
-        "projection": {
-            "name": projection.name,
-            "total_income": float(proj_income),
-            "total_expenses": float(proj_expenses),
-            "balance": float(proj_income - proj_expenses),
-            "transactions_count": len(proj_transactions)
-        },
-        "real": {
-            "total_income": float(real_income),
-            "total_expenses": float(real_expenses),
-            "balance": float(real_income - real_expenses),
-            "transactions_count": len(real_transactions)
-        },
-        "difference": {
-            "income": float(proj_income - real_income),
-            "expenses": float(proj_expenses - real_expenses),
-            "balance": float((proj_income - proj_expenses) - (real_income - real_expenses))
-        }
-    }
+    return comparison[0]
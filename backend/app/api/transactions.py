@@ -1,13 +1,18 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlalchemy.orm import Session
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional
 from datetime import date
 from uuid import UUID
 
 from app.db.session import get_db
-from app.core.deps import get_current_user
-from app.models.user import User
+from app.core.deps import check_category_owner, get_current_user, get_read_db
+from app.core.principal import Principal
 from app.models.transaction import Transaction
+from app.models.projection import Projection
+from app.models.projection_item import ProjectionItem
+from app.services.forecast_service import category_forecaster
+from app.services.projection_service import projection_service
 from app.schemas.transaction import (
     TransactionCreate,
     TransactionUpdate,
@@ -18,6 +23,54 @@ from app.schemas.transaction import (
 router = APIRouter()
 
 
+def _ledger(is_projection: bool):
+    """
+    Tabela consultada: extrato real (transactions) ou itens de projeção
+    (projection_items). Os dois são servidos com o mesmo schema.
+    """
+    return ProjectionItem if is_projection else Transaction
+
+
+def _scoped(model, user_id: UUID):
+    query = select(model).where(model.user_id == user_id)
+    if model is Transaction:
+        query = query.where(Transaction.is_projection == False)
+    return query
+
+
+async def _find(db: AsyncSession, user_id: UUID, transaction_id: UUID):
+    """Transação real ou item de projeção pelo id"""
+    for model in (Transaction, ProjectionItem):
+        found = (await db.execute(
+            select(model).where(
+                model.id == transaction_id,
+                model.user_id == user_id
+            )
+        )).scalar_one_or_none()
+        if found:
+            return found
+    return None
+
+
+async def _item_projection(db: AsyncSession, item: ProjectionItem) -> Optional[Projection]:
+    """
+    Cenário dono do item de projeção: a escrita passa por
+    projection_service.override_item, como em /api/projections. Item de
+    cenário com variações também aparece nelas; alterá-lo por aqui mudaria
+    as variações sem copy-on-write, então é recusado (409).
+    """
+    if item.projection_id is None:
+        return None
+    if (await db.execute(
+        select(Projection.id).where(Projection.parent_id == item.projection_id).limit(1)
+    )).first():
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Item compartilhado com variações do cenário; altere-o por /api/projections/{id}/items"
+        )
+    return await db.get(Projection, item.projection_id)
+
+
 @router.get("/", response_model=TransactionListResponse)
 async def list_transactions(
     skip: int = Query(0, ge=0),
@@ -26,39 +79,57 @@ async def list_transactions(
     start_date: Optional[date] = None,
     end_date: Optional[date] = None,
     category_id: Optional[UUID] = None,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
     """Listar transações do usuário com filtros"""
-    query = db.query(Transaction).filter(
-        Transaction.user_id == current_user.id,
-        Transaction.is_projection == is_projection
-    )
+    model = _ledger(is_projection)
+    query = _scoped(model, current_user.id)
 
     if start_date:
-        query = query.filter(Transaction.date >= start_date)
+        query = query.where(model.date >= start_date)
     if end_date:
-        query = query.filter(Transaction.date <= end_date)
+        query = query.where(model.date <= end_date)
     if category_id:
-        query = query.filter(Transaction.category_id == category_id)
+        query = query.where(model.category_id == category_id)
 
-    total = query.count()
-    transactions = query.order_by(Transaction.date.desc()).offset(skip).limit(limit).all()
+    total = (await db.execute(select(func.count()).select_from(query.subquery()))).scalar()
+    transactions = (await db.execute(
+        query.order_by(model.date.desc()).offset(skip).limit(limit)
+    )).scalars().all()
 
     return {"total": total, "transactions": transactions}
 
 
+@router.get("/forecast")
+async def forecast_by_category(
+    months: int = Query(6, ge=1, le=24, description="Meses previstos"),
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """
+    Previsão dos próximos meses por categoria e no total, com intervalos
+    de 80% e 95% e erro de backtest. Usa só meses completos.
+    """
+    result = await category_forecaster.forecast(db, current_user.id, months)
+
+    if result is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Histórico insuficiente para previsão"
+        )
+
+    return result
+
+
 @router.get("/{transaction_id}", response_model=TransactionResponse)
 async def get_transaction(
     transaction_id: UUID,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
     """Obter transação por ID"""
-    transaction = db.query(Transaction).filter(
-        Transaction.id == transaction_id,
-        Transaction.user_id == current_user.id
-    ).first()
+    transaction = await _find(db, current_user.id, transaction_id)
 
     if not transaction:
         raise HTTPException(
@@ -72,18 +143,35 @@ async def get_transaction(
 @router.post("/", response_model=TransactionResponse, status_code=status.HTTP_201_CREATED)
 async def create_transaction(
     transaction_data: TransactionCreate,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
-    """Criar nova transação"""
-    new_transaction = Transaction(
-        user_id=current_user.id,
-        **transaction_data.model_dump()
-    )
+    """Criar nova transação (is_projection=true cria item de projeção)"""
+    await check_category_owner(db, current_user, transaction_data.category_id)
+    if transaction_data.is_projection:
+        if transaction_data.projection_id and not (await db.execute(
+            select(Projection.id).where(
+                Projection.id == transaction_data.projection_id,
+                Projection.user_id == current_user.id
+            )
+        )).first():
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Projection not found"
+            )
+        new_transaction = ProjectionItem(
+            user_id=current_user.id,
+            **transaction_data.model_dump(exclude={"is_manual", "is_projection"})
+        )
+    else:
+        new_transaction = Transaction(
+            user_id=current_user.id,
+            **transaction_data.model_dump()
+        )
 
     db.add(new_transaction)
-    db.commit()
-    db.refresh(new_transaction)
+    await db.commit()
+    await db.refresh(new_transaction)
 
     return new_transaction
 
@@ -92,14 +180,11 @@ async def create_transaction(
 async def update_transaction(
     transaction_id: UUID,
     transaction_data: TransactionUpdate,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
-    """Atualizar transação"""
-    transaction = db.query(Transaction).filter(
-        Transaction.id == transaction_id,
-        Transaction.user_id == current_user.id
-    ).first()
+    """Atualizar transação (item de projeção: ver _item_projection)"""
+    transaction = await _find(db, current_user.id, transaction_id)
 
     if not transaction:
         raise HTTPException(
@@ -109,11 +194,18 @@ async def update_transaction(
 
     # Atualizar apenas campos fornecidos
     update_data = transaction_data.model_dump(exclude_unset=True)
-    for field, value in update_data.items():
-        setattr(transaction, field, value)
-
-    db.commit()
-    db.refresh(transaction)
+    await check_category_owner(db, current_user, update_data.get("category_id"))
+    projection = None
+    if isinstance(transaction, ProjectionItem):
+        projection = await _item_projection(db, transaction)
+    if projection is not None:
+        await projection_service.override_item(db, projection, transaction.id, update_data)
+    else:
+        for field, value in update_data.items():
+            setattr(transaction, field, value)
+
+    await db.commit()
+    await db.refresh(transaction)
 
     return transaction
 
@@ -121,14 +213,11 @@ async def update_transaction(
 @router.delete("/{transaction_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_transaction(
     transaction_id: UUID,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
-    """Deletar transação"""
-    transaction = db.query(Transaction).filter(
-        Transaction.id == transaction_id,
-        Transaction.user_id == current_user.id
-    ).first()
+    """Deletar transação (item de projeção: ver _item_projection)"""
+    transaction = await _find(db, current_user.id, transaction_id)
 
     if not transaction:
         raise HTTPException(
@@ -136,8 +225,14 @@ async def delete_transaction(
             detail="Transaction not found"
         )
 
-    db.delete(transaction)
-    db.commit()
+    projection = None
+    if isinstance(transaction, ProjectionItem):
+        projection = await _item_projection(db, transaction)
+    if projection is not None:
+        await projection_service.override_item(db, projection, transaction.id)
+    else:
+        await db.delete(transaction)
+    await db.commit()
 
     return None
 
@@ -147,24 +242,19 @@ async def get_transaction_summary(
     start_date: Optional[date] = None,
     end_date: Optional[date] = None,
     is_projection: bool = Query(False),
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_read_db)
 ):
     """Obter resumo de transações (receitas, despesas, saldo)"""
-    from sqlalchemy import func
-    from decimal import Decimal
-
-    query = db.query(Transaction).filter(
-        Transaction.user_id == current_user.id,
-        Transaction.is_projection == is_projection
-    )
+    model = _ledger(is_projection)
+    query = _scoped(model, current_user.id)
 
     if start_date:
-        query = query.filter(Transaction.date >= start_date)
+        query = query.where(model.date >= start_date)
     if end_date:
-        query = query.filter(Transaction.date <= end_date)
+        query = query.where(model.date <= end_date)
 
-    transactions = query.all()
+    transactions = (await db.execute(query)).scalars().all()
 
     total_income = sum(t.amount for t in transactions if t.amount > 0)
     total_expenses = sum(abs(t.amount) for t in transactions if t.amount < 0)
@@ -182,11 +272,10 @@ async def get_transaction_summary(
 async def get_monthly_stats(
     months: int = Query(6, ge=1, le=12, description="Número de meses para retornar"),
     is_projection: bool = Query(False),
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_read_db)
 ):
     """Obter estatísticas mensais (receitas e despesas por mês)"""
-    from sqlalchemy import func, extract
     from datetime import datetime, timedelta
     from calendar import month_abbr
     import locale
@@ -202,12 +291,13 @@ async def get_monthly_stats(
     start_date = end_date - timedelta(days=months * 30)
 
     # Buscar transações no período
-    transactions = db.query(Transaction).filter(
-        Transaction.user_id == current_user.id,
-        Transaction.is_projection == is_projection,
-        Transaction.date >= start_date,
-        Transaction.date <= end_date
-    ).all()
+    model = _ledger(is_projection)
+    transactions = (await db.execute(
+        _scoped(model, current_user.id).where(
+            model.date >= start_date,
+            model.date <= end_date
+        )
+    )).scalars().all()
 
     # Agrupar por mês
     monthly_data = {}
@@ -253,44 +343,38 @@ async def get_stats_by_category(
     start_date: Optional[date] = None,
     end_date: Optional[date] = None,
     is_projection: bool = Query(False),
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_read_db)
 ):
     """Obter gastos agrupados por categoria"""
     from app.models.category import Category
 
-    query = db.query(Transaction).filter(
-        Transaction.user_id == current_user.id,
-        Transaction.is_projection == is_projection,
-        Transaction.amount < 0  # Apenas despesas
-    )
+    model = _ledger(is_projection)
+    name = func.coalesce(Category.name, "Sem Categoria")
+    color = func.coalesce(Category.color, "#999999")
+    query = select(name, color, func.sum(-model.amount)).select_from(model).outerjoin(
+        Category, Category.id == model.category_id
+    ).where(
+        model.user_id == current_user.id,
+        model.amount < 0  # Apenas despesas
+    ).group_by(name, color)
+    if model is Transaction:
+        query = query.where(Transaction.is_projection == False)
 
     if start_date:
-        query = query.filter(Transaction.date >= start_date)
+        query = query.where(model.date >= start_date)
     if end_date:
-        query = query.filter(Transaction.date <= end_date)
+        query = query.where(model.date <= end_date)
 
-    transactions = query.all()
-
-    # Agrupar por categoria
+    # Agrupar por categoria (nomes repetidos somam; fica a primeira cor)
     category_totals = {}
-    for trans in transactions:
-        if trans.category_id:
-            category = db.query(Category).filter(Category.id == trans.category_id).first()
-            category_name = category.name if category else "Sem Categoria"
-            category_color = category.color if category else "#999999"
-        else:
-            category_name = "Sem Categoria"
-            category_color = "#999999"
-
-        if category_name not in category_totals:
-            category_totals[category_name] = {
-                "name": category_name,
-                "value": 0,
-                "color": category_color
-            }
-
-        category_totals[category_name]["value"] += float(abs(trans.amount))
+    for category_name, category_color, total in await db.execute(query):
+        entry = category_totals.setdefault(category_name, {
+            "name": category_name,
+            "value": 0,
+            "color": category_color
+        })
+        entry["value"] += float(total)
 
     # Ordenar por valor
     result = sorted(category_totals.values(), key=lambda x: x["value"], reverse=True)
@@ -1,17 +1,20 @@
+import logging
 from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
 from uuid import UUID
 from datetime import datetime
 
 from app.db.session import get_db
 from app.core.deps import get_current_user
-from app.models.user import User
+from app.core.principal import Principal
 from app.models.bank_statement import BankStatement
 from app.models.transaction import Transaction
 from app.models.category import Category
 from app.services.parser_service import parser_service
 from app.services.llm_service import llm_service
+from app.services.category_index import category_index
 from app.schemas.bank_statement import (
     BankStatementUploadResponse,
     BankStatementResponse,
@@ -19,14 +22,16 @@ from app.schemas.bank_statement import (
     TransactionBatchCreate
 )
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter()
 
 
 @router.post("/statement", response_model=dict)
 async def upload_bank_statement(
     file: UploadFile = File(...),
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Upload de extrato bancário (CSV).
@@ -71,13 +76,15 @@ async def upload_bank_statement(
             bank_statement.period_end = max(dates)
 
         db.add(bank_statement)
-        db.commit()
-        db.refresh(bank_statement)
+        await db.commit()
+        await db.refresh(bank_statement)
 
         # Buscar categorias do usuário para sugerir
-        user_categories = db.query(Category).filter(
-            Category.user_id == current_user.id
-        ).all()
+        user_categories = (await db.execute(
+            select(Category).where(
+                Category.user_id == current_user.id
+            )
+        )).scalars().all()
 
         category_names = [cat.name for cat in user_categories]
 
@@ -89,28 +96,46 @@ async def upload_bank_statement(
             ]
             category_names = default_categories
 
-        # Categorizar transações usando LLM (se disponível)
-        transactions_for_review = []
-        for idx, trans in enumerate(parsed_transactions):
-            suggested_category = None
-
-            # Tentar categorizar com LLM
-            try:
-                if llm_service.check_availability():
-                    suggested_category = await llm_service.categorize_transaction(
-                        description=trans["description"],
-                        amount=trans["amount"],
-                        available_categories=category_names
-                    )
-            except Exception as e:
-                print(f"Erro ao categorizar com LLM: {e}")
+        # 1) Vizinhos mais próximos: descrições parecidas já categorizadas
+        # pelo usuário (um embedding em lote + uma multiplicação de matrizes).
+        # Só as linhas do extrato são embedadas aqui; o histórico que ainda
+        # não tem vetor é completado em background.
+        category_by_id = {cat.id: cat.name for cat in user_categories}
+        try:
+            knn_ids = await category_index.suggest(db, current_user.id, parsed_transactions)
+        except Exception as e:
+            logger.warning("Erro na sugestão por vizinhos: %s", e)
+            knn_ids = [None] * len(parsed_transactions)
+        suggestions = [category_by_id.get(cat_id) for cat_id in knn_ids]
+        sources = ["history" if name else None for name in suggestions]
+
+        # 2) LLM só para as linhas sem voto confiável.
+        # O lote roda em paralelo limitado pelo scheduler do LLM, com prioridade
+        # abaixo do chat; se o Ollama cair no meio, o circuit breaker abre e as
+        # linhas restantes degradam na hora.
+        pending = [idx for idx, name in enumerate(suggestions) if name is None]
+        try:
+            llm_suggestions = await llm_service.categorize_transactions(
+                [parsed_transactions[idx] for idx in pending],
+                available_categories=category_names,
+                user_id=str(current_user.id)
+            )
+        except Exception as e:
+            logger.warning("Erro ao categorizar com LLM: %s", e)
+            llm_suggestions = [None] * len(pending)
+        for idx, name in zip(pending, llm_suggestions):
+            suggestions[idx] = name
+            sources[idx] = "llm" if name else None
 
+        transactions_for_review = []
+        for idx, (trans, suggested_category) in enumerate(zip(parsed_transactions, suggestions)):
             transactions_for_review.append({
                 "temp_id": idx,
                 "date": trans["date"],
                 "description": trans["description"],
                 "amount": trans["amount"],
-                "suggested_category": suggested_category
+                "suggested_category": suggested_category,
+                "suggestion_source": sources[idx]
             })
 
         return {
@@ -138,17 +163,19 @@ async def upload_bank_statement(
 async def confirm_bank_statement(
     statement_id: UUID,
     batch: TransactionBatchCreate,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Confirma e salva transações revisadas do extrato.
     """
     # Buscar bank statement
-    bank_statement = db.query(BankStatement).filter(
-        BankStatement.id == statement_id,
-        BankStatement.user_id == current_user.id
-    ).first()
+    bank_statement = (await db.execute(
+        select(BankStatement).where(
+            BankStatement.id == statement_id,
+            BankStatement.user_id == current_user.id
+        )
+    )).scalar_one_or_none()
 
     if not bank_statement:
         raise HTTPException(
@@ -175,7 +202,7 @@ async def confirm_bank_statement(
         bank_statement.status = "completed"
         bank_statement.total_transactions = len(batch.transactions)
 
-        db.commit()
+        await db.commit()
 
         return {
             "message": "Transações importadas com sucesso",
@@ -183,7 +210,7 @@ async def confirm_bank_statement(
         }
 
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Erro ao salvar transações: {str(e)}"
@@ -192,13 +219,15 @@ async def confirm_bank_statement(
 
 @router.get("/statements", response_model=List[BankStatementResponse])
 async def list_bank_statements(
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
     """Lista todos os extratos importados pelo usuário"""
-    statements = db.query(BankStatement).filter(
-        BankStatement.user_id == current_user.id
-    ).order_by(BankStatement.upload_date.desc()).all()
+    statements = (await db.execute(
+        select(BankStatement).where(
+            BankStatement.user_id == current_user.id
+        ).order_by(BankStatement.upload_date.desc())
+    )).scalars().all()
 
     return statements
 
@@ -206,14 +235,16 @@ async def list_bank_statements(
 @router.delete("/statement/{statement_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_bank_statement(
     statement_id: UUID,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
     """Deleta um extrato e suas transações associadas"""
-    statement = db.query(BankStatement).filter(
-        BankStatement.id == statement_id,
-        BankStatement.user_id == current_user.id
-    ).first()
+    statement = (await db.execute(
+        select(BankStatement).where(
+            BankStatement.id == statement_id,
+            BankStatement.user_id == current_user.id
+        )
+    )).scalar_one_or_none()
 
     if not statement:
         raise HTTPException(
@@ -221,7 +252,7 @@ async def delete_bank_statement(
             detail="Extrato não encontrado"
         )
 
-    db.delete(statement)
-    db.commit()
+    await db.delete(statement)
+    await db.commit()
 
     return None
@@ -1,20 +1,30 @@
-from typing import Generator
+from typing import AsyncIterator, Optional
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
-from app.db.session import get_db
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.db.routing import ReadRouter
+from app.db.session import get_db, read_router
+from app.core.metrics import metrics
+from app.core.principal import Principal, principal_cache
 from app.core.security import decode_access_token
+from app.models.category import Category
 from app.models.user import User
 from uuid import UUID
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
 
 
-def get_current_user(
-    db: Session = Depends(get_db),
+async def get_current_user(
+    db: AsyncSession = Depends(get_db),
     token: str = Depends(oauth2_scheme)
-) -> User:
-    """Dependency para obter usuário autenticado"""
+) -> Principal:
+    """
+    Dependency para obter usuário autenticado.
+
+    Retorna o principal em cache (ver app/core/principal.py); o SELECT em
+    `users` só acontece na primeira requisição do `sub` ou após o TTL.
+    """
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -29,8 +39,52 @@ def get_current_user(
     if user_id is None:
         raise credentials_exception
 
-    user = db.query(User).filter(User.id == UUID(user_id)).first()
+    # Escritas desta sessão desviam as leituras do usuário para o primário (app/db/routing.py)
+    db.info["user_id"] = user_id
+
+    principal = principal_cache.get(user_id)
+    if principal is not None:
+        metrics.inc("auth.principal_cache.hits")
+        return principal
+
+    try:
+        user_uuid = UUID(user_id)
+    except ValueError:
+        raise credentials_exception
+
+    user = (await db.execute(select(User).where(User.id == user_uuid))).scalar_one_or_none()
     if user is None:
         raise credentials_exception
 
-    return user
+    metrics.inc("auth.principal_cache.misses")
+    principal = Principal.from_user(user)
+    principal_cache.put(user_id, principal)
+    return principal
+
+
+def get_read_router() -> ReadRouter:
+    """Dependency com o roteador de leituras (substituível nos testes)"""
+    return read_router
+
+
+async def get_read_db(
+    current_user: Principal = Depends(get_current_user),
+    router: ReadRouter = Depends(get_read_router)
+) -> AsyncIterator[AsyncSession]:
+    """
+    Dependency para endpoints só de consulta: sessão somente leitura na
+    réplica, ou no primário logo após uma escrita do próprio usuário.
+    """
+    async with router.session(current_user.id) as db:
+        yield db
+
+
+async def check_category_owner(db: AsyncSession, user: Principal, category_id: Optional[UUID]) -> None:
+    """404 se a categoria informada não é do usuário (None passa)"""
+    if category_id is not None and not (await db.execute(
+        select(Category.id).where(Category.id == category_id, Category.user_id == user.id)
+    )).first():
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Categoria não encontrada"
+        )
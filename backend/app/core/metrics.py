@@ -0,0 +1,153 @@
+import threading
+from collections import defaultdict, deque
+from contextvars import ContextVar
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+
+def _key(name: str, labels: dict) -> str:
+    if not labels:
+        return name
+    rendered = ",".join(f"{k}={v}" for k, v in sorted(labels.items()))
+    return f"{name}{{{rendered}}}"
+
+
+class _Distribution:
+    """Contagem/soma/extremos + janela recente para percentis"""
+
+    def __init__(self, window: int):
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+        self.recent = deque(maxlen=window)
+
+    def observe(self, value: float) -> None:
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+        self.recent.append(value)
+
+    def summary(self) -> dict:
+        p50, p95 = (
+            np.percentile(np.fromiter(self.recent, dtype=float), [50, 95]).tolist()
+            if self.recent else (None, None)
+        )
+        return {
+            "count": self.count,
+            "sum": round(self.total, 6),
+            "avg": round(self.total / self.count, 6) if self.count else None,
+            "min": self.min,
+            "max": self.max,
+            "p50": p50,
+            "p95": p95,
+        }
+
+
+class MetricsRegistry:
+    """
+    Registro de métricas em memória do processo.
+
+    - Contadores: `inc("llm.requests", operation="chat")`
+    - Distribuições: `observe("llm.queue.wait_seconds", 0.12, priority="chat")`
+    - Gauges: calculados na hora do snapshot por coletores registrados
+    """
+
+    def __init__(self, window: int = 1024):
+        self._window = window
+        self._lock = threading.Lock()
+        self._counters: Dict[str, float] = defaultdict(float)
+        self._distributions: Dict[str, _Distribution] = {}
+        self._collectors: List[Callable[[], Dict[str, float]]] = []
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        with self._lock:
+            self._counters[_key(name, labels)] += value
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        key = _key(name, labels)
+        with self._lock:
+            dist = self._distributions.get(key)
+            if dist is None:
+                dist = self._distributions[key] = _Distribution(self._window)
+            dist.observe(value)
+
+    def register_collector(self, collector: Callable[[], Dict[str, float]]) -> None:
+        """Registra função que devolve gauges atuais ({nome: valor})"""
+        self._collectors.append(collector)
+
+    def snapshot(self) -> dict:
+        gauges = {}
+        for collector in self._collectors:
+            gauges.update(collector())
+
+        with self._lock:
+            return {
+                "counters": dict(self._counters),
+                "gauges": gauges,
+                "distributions": {
+                    key: dist.summary() for key, dist in self._distributions.items()
+                },
+            }
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._distributions.clear()
+
+
+# Requisição HTTP em andamento (rótulo de endpoint para agregar métricas
+# de serviços chamados por ela, ex.: chamadas ao LLM por endpoint)
+_request_scope: ContextVar[Optional[dict]] = ContextVar("request_scope", default=None)
+
+UNMATCHED_ROUTE = "<sem rota>"
+
+
+def _route_template(scope: dict) -> str:
+    """
+    Caminho da rota que atende a requisição (`/api/projections/{projection_id}/compare`),
+    não o caminho concreto: um rótulo por rota, não por id.
+
+    O roteador preenche `scope["route"]` no mesmo dict que o middleware
+    recebeu; `path_format` vem sem o prefixo do include_router, que sai
+    dos segmentos iniciais do caminho concreto.
+    """
+    route = scope.get("route")
+    route_format = getattr(route, "path_format", None)
+    if route_format is None:
+        return UNMATCHED_ROUTE
+    segments = [s for s in scope["path"].split("/") if s]
+    format_segments = [s for s in route_format.split("/") if s]
+    prefix = segments[:max(len(segments) - len(format_segments), 0)]
+    return "/" + "/".join(prefix + format_segments)
+
+
+def current_endpoint() -> str:
+    """"MÉTODO /rota" da requisição em andamento ("-" fora de requisição)"""
+    scope = _request_scope.get()
+    if scope is None:
+        return "-"
+    return f"{scope['method']} {_route_template(scope)}"
+
+
+class EndpointContextMiddleware:
+    """Middleware ASGI que expõe a requisição em andamento para `current_endpoint()`"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        token = _request_scope.set(scope)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _request_scope.reset(token)
+
+
+# Instância global
+metrics = MetricsRegistry()
@@ -0,0 +1,117 @@
+"""
+Identidade do usuário autenticado ("principal") em cache.
+
+`get_current_user` roda em toda requisição autenticada; sem cache, cada uma
+paga um SELECT em `users` antes de qualquer trabalho. O principal guarda só
+os campos de identidade (nada do extrato) por `sub` do token, com TTL curto.
+
+Atualizações e exclusões de usuários feitas pelo ORM invalidam a entrada
+depois do commit (hook abaixo). Escritas por fora do ORM, ou em outro
+worker, só aparecem quando o TTL expira. O incremento de `ledger_version`
+(app/db/ledger.py) não passa pelo ORM e não invalida nada: o principal não
+guarda a versão.
+"""
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable, Optional, Tuple
+from uuid import UUID
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.user import User
+
+
+@dataclass(frozen=True)
+class Principal:
+    """Campos do usuário usados pelas rotas (compatível com UserResponse)"""
+    id: UUID
+    email: str
+    name: Optional[str]
+    created_at: Optional[datetime]
+    updated_at: Optional[datetime]
+
+    @classmethod
+    def from_user(cls, user: User) -> "Principal":
+        return cls(
+            id=user.id,
+            email=user.email,
+            name=user.name,
+            created_at=user.created_at,
+            updated_at=user.updated_at
+        )
+
+
+class PrincipalCache:
+    """LRU de principais por `sub`, com expiração por TTL"""
+
+    def __init__(
+        self,
+        ttl: float = None,
+        max_entries: int = None,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.ttl = ttl if ttl is not None else settings.PRINCIPAL_CACHE_TTL_SECONDS
+        self.max_entries = max_entries or settings.PRINCIPAL_CACHE_MAX_ENTRIES
+        self._clock = clock
+        self._entries: "OrderedDict[str, Tuple[Principal, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, subject: str) -> Optional[Principal]:
+        with self._lock:
+            entry = self._entries.get(subject)
+            if entry is None:
+                return None
+            principal, stored_at = entry
+            if self._clock() - stored_at >= self.ttl:
+                del self._entries[subject]
+                return None
+            self._entries.move_to_end(subject)
+            return principal
+
+    def put(self, subject: str, principal: Principal) -> None:
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            self._entries[subject] = (principal, self._clock())
+            self._entries.move_to_end(subject)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, subject: str) -> None:
+        with self._lock:
+            self._entries.pop(subject, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+# Instância global
+principal_cache = PrincipalCache()
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_changed_users(session, flush_context):
+    changed = session.info.setdefault("changed_principals", set())
+    for obj in session.deleted:
+        if isinstance(obj, User):
+            changed.add(str(obj.id))
+    for obj in session.dirty:
+        if isinstance(obj, User) and session.is_modified(obj):
+            changed.add(str(obj.id))
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_changed_users(session):
+    for subject in session.info.pop("changed_principals", ()):
+        principal_cache.invalidate(subject)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_changed_users(session, previous_transaction):
+    session.info.pop("changed_principals", None)
@@ -7,5 +7,9 @@ from app.models.user import User
 from app.models.category import Category
 from app.models.transaction import Transaction
 from app.models.projection import Projection
+from app.models.projection_item import ProjectionItem
+from app.models.projection_rule import ProjectionRule
+from app.models.projection_override import ProjectionOverride
 from app.models.bank_statement import BankStatement
-from app.models.ai_chat import AIChatHistory
+from app.models.ai_chat import AIChatHistory, AIChatArchive
+from app.models.description_embedding import DescriptionEmbedding
@@ -0,0 +1,58 @@
+"""
+Funções SQL com implementação por dialeto (PostgreSQL em produção,
+SQLite nos testes).
+"""
+from sqlalchemy import String
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.functions import FunctionElement
+
+
+class new_uuid(FunctionElement):
+    """UUID gerado no banco (para INSERT ... SELECT, onde o default Python não roda)"""
+    type = UUID(as_uuid=True)
+    inherit_cache = True
+
+
+@compiles(new_uuid)
+def _new_uuid_postgresql(element, compiler, **kw):
+    return "gen_random_uuid()"
+
+
+@compiles(new_uuid, "sqlite")
+def _new_uuid_sqlite(element, compiler, **kw):
+    # Mesmo formato que o tipo UUID grava no SQLite (32 dígitos hex)
+    return "lower(hex(randomblob(16)))"
+
+
+class month_bucket(FunctionElement):
+    """Mês da data como texto 'YYYY-MM' (agrupamento por período)"""
+    type = String()
+    inherit_cache = True
+
+
+@compiles(month_bucket)
+def _month_bucket_postgresql(element, compiler, **kw):
+    return "to_char(%s, 'YYYY-MM')" % compiler.process(element.clauses, **kw)
+
+
+@compiles(month_bucket, "sqlite")
+def _month_bucket_sqlite(element, compiler, **kw):
+    return "strftime('%%Y-%%m', %s)" % compiler.process(element.clauses, **kw)
+
+
+class week_bucket(FunctionElement):
+    """Segunda-feira da semana da data como texto 'YYYY-MM-DD'"""
+    type = String()
+    inherit_cache = True
+
+
+@compiles(week_bucket)
+def _week_bucket_postgresql(element, compiler, **kw):
+    return "to_char(date_trunc('week', %s), 'YYYY-MM-DD')" % compiler.process(element.clauses, **kw)
+
+
+@compiles(week_bucket, "sqlite")
+def _week_bucket_sqlite(element, compiler, **kw):
+    # Volta 6 dias e avança até a próxima segunda (a própria data, se for segunda)
+    return "date(%s, '-6 days', 'weekday 1')" % compiler.process(element.clauses, **kw)
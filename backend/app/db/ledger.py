@@ -0,0 +1,66 @@
+"""
+Versão do "livro-caixa" de cada usuário.
+
+Toda flush que cria, altera ou remove transações reais ou categorias
+incrementa `users.ledger_version` na mesma transação do banco. Caches de
+dados derivados (resumos para IA, simulações, previsões) usam a versão
+na chave e ficam automaticamente inválidos quando o extrato muda, em
+qualquer worker.
+
+Escritas em massa (query.update/delete, INSERT ... SELECT) não passam pela
+flush do ORM e precisam chamar `bump_ledger_version` explicitamente.
+"""
+from itertools import chain
+from typing import Iterable
+from uuid import UUID
+
+from sqlalchemy import event, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.models.user import User
+from app.models.category import Category
+from app.models.transaction import Transaction
+
+
+def _affected_users(session: Session) -> set:
+    user_ids = set()
+    for obj in chain(session.new, session.dirty, session.deleted):
+        if isinstance(obj, Transaction):
+            if obj.is_projection:
+                continue
+            if obj in session.dirty and not session.is_modified(obj):
+                continue
+            user_ids.add(obj.user_id)
+        elif isinstance(obj, Category):
+            if obj in session.dirty and not session.is_modified(obj):
+                continue
+            user_ids.add(obj.user_id)
+    user_ids.discard(None)
+    return user_ids
+
+
+def bump_ledger_version(session: Session, user_ids: Iterable[UUID]) -> None:
+    """Incrementa a versão do extrato dos usuários informados"""
+    user_ids = list(user_ids)
+    if not user_ids:
+        return
+    session.connection().execute(
+        update(User.__table__)
+        .where(User.__table__.c.id.in_(user_ids))
+        # updated_at fixo: o onupdate da coluna marcaria o usuário como alterado
+        .values(
+            ledger_version=User.__table__.c.ledger_version + 1,
+            updated_at=User.__table__.c.updated_at,
+        )
+    )
+
+
+@event.listens_for(Session, "before_flush")
+def _bump_on_flush(session, flush_context, instances):
+    bump_ledger_version(session, _affected_users(session))
+
+
+async def get_ledger_version(db: AsyncSession, user_id: UUID) -> int:
+    """Versão atual do extrato do usuário (consulta por chave primária)"""
+    return (await db.execute(select(User.ledger_version).where(User.id == user_id))).scalar() or 0
@@ -0,0 +1,104 @@
+"""
+Pool de conexões do banco: configuração (Settings) e observabilidade.
+
+Cada worker do uvicorn abre até `DB_POOL_SIZE + DB_MAX_OVERFLOW` conexões;
+com N workers o Postgres precisa aceitar N vezes isso. Os gauges
+`db.pool.*` (em /metrics e /health/db) mostram a ocupação, e a distribuição
+`db.pool.wait_seconds` o tempo até a requisição receber uma conexão pronta
+(espera na fila + conexão nova + pre-ping). Espera alta com `checked_out`
+no limite indica pool pequeno para a carga.
+"""
+import time
+
+from sqlalchemy import exc
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+from app.core.config import settings
+from app.core.metrics import metrics
+
+
+class _MonitoredPool:
+    """Mede o checkout e conta os timeouts; o nome vem de `pool_logging_name`"""
+
+    @property
+    def name(self) -> str:
+        return self._orig_logging_name or "primary"
+
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            return super().connect()
+        except exc.TimeoutError:
+            metrics.inc("db.pool.timeouts", pool=self.name)
+            raise
+        finally:
+            metrics.observe("db.pool.wait_seconds", time.perf_counter() - started, pool=self.name)
+
+
+class MonitoredQueuePool(_MonitoredPool, QueuePool):
+    """QueuePool com métricas (engine síncrona)"""
+
+
+class MonitoredAsyncQueuePool(_MonitoredPool, AsyncAdaptedQueuePool):
+    """QueuePool com métricas (engine assíncrona)"""
+
+
+def _is_memory_sqlite(url) -> bool:
+    return url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:")
+
+
+def engine_options(url: str, is_async: bool, name: str = "primary") -> dict:
+    """
+    Argumentos de `create_engine`/`create_async_engine` a partir das Settings.
+
+    SQL no log só com DB_ECHO (independente de DEBUG). O statement timeout
+    vale só para Postgres (asyncpg: server_settings; psycopg2: options).
+    SQLite em memória mantém o pool padrão (uma conexão compartilhada).
+    """
+    parsed = make_url(url)
+    options = {"echo": settings.DB_ECHO, "pool_pre_ping": settings.DB_POOL_PRE_PING}
+    if _is_memory_sqlite(parsed):
+        return options
+
+    options.update(
+        poolclass=MonitoredAsyncQueuePool if is_async else MonitoredQueuePool,
+        pool_logging_name=name,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT_SECONDS,
+        pool_recycle=settings.DB_POOL_RECYCLE_SECONDS,
+    )
+
+    timeout_ms = settings.DB_STATEMENT_TIMEOUT_MS
+    if timeout_ms and parsed.get_backend_name() == "postgresql":
+        if is_async:
+            options["connect_args"] = {"server_settings": {"statement_timeout": str(timeout_ms)}}
+        else:
+            options["connect_args"] = {"options": f"-c statement_timeout={timeout_ms}"}
+    return options
+
+
+def pool_stats(engine) -> dict:
+    """Ocupação atual do pool (vazio para pools sem fila, ex.: SQLite em memória)"""
+    pool = engine.pool
+    if not isinstance(pool, QueuePool):
+        return {}
+    return {
+        "size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "checked_in": pool.checkedin(),
+        "overflow": max(pool.overflow(), 0),     # Negativo = conexões do pool_size ainda não abertas
+        "max_overflow": pool._max_overflow,
+        "timeout_seconds": pool.timeout(),
+    }
+
+
+def pool_collector(engine, name: str = "primary"):
+    """Coletor de gauges `db.pool.*{pool=<nome>}` para o registro de métricas"""
+    def collect() -> dict:
+        return {
+            f"db.pool.{field}{{pool={name}}}": value
+            for field, value in pool_stats(engine).items()
+        }
+    return collect
@@ -0,0 +1,124 @@
+"""
+Roteamento de leituras para a réplica.
+
+Endpoints só de consulta (estatísticas, comparação de cenários, contexto
+da IA) recebem uma sessão somente leitura na réplica (`DATABASE_REPLICA_URL`)
+e deixam o primário para as importações e demais escritas. Sem réplica
+configurada, a sessão de leitura usa o primário.
+
+Ler o que acabou de escrever: o commit de uma sessão do primário com
+escritas (flush ou UPDATE/DELETE/INSERT em massa) marca o usuário da
+requisição (`session.info["user_id"]`, preenchido em get_current_user), e
+as leituras dele vão para o primário durante `DB_READ_YOUR_WRITES_SECONDS`.
+A marcação vale no processo; com vários workers, a requisição seguinte
+pode cair em outro worker e ver a réplica atrasada até a janela cobrir o lag.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Optional
+from uuid import UUID
+
+from sqlalchemy import event
+from sqlalchemy.exc import InvalidRequestError
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.metrics import metrics
+
+
+class RecentWrites:
+    """Usuários que escreveram nos últimos `window` segundos"""
+
+    def __init__(self, window: float = None, clock: Callable[[], float] = time.monotonic):
+        self.window = window if window is not None else settings.DB_READ_YOUR_WRITES_SECONDS
+        self._clock = clock
+        self._deadlines: "OrderedDict[str, float]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def mark(self, user_id) -> None:
+        if self.window <= 0:
+            return
+        now = self._clock()
+        with self._lock:
+            self._deadlines[str(user_id)] = now + self.window
+            self._deadlines.move_to_end(str(user_id))
+            # Janela fixa: ordem de inserção = ordem de expiração
+            while self._deadlines:
+                oldest, deadline = next(iter(self._deadlines.items()))
+                if deadline > now:
+                    break
+                del self._deadlines[oldest]
+
+    def active(self, user_id) -> bool:
+        with self._lock:
+            deadline = self._deadlines.get(str(user_id))
+        return deadline is not None and deadline > self._clock()
+
+
+# Instância global
+recent_writes = RecentWrites()
+
+
+class ReadRouter:
+    """Escolhe o banco da sessão de leitura de cada usuário"""
+
+    def __init__(
+        self,
+        primary: AsyncEngine,
+        replica: Optional[AsyncEngine] = None,
+        writes: RecentWrites = None
+    ):
+        self.primary = primary
+        self.replica = replica
+        self.writes = writes or recent_writes
+        self._sessions = async_sessionmaker(
+            primary, expire_on_commit=False, autoflush=False, info={"read_only": True}
+        )
+
+    def target(self, user_id: UUID) -> str:
+        if self.replica is None or self.writes.active(user_id):
+            return "primary"
+        return "replica"
+
+    def session(self, user_id: UUID) -> AsyncSession:
+        """Sessão somente leitura na réplica, ou no primário logo após escrita do usuário"""
+        target = self.target(user_id)
+        metrics.inc("db.routing.reads", target=target)
+        return self._sessions(bind=self.replica if target == "replica" else self.primary)
+
+
+def _reject_read_only(session: Session) -> None:
+    if session.info.get("read_only"):
+        raise InvalidRequestError("Sessão de leitura (réplica) não aceita escritas")
+
+
+# insert=True: antes do hook do extrato, que já escreveria na réplica
+@event.listens_for(Session, "before_flush", insert=True)
+def _guard_read_only_flush(session, flush_context, instances):
+    _reject_read_only(session)
+
+
+@event.listens_for(Session, "after_flush")
+def _flag_flush(session, flush_context):
+    session.info["wrote"] = True
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _flag_bulk_write(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        _reject_read_only(orm_execute_state.session)
+        orm_execute_state.session.info["wrote"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _mark_recent_write(session):
+    user_id = session.info.get("user_id")
+    if session.info.pop("wrote", False) and user_id is not None:
+        recent_writes.mark(user_id)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_write_flag(session, previous_transaction):
+    session.info.pop("wrote", None)
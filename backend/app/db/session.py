@@ -1,15 +1,56 @@
 from sqlalchemy import create_engine
+from sqlalchemy.engine import URL, make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
 from app.core.config import settings
+from app.core.metrics import metrics
+from app.db.pool import engine_options, pool_collector
+from app.db.routing import ReadRouter
+from app.db import ledger  # noqa: F401  (registra o hook de versão do extrato)
+from app.core import principal  # noqa: F401  (registra a invalidação do principal em cache)
 
-engine = create_engine(settings.DATABASE_URL, echo=settings.DEBUG)
+ASYNC_DRIVERS = {"postgresql": "postgresql+asyncpg", "sqlite": "sqlite+aiosqlite"}
+
+
+def async_url(url: str) -> URL:
+    """
+    DATABASE_URL com o driver assíncrono (postgresql → asyncpg,
+    sqlite → aiosqlite). A mesma variável continua servindo ao Alembic e
+    aos scripts, que usam o driver síncrono.
+    """
+    parsed = make_url(url)
+    driver = ASYNC_DRIVERS.get(parsed.get_backend_name())
+    if driver is None or parsed.get_driver_name() in ("asyncpg", "aiosqlite"):
+        return parsed
+    return parsed.set(drivername=driver)
+
+
+# Aplicação (rotas e serviços): AsyncSession, as consultas não bloqueiam o event loop.
+# expire_on_commit=False: objetos continuam legíveis após o commit sem nova ida ao banco.
+async_engine = create_async_engine(
+    async_url(settings.DATABASE_URL), **engine_options(settings.DATABASE_URL, is_async=True)
+)
+AsyncSessionLocal = async_sessionmaker(async_engine, expire_on_commit=False, autoflush=False)
+
+# Scripts (seed_data.py)
+engine = create_engine(settings.DATABASE_URL, **engine_options(settings.DATABASE_URL, is_async=False))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+metrics.register_collector(pool_collector(async_engine))
+
+# Réplica de leitura (opcional): endpoints só de consulta, ver app/db/routing.py
+replica_engine = None
+if settings.DATABASE_REPLICA_URL:
+    replica_engine = create_async_engine(
+        async_url(settings.DATABASE_REPLICA_URL),
+        **engine_options(settings.DATABASE_REPLICA_URL, is_async=True, name="replica")
+    )
+    metrics.register_collector(pool_collector(replica_engine, "replica"))
+
+read_router = ReadRouter(async_engine, replica_engine)
+
 
-def get_db():
-    """Dependency para obter sessão do banco"""
-    db = SessionLocal()
-    try:
+async def get_db():
+    """Dependency para obter sessão assíncrona do banco"""
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
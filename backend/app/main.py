@@ -1,11 +1,40 @@
-from fastapi import FastAPI
+import time
+from contextlib import asynccontextmanager
+from fastapi import Depends, FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.core.config import settings
+from app.core.metrics import metrics, EndpointContextMiddleware
+from app.db.pool import pool_stats
+from app.db.session import async_engine, get_db
+from app.services.llm_health import llm_health
+from app.services.llm_warmup import model_warmer
+from app.services.chat_history import chat_archiver
+from app.services.category_index import category_index
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Tarefas de background durante a vida da aplicação"""
+    llm_health.start()
+    # Carrega o modelo em background; chamadas ao LLM feitas antes disso esperam a carga
+    model_warmer.start()
+    # Retenção do histórico do chat (conversas antigas vão para o arquivo)
+    chat_archiver.start()
+    yield
+    await category_index.stop()
+    await chat_archiver.stop()
+    await model_warmer.stop()
+    await llm_health.stop()
+
 
 app = FastAPI(
     title="Dashboard Financeiro API",
     description="API Backend para gerenciamento financeiro pessoal",
-    version="0.1.0"
+    version="0.1.0",
+    lifespan=lifespan
 )
 
 # CORS
@@ -17,6 +46,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Rótulo de endpoint para métricas de serviços (ex.: chamadas ao LLM)
+app.add_middleware(EndpointContextMiddleware)
+
 @app.get("/")
 async def root():
     return {"message": "Dashboard Financeiro API", "version": "0.1.0"}
@@ -25,6 +57,29 @@ async def root():
 async def health():
     return {"status": "healthy"}
 
+@app.get("/health/db")
+async def health_db(db: AsyncSession = Depends(get_db)):
+    """Banco respondendo (SELECT 1) e ocupação do pool de conexões"""
+    pool = pool_stats(async_engine)
+    started = time.perf_counter()
+    try:
+        await db.execute(text("SELECT 1"))
+    except Exception as e:
+        return JSONResponse(
+            status_code=503,
+            content={"status": "unhealthy", "error": type(e).__name__, "pool": pool}
+        )
+    return {
+        "status": "healthy",
+        "latency_ms": round((time.perf_counter() - started) * 1000, 2),
+        "pool": pool,
+    }
+
+@app.get("/metrics")
+async def get_metrics():
+    """Métricas do processo (fila do LLM, latências, contadores)"""
+    return metrics.snapshot()
+
 # Importar routers
 from app.api import auth, transactions, categories, projections, ai, upload
 
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Text, DateTime, ForeignKey
+from sqlalchemy import Column, String, Text, DateTime, Integer, LargeBinary, ForeignKey, Index, UniqueConstraint
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
@@ -10,13 +10,48 @@ from app.db.base import Base
 class AIChatHistory(Base):
     """Histórico de conversas com a LLM"""
     __tablename__ = "ai_chat_history"
+    __table_args__ = (
+        # Paginação por chave (created_at, id) do histórico do usuário
+        Index("ix_ai_chat_history_user_created", "user_id", "created_at", "id"),
+        # Dois turnos simultâneos na mesma sessão (ex.: retry durante o stream)
+        # calculam o mesmo índice; só o primeiro é gravado
+        UniqueConstraint("session_id", "turn_index", name="uq_ai_chat_history_session_turn"),
+    )
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
     message = Column(Text, nullable=False)      # Mensagem do usuário
     response = Column(Text, nullable=False)     # Resposta da LLM
     model = Column(String, nullable=True)       # Nome do modelo usado
+
+    # Sessão de conversa (carregada no servidor a cada turno)
+    session_id = Column(UUID(as_uuid=True), nullable=True, index=True)
+    turn_index = Column(Integer, nullable=True)           # Posição do turno na sessão
+    context_summary = Column(Text, nullable=True)         # Resumo dos turnos antigos (fora do orçamento)
+    summary_until_turn = Column(Integer, nullable=True)   # Turnos [0, n) já cobertos pelo resumo
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
     # Relationships
     user = relationship("User", back_populates="ai_chats")
+
+
+class AIChatArchive(Base):
+    """
+    Conversas antigas arquivadas pelo job de retenção.
+
+    Uma linha por sessão: os turnos vão como JSON comprimido (zlib) e saem
+    da tabela quente `ai_chat_history`.
+    """
+    __tablename__ = "ai_chat_archive"
+    __table_args__ = (
+        Index("ix_ai_chat_archive_user_ended", "user_id", "ended_at", "id"),
+    )
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    session_id = Column(UUID(as_uuid=True), nullable=True, index=True)  # None = turnos sem sessão
+    started_at = Column(DateTime(timezone=True), nullable=False)
+    ended_at = Column(DateTime(timezone=True), nullable=False)
+    turn_count = Column(Integer, nullable=False)
+    payload = Column(LargeBinary, nullable=False)        # JSON dos turnos, comprimido com zlib
+    archived_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -0,0 +1,28 @@
+from sqlalchemy import Column, String, Text, DateTime, Integer, LargeBinary, ForeignKey, UniqueConstraint
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.sql import func
+import uuid
+
+from app.db.base import Base
+
+
+class DescriptionEmbedding(Base):
+    """
+    Embedding da descrição de transações (índice vetorial de categorias).
+
+    Um vetor por (usuário, modelo, descrição), guardado como float32 em bytes
+    (bytea no PostgreSQL). Descrições repetidas compartilham o mesmo vetor;
+    a categoria vem das transações confirmadas com essa descrição.
+    """
+    __tablename__ = "description_embeddings"
+    __table_args__ = (
+        UniqueConstraint("user_id", "model", "description", name="uq_description_embeddings_user_model_desc"),
+    )
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    model = Column(String, nullable=False)           # Modelo de embedding que gerou o vetor
+    description = Column(Text, nullable=False)
+    dim = Column(Integer, nullable=False)
+    vector = Column(LargeBinary, nullable=False)     # float32, normalizado (norma 1)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
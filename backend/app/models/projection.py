@@ -11,11 +11,16 @@ class Projection(Base):
     """
     Cenários de projeção para a aba manual.
     Permite ao usuário criar simulações "what-if" isoladas dos dados reais.
+
+    Variações ("com carro", "com carro + aumento") apontam para o cenário
+    pai e guardam só as diferenças: itens adicionados e overrides
+    (ProjectionOverride) sobre os itens herdados.
     """
     __tablename__ = "projections"
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    parent_id = Column(UUID(as_uuid=True), ForeignKey("projections.id", ondelete="CASCADE"), nullable=True, index=True)  # Cenário de origem (variação)
     name = Column(String, nullable=False)  # "Cenário Conservador", "Se comprar carro"
     description = Column(Text, nullable=True)
     start_date = Column(Date, nullable=True)
@@ -26,4 +31,6 @@ class Projection(Base):
 
     # Relationships
     user = relationship("User", back_populates="projections")
-    transactions = relationship("Transaction", back_populates="projection")
+    items = relationship("ProjectionItem", back_populates="projection", cascade="all, delete-orphan")
+    rules = relationship("ProjectionRule", back_populates="projection", cascade="all, delete-orphan")
+    overrides = relationship("ProjectionOverride", cascade="all, delete-orphan")
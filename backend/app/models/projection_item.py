@@ -0,0 +1,42 @@
+from sqlalchemy import Column, Text, DateTime, Date, Numeric, Boolean, ForeignKey, Index, true
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.sql import func
+from sqlalchemy.orm import relationship
+import uuid
+
+from app.db.base import Base
+
+
+class ProjectionItem(Base):
+    """
+    Item de um cenário de projeção (aba manual).
+
+    Fica fora de `transactions`: as consultas do extrato real não varrem
+    nem indexam dados simulados. Os atributos is_projection e
+    bank_statement_id existem só para o item ser servido com o mesmo
+    schema de transação pelos endpoints antigos; is_manual é coluna para
+    o downgrade da migration devolver o valor original.
+    """
+    __tablename__ = "projection_items"
+    __table_args__ = (
+        Index("ix_projection_items_projection_date", "projection_id", "date"),
+    )
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    projection_id = Column(UUID(as_uuid=True), ForeignKey("projections.id", ondelete="CASCADE"), nullable=True)
+    date = Column(Date, nullable=False)
+    description = Column(Text, nullable=False)
+    amount = Column(Numeric(10, 2), nullable=False)  # Negativo = despesa, Positivo = receita
+    category_id = Column(UUID(as_uuid=True), ForeignKey("categories.id", ondelete="SET NULL"), nullable=True)
+    is_manual = Column(Boolean, nullable=False, default=True, server_default=true())
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+
+    # Relationships
+    projection = relationship("Projection", back_populates="items")
+
+    # Compatibilidade com TransactionResponse
+    is_projection = True
+    bank_statement_id = None
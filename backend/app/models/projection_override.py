@@ -0,0 +1,36 @@
+from sqlalchemy import Column, String, Text, DateTime, Date, Numeric, ForeignKey, UniqueConstraint
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.sql import func
+import uuid
+
+from app.db.base import Base
+
+
+class ProjectionOverride(Base):
+    """
+    Alteração de um cenário derivado sobre um item herdado do cenário pai.
+
+    - remove: o item herdado some deste cenário (e dos derivados dele)
+    - modify: campos preenchidos substituem os do item herdado
+
+    Itens adicionados são itens comuns do próprio cenário; só as
+    diferenças ocupam espaço.
+    """
+    __tablename__ = "projection_overrides"
+    __table_args__ = (
+        UniqueConstraint("projection_id", "item_id", name="uq_projection_overrides_projection_item"),
+    )
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    projection_id = Column(UUID(as_uuid=True), ForeignKey("projections.id", ondelete="CASCADE"), nullable=False, index=True)
+    item_id = Column(UUID(as_uuid=True), ForeignKey("projection_items.id", ondelete="CASCADE"), nullable=False)
+    action = Column(String, nullable=False)  # remove, modify
+
+    # Campos substituídos (NULL = mantém o valor herdado)
+    date = Column(Date, nullable=True)
+    description = Column(Text, nullable=True)
+    amount = Column(Numeric(10, 2), nullable=True)
+    category_id = Column(UUID(as_uuid=True), ForeignKey("categories.id", ondelete="SET NULL"), nullable=True)
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
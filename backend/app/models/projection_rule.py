@@ -0,0 +1,37 @@
+from sqlalchemy import Column, String, Text, DateTime, Date, Integer, Numeric, ForeignKey
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.sql import func
+from sqlalchemy.orm import relationship
+import uuid
+
+from app.db.base import Base
+
+
+class ProjectionRule(Base):
+    """
+    Item recorrente de um cenário de projeção ("parcela do carro por 60 meses").
+
+    Uma linha substitui todas as transações que a regra geraria: as
+    ocorrências são expandidas na consulta (app.services.recurrence), nunca
+    gravadas em `transactions`.
+    """
+    __tablename__ = "projection_rules"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    projection_id = Column(UUID(as_uuid=True), ForeignKey("projections.id", ondelete="CASCADE"), nullable=False, index=True)
+    category_id = Column(UUID(as_uuid=True), ForeignKey("categories.id", ondelete="SET NULL"), nullable=True)
+    description = Column(Text, nullable=False)
+    amount = Column(Numeric(10, 2), nullable=False)  # Valor da primeira ocorrência (negativo = despesa)
+
+    frequency = Column(String, nullable=False)       # monthly, weekly, yearly
+    interval = Column(Integer, nullable=False, default=1)  # A cada N períodos
+    start_date = Column(Date, nullable=False)
+    end_date = Column(Date, nullable=True)           # Sem fim: vale até o fim do cenário
+    growth_rate = Column(Numeric(6, 4), nullable=False, default=0)  # Reajuste anual (0.05 = 5% a cada aniversário)
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+
+    # Relationships
+    projection = relationship("Projection", back_populates="rules")
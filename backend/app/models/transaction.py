@@ -12,12 +12,13 @@ class Transaction(Base):
     Transações financeiras (despesas e receitas).
 
     Tipos de transação:
-    1. Automáticas: is_manual=False, is_projection=False (vem de extrato)
-    2. Manuais: is_manual=True, is_projection=False (entrada manual do usuário)
-    3. Projeções: is_projection=True (exclusivo da aba de projeções manuais)
+    1. Automáticas: is_manual=False (vem de extrato)
+    2. Manuais: is_manual=True (entrada manual do usuário)
 
-    IMPORTANTE: Queries devem sempre filtrar por is_projection para evitar
-    misturar dados reais com simulações!
+    Itens de projeção ficam em `projection_items` (ProjectionItem). As
+    colunas is_projection/projection_id só existem para linhas antigas
+    anteriores à migration 5ebaf1921d1c (alembic/versions); filtrar
+    is_projection == False continua correto.
     """
     __tablename__ = "transactions"
 
@@ -43,5 +44,4 @@ class Transaction(Base):
     # Relationships
     user = relationship("User", back_populates="transactions")
     category = relationship("Category", back_populates="transactions")
-    projection = relationship("Projection", back_populates="transactions")
     bank_statement = relationship("BankStatement", back_populates="transactions")
@@ -11,12 +11,16 @@ class ChatMessage(BaseModel):
 
 class ChatRequest(BaseModel):
     message: str
+    # Com session_id o histórico é carregado no servidor; conversation_history
+    # só é usado para iniciar uma sessão nova. Sessões arquivadas não aceitam turnos novos.
+    session_id: Optional[UUID] = None
     conversation_history: Optional[List[ChatMessage]] = None
 
 
 class ChatResponse(BaseModel):
     message: str
     timestamp: datetime
+    session_id: Optional[UUID] = None
 
 
 class AIChatHistoryResponse(BaseModel):
@@ -24,7 +28,55 @@ class AIChatHistoryResponse(BaseModel):
     message: str
     response: str
     model: Optional[str]
+    session_id: Optional[UUID] = None
     created_at: datetime
 
     class Config:
         from_attributes = True
+
+
+class AIChatHistoryPreview(BaseModel):
+    """Item da listagem do histórico: só prévias (texto completo em /chat/history/{id})"""
+    id: UUID
+    session_id: Optional[UUID] = None
+    turn_index: Optional[int] = None
+    model: Optional[str] = None
+    message_preview: str
+    response_preview: str
+    truncated: bool
+    created_at: datetime
+
+
+class AIChatHistoryPage(BaseModel):
+    items: List[AIChatHistoryPreview]
+    next_cursor: Optional[str] = None  # Passar em `cursor` para a próxima página
+
+
+class AIChatArchiveSummary(BaseModel):
+    id: UUID
+    session_id: Optional[UUID] = None
+    started_at: datetime
+    ended_at: datetime
+    turn_count: int
+    archived_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+
+class AIChatArchivePage(BaseModel):
+    items: List[AIChatArchiveSummary]
+    next_cursor: Optional[str] = None
+
+
+class AIChatArchivedTurn(BaseModel):
+    id: UUID
+    turn_index: Optional[int] = None
+    message: str
+    response: str
+    model: Optional[str] = None
+    created_at: Optional[datetime] = None
+
+
+class AIChatArchiveDetail(AIChatArchiveSummary):
+    turns: List[AIChatArchivedTurn]
@@ -39,6 +39,7 @@ class TransactionReviewItem(BaseModel):
     description: str
     amount: float
     suggested_category: Optional[str] = None
+    suggestion_source: Optional[str] = None  # "history" (vizinhos) ou "llm"
     category_id: Optional[UUID] = None
 
 
@@ -1,7 +1,8 @@
-from pydantic import BaseModel
-from typing import Optional
+from pydantic import BaseModel, Field, condecimal, model_validator
+from typing import List, Literal, Optional
 from datetime import datetime, date
 from uuid import UUID
+from decimal import Decimal
 
 
 class ProjectionBase(BaseModel):
@@ -27,6 +28,7 @@ class ProjectionUpdate(BaseModel):
 class ProjectionResponse(ProjectionBase):
     id: UUID
     user_id: UUID
+    parent_id: Optional[UUID] = None
     created_at: datetime
     updated_at: Optional[datetime]
 
@@ -35,7 +37,88 @@ class ProjectionResponse(ProjectionBase):
 
 
 class ProjectionWithStats(ProjectionResponse):
-    total_transactions: int
+    total_transactions: int             # Transações gravadas + ocorrências das regras
     total_income: float
     total_expenses: float
     balance: float
+    total_rules: int = 0
+
+
+class ProjectionItem(BaseModel):
+    """Item efetivo do cenário, já resolvido pela cadeia de variações"""
+    id: UUID
+    source_projection_id: UUID      # Cenário onde a transação está gravada
+    date: date
+    description: str
+    amount: Decimal
+    category_id: Optional[UUID] = None
+    inherited: bool                 # Vem de um cenário ancestral
+    modified: bool                  # Alterado por override deste cenário ou de um intermediário
+
+
+class ProjectionRuleBase(BaseModel):
+    description: str
+    amount: condecimal(max_digits=10, decimal_places=2)  # type: ignore
+    category_id: Optional[UUID] = None
+    frequency: Literal["monthly", "weekly", "yearly"] = "monthly"
+    interval: int = Field(1, ge=1, le=60)
+    start_date: date
+    end_date: Optional[date] = None
+    growth_rate: Decimal = Field(Decimal("0"), ge=-1, le=10)  # Reajuste anual (0.05 = 5%)
+
+    @model_validator(mode="after")
+    def check_dates(self):
+        if self.end_date is not None and self.end_date < self.start_date:
+            raise ValueError("end_date deve ser posterior a start_date")
+        return self
+
+
+class ProjectionRuleCreate(ProjectionRuleBase):
+    pass
+
+
+class ProjectionRuleUpdate(BaseModel):
+    description: Optional[str] = None
+    amount: Optional[condecimal(max_digits=10, decimal_places=2)] = None  # type: ignore
+    category_id: Optional[UUID] = None
+    frequency: Optional[Literal["monthly", "weekly", "yearly"]] = None
+    interval: Optional[int] = Field(None, ge=1, le=60)
+    start_date: Optional[date] = None
+    end_date: Optional[date] = None
+    growth_rate: Optional[Decimal] = Field(None, ge=-1, le=10)
+
+    @model_validator(mode="after")
+    def check_required_not_null(self):
+        # Campos omitidos ficam como estão; null explícito só onde a coluna aceita
+        nulls = [
+            name for name in self.model_fields_set - {"category_id", "end_date"}
+            if getattr(self, name) is None
+        ]
+        if nulls:
+            raise ValueError(f"Campos não podem ser nulos: {', '.join(sorted(nulls))}")
+        return self
+
+
+class ProjectionRuleResponse(ProjectionRuleBase):
+    id: UUID
+    projection_id: UUID
+    created_at: datetime
+    updated_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+
+class ProjectionOccurrence(BaseModel):
+    """Ocorrência de uma regra expandida na consulta (não existe no banco)"""
+    rule_id: UUID
+    date: date
+    description: str
+    amount: float
+    category_id: Optional[UUID] = None
+
+
+class ProjectionOccurrenceList(BaseModel):
+    occurrences: List[ProjectionOccurrence]
+    total: int
+    truncated: bool
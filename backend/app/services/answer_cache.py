@@ -0,0 +1,178 @@
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from app.core.config import settings
+from app.core.metrics import metrics
+
+
+def normalize_question(question: str) -> str:
+    """Minúsculas, sem acentos, sem pontuação e espaços colapsados"""
+    text = unicodedata.normalize("NFKD", question.lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    text = re.sub(r"[^\w\s]", " ", text)
+    return " ".join(text.split())
+
+
+@dataclass
+class _Entry:
+    answer: str
+    created_at: float
+    embedding: Optional[np.ndarray] = None
+
+
+@dataclass
+class _UserCache:
+    ledger_version: int
+    entries: "OrderedDict[str, _Entry]" = field(default_factory=OrderedDict)
+    # Matriz (n, d) de embeddings normalizados, alinhada com `keys`
+    matrix: Optional[np.ndarray] = None
+    keys: List[str] = field(default_factory=list)
+    dirty: bool = False
+
+
+class AnswerCache:
+    """
+    Cache de respostas de análise por (usuário, versão do extrato, pergunta).
+
+    - Acerto exato pela pergunta normalizada.
+    - Opcionalmente, acerto semântico: similaridade de cosseno entre o
+      embedding da pergunta e a matriz NumPy de perguntas já respondidas.
+    - Entradas expiram por TTL e cada usuário guarda no máximo
+      `max_entries` (LRU). Uma versão de extrato diferente descarta tudo
+      do usuário; não há invalidação manual.
+    """
+
+    def __init__(
+        self,
+        ttl: float = None,
+        max_entries: int = None,
+        max_users: int = 1024,
+        similarity_threshold: float = None,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.ttl = ttl if ttl is not None else settings.ANSWER_CACHE_TTL_SECONDS
+        self.max_entries = max_entries if max_entries is not None else settings.ANSWER_CACHE_MAX_ENTRIES
+        self.max_users = max_users
+        self.similarity_threshold = (
+            similarity_threshold if similarity_threshold is not None else settings.ANSWER_CACHE_SIMILARITY
+        )
+        self._clock = clock
+        self._users: "OrderedDict[str, _UserCache]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _user(self, user_id: str, ledger_version: int, create: bool) -> Optional[_UserCache]:
+        cache = self._users.get(user_id)
+        if cache is not None and cache.ledger_version != ledger_version:
+            # Extrato mudou: respostas antigas não valem mais
+            del self._users[user_id]
+            cache = None
+        if cache is None and create:
+            cache = self._users[user_id] = _UserCache(ledger_version=ledger_version)
+            while len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+        if cache is not None:
+            self._users.move_to_end(user_id)
+        return cache
+
+    def _expired(self, entry: _Entry) -> bool:
+        return self._clock() - entry.created_at > self.ttl
+
+    def get(self, user_id: str, ledger_version: int, question: str) -> Optional[str]:
+        """Resposta em cache para a mesma pergunta (normalizada)"""
+        key = normalize_question(question)
+        with self._lock:
+            cache = self._user(str(user_id), ledger_version, create=False)
+            if cache is None:
+                return None
+
+            entry = cache.entries.get(key)
+            if entry is None or self._expired(entry):
+                return None
+            cache.entries.move_to_end(key)
+            return entry.answer
+
+    def get_similar(
+        self,
+        user_id: str,
+        ledger_version: int,
+        embedding: List[float]
+    ) -> Optional[str]:
+        """Resposta em cache para a pergunta semanticamente mais próxima"""
+        with self._lock:
+            cache = self._user(str(user_id), ledger_version, create=False)
+            if cache is None:
+                return None
+
+            match = self._nearest(cache, embedding)
+            if match is None:
+                return None
+            cache.entries.move_to_end(match)
+            return cache.entries[match].answer
+
+    def put(
+        self,
+        user_id: str,
+        ledger_version: int,
+        question: str,
+        answer: str,
+        embedding: Optional[List[float]] = None
+    ) -> None:
+        key = normalize_question(question)
+        vector = None
+        if embedding is not None:
+            vector = np.asarray(embedding, dtype=np.float32)
+            norm = np.linalg.norm(vector)
+            vector = vector / norm if norm else None
+
+        with self._lock:
+            cache = self._user(str(user_id), ledger_version, create=True)
+            cache.entries[key] = _Entry(answer=answer, created_at=self._clock(), embedding=vector)
+            cache.entries.move_to_end(key)
+            while len(cache.entries) > self.max_entries:
+                cache.entries.popitem(last=False)
+            cache.dirty = True
+
+    def _nearest(self, cache: _UserCache, embedding: List[float]) -> Optional[str]:
+        # Remove expirados e reconstrói a matriz só quando o conjunto mudou
+        expired = [k for k, e in cache.entries.items() if self._expired(e)]
+        for k in expired:
+            del cache.entries[k]
+        if expired or cache.dirty:
+            cache.keys = [k for k, e in cache.entries.items() if e.embedding is not None]
+            cache.matrix = (
+                np.vstack([cache.entries[k].embedding for k in cache.keys]) if cache.keys else None
+            )
+            cache.dirty = False
+
+        if cache.matrix is None:
+            return None
+
+        query = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if not norm or query.shape[0] != cache.matrix.shape[1]:
+            return None
+
+        scores = cache.matrix @ (query / norm)
+        best = int(np.argmax(scores))
+        if scores[best] >= self.similarity_threshold:
+            return cache.keys[best]
+        return None
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            return {
+                "llm.answer_cache.users": len(self._users),
+                "llm.answer_cache.entries": sum(len(c.entries) for c in self._users.values()),
+            }
+
+
+# Instância global
+answer_cache = AnswerCache()
+metrics.register_collector(answer_cache.stats)
@@ -0,0 +1,332 @@
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import date
+from statistics import NormalDist
+from typing import Dict, List, Optional, Tuple
+from uuid import UUID
+
+import numpy as np
+from sqlalchemy import extract, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.db.ledger import get_ledger_version
+from app.models.category import Category
+from app.models.transaction import Transaction
+
+PERCENTILES = (5, 25, 50, 75, 95)
+
+# Item recorrente: aparece em pelo menos 75% dos meses (mínimo 3), inclusive
+# num dos 2 últimos, com variação pequena de valor
+RECURRING_MIN_SHARE = 0.75
+RECURRING_MIN_MONTHS = 3
+RECURRING_MAX_CV = 0.1
+
+# Dispersão mínima (log) para séries com poucos meses ativos
+MIN_LOG_SIGMA = 0.1
+
+# Elementos (caminhos × meses × séries) por bloco: blocos pequenos cabem no
+# cache da CPU e são mais rápidos que um único array gigante
+CHUNK_ELEMENTS = 262_144
+
+# Quantis da normal padrão nos pontos médios de QUANTILE_POINTS faixas: o
+# valor sorteado vem de uma tabela por série em vez de exp() por célula
+QUANTILE_POINTS = 1024
+NORMAL_QUANTILES = np.array(
+    [NormalDist().inv_cdf((k + 0.5) / QUANTILE_POINTS) for k in range(QUANTILE_POINTS)],
+    dtype=np.float32
+)
+
+
+def month_index(year: int, month: int) -> int:
+    return year * 12 + month - 1
+
+
+def month_label(index: int) -> str:
+    year, month = divmod(index, 12)
+    return f"{year}-{month + 1:02d}"
+
+
+@dataclass
+class CashFlowModel:
+    """Distribuições mensais ajustadas ao histórico real do usuário"""
+    history_months: int
+    first_month: int                     # Índice do primeiro mês simulado
+    starting_balance: float
+    series: List[Dict] = field(default_factory=list)     # categoria, sinal, média
+    sign: np.ndarray = None              # (S,) +1 receita, -1 despesa
+    p_active: np.ndarray = None          # (S,) chance de a série ter valor no mês
+    log_mu: np.ndarray = None            # (S,) lognormal do valor quando ativa
+    log_sigma: np.ndarray = None         # (S,)
+    recurring: List[Dict] = field(default_factory=list)
+    recurring_amounts: np.ndarray = None  # (R,) valor com sinal por mês
+
+
+class CashFlowSimulator:
+    """
+    Simulação Monte Carlo do fluxo de caixa.
+
+    Ajuste (uma consulta agregada por categoria, descrição e mês):
+    - Itens recorrentes (salário, aluguel, assinaturas) entram como valores
+      fixos por mês.
+    - O resto vira séries por (categoria, receita/despesa) com chance de
+      ocorrer no mês e valor lognormal.
+
+    A simulação é vetorizada em NumPy (caminhos × meses × séries) e devolve
+    faixas de percentis do saldo. Resultados ficam em cache por versão do
+    extrato.
+    """
+
+    def __init__(self, max_entries: int = None):
+        self.max_entries = max_entries or settings.SIMULATION_CACHE_ENTRIES
+        self._cache: "OrderedDict[Tuple, Dict]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    async def simulate(
+        self,
+        db: AsyncSession,
+        user_id: UUID,
+        months: int,
+        paths: int = None,
+        lookback_months: int = None,
+        annual_inflation: float = 0.0,
+        starting_balance: Optional[float] = None,
+        seed: Optional[int] = None,
+        today: date = None
+    ) -> Optional[Dict]:
+        """Faixas de saldo para os próximos `months` meses (None sem histórico)"""
+        paths = paths or settings.SIMULATION_DEFAULT_PATHS
+        lookback_months = lookback_months or settings.SIMULATION_LOOKBACK_MONTHS
+        today = today or date.today()
+        version = await get_ledger_version(db, user_id)
+        if seed is None:
+            # Determinístico por usuário e versão: a mesma pergunta dá a mesma resposta
+            seed = zlib.crc32(f"{user_id}:{version}".encode())
+
+        key = (str(user_id), version, months, paths, lookback_months,
+               annual_inflation, starting_balance, seed, today.year, today.month)
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                metrics.inc("simulation.cache.hits")
+                return self._cache[key]
+        metrics.inc("simulation.cache.misses")
+
+        model = await self.fit(db, user_id, lookback_months, today, starting_balance)
+        if model is None:
+            return None
+
+        started = time.perf_counter()
+        result = self.run(model, months, paths, annual_inflation, seed)
+        metrics.observe("simulation.seconds", time.perf_counter() - started)
+
+        with self._lock:
+            self._cache[key] = result
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+        return result
+
+    async def fit(
+        self,
+        db: AsyncSession,
+        user_id: UUID,
+        lookback_months: int,
+        today: date,
+        starting_balance: Optional[float] = None
+    ) -> Optional[CashFlowModel]:
+        """Ajusta o modelo aos últimos meses completos do histórico real"""
+        current = month_index(today.year, today.month)
+        end = current - 1
+
+        first_date = (await db.execute(
+            select(func.min(Transaction.date)).where(
+                Transaction.user_id == user_id,
+                Transaction.is_projection == False
+            )
+        )).scalar()
+        if first_date is None:
+            return None
+        start = max(end - lookback_months + 1, month_index(first_date.year, first_date.month))
+        if start > end:
+            return None
+
+        start_year, start_month = divmod(start, 12)
+        year = extract("year", Transaction.date)
+        month = extract("month", Transaction.date)
+        rows = (await db.execute(
+            select(
+                Transaction.category_id,
+                func.coalesce(Category.name, "Sem categoria"),
+                Transaction.description,
+                year,
+                month,
+                func.sum(Transaction.amount)
+            ).select_from(Transaction).outerjoin(
+                Category, Category.id == Transaction.category_id
+            ).where(
+                Transaction.user_id == user_id,
+                Transaction.is_projection == False,
+                Transaction.date >= date(start_year, start_month + 1, 1),
+                Transaction.date < date(today.year, today.month, 1)
+            ).group_by(
+                Transaction.category_id,
+                func.coalesce(Category.name, "Sem categoria"),
+                Transaction.description,
+                year,
+                month
+            )
+        )).all()
+
+        if starting_balance is None:
+            starting_balance = float((await db.execute(
+                select(func.coalesce(func.sum(Transaction.amount), 0)).where(
+                    Transaction.user_id == user_id,
+                    Transaction.is_projection == False
+                )
+            )).scalar())
+
+        history = end - start + 1
+        model = CashFlowModel(history_months=history, first_month=current, starting_balance=starting_balance)
+        if not rows:
+            return self._finish(model, [], np.zeros((0, history)), [])
+
+        # Matriz descrições × meses com o total de cada mês
+        keys = list(dict.fromkeys((r[0], r[1], r[2]) for r in rows))
+        position = {k: i for i, k in enumerate(keys)}
+        values = np.zeros((len(keys), history))
+        for category_id, name, description, y, m, total in rows:
+            values[position[(category_id, name, description)], month_index(int(y), int(m)) - start] += float(total)
+
+        recurring = self._recurring_mask(values)
+        model.recurring = [
+            {"category": keys[i][1], "description": keys[i][2],
+             "amount": round(float(np.median(values[i][values[i] != 0])), 2)}
+            for i in np.flatnonzero(recurring)
+        ]
+
+        # Resto agregado por (categoria, sinal)
+        residual = values[~recurring]
+        residual_keys = [k for k, r in zip(keys, recurring) if not r]
+        categories = list(dict.fromkeys((k[0], k[1]) for k in residual_keys))
+        cat_position = {c: i for i, c in enumerate(categories)}
+        rows_idx = np.array([cat_position[(k[0], k[1])] for k in residual_keys], dtype=np.intp)
+        income = np.zeros((len(categories), history))
+        expenses = np.zeros((len(categories), history))
+        if len(rows_idx):
+            np.add.at(income, rows_idx, np.clip(residual, 0, None))
+            np.add.at(expenses, rows_idx, np.clip(-residual, 0, None))
+
+        return self._finish(model, categories, np.vstack([income, expenses]), [1] * len(categories) + [-1] * len(categories))
+
+    @staticmethod
+    def _recurring_mask(values: np.ndarray) -> np.ndarray:
+        history = values.shape[1]
+        present = values != 0
+        count = present.sum(axis=1)
+        min_months = max(RECURRING_MIN_MONTHS, int(np.ceil(RECURRING_MIN_SHARE * history)))
+
+        # Coeficiente de variação só sobre os meses em que o item apareceu
+        mean = values.sum(axis=1) / np.maximum(count, 1)
+        std = np.sqrt((np.where(present, values - mean[:, None], 0) ** 2).sum(axis=1) / np.maximum(count, 1))
+        with np.errstate(invalid="ignore", divide="ignore"):
+            cv = std / np.abs(mean)
+        same_sign = (values >= 0).all(axis=1) | (values <= 0).all(axis=1)
+        recent = present[:, -2:].any(axis=1)
+        return (count >= min_months) & same_sign & recent & (cv <= RECURRING_MAX_CV)
+
+    @staticmethod
+    def _finish(model: CashFlowModel, categories, magnitudes: np.ndarray, signs: List[int]) -> CashFlowModel:
+        active = magnitudes > 0
+        keep = active.any(axis=1)
+        magnitudes, active = magnitudes[keep], active[keep]
+        signs = np.array(signs, dtype=np.float32)[keep] if len(signs) else np.zeros(0, dtype=np.float32)
+        labels = [(categories[i % len(categories)][1] if categories else None) for i in np.flatnonzero(keep)]
+
+        with np.errstate(divide="ignore"):
+            logs = np.where(active, np.log(np.where(active, magnitudes, 1)), np.nan)
+        counts = active.sum(axis=1)
+        model.p_active = (counts / max(model.history_months, 1)).astype(np.float32)
+        model.log_mu = (np.nansum(logs, axis=1) / np.maximum(counts, 1)).astype(np.float32)
+        model.log_sigma = np.maximum(
+            np.sqrt(np.nansum((logs - model.log_mu[:, None]) ** 2, axis=1) / np.maximum(counts, 1)),
+            MIN_LOG_SIGMA
+        ).astype(np.float32) if len(counts) else np.zeros(0, dtype=np.float32)
+        model.sign = signs
+        model.series = [
+            {"category": label, "type": "income" if sign > 0 else "expense",
+             "mean_monthly": round(float(magnitudes[i].mean()), 2)}
+            for i, (label, sign) in enumerate(zip(labels, signs))
+        ]
+        model.recurring_amounts = np.array([r["amount"] for r in model.recurring], dtype=np.float32)
+        return model
+
+    def run(
+        self,
+        model: CashFlowModel,
+        months: int,
+        paths: int,
+        annual_inflation: float = 0.0,
+        seed: int = 0
+    ) -> Dict:
+        """Simula `paths` caminhos de `months` meses e resume em percentis"""
+        rng = np.random.default_rng(seed)
+        series = len(model.sign)
+
+        # Inflação só nas despesas: fator por mês (M,) e por (mês, série)
+        growth = ((1 + annual_inflation) ** (np.arange(1, months + 1) / 12)).astype(np.float32)
+        recurring = model.recurring_amounts
+        recurring_monthly = (
+            np.where(recurring < 0, recurring[None, :] * growth[:, None], recurring[None, :]).sum(axis=1)
+            if len(recurring) else np.zeros(months, dtype=np.float32)
+        )
+        weights = np.where(model.sign < 0, growth[:, None], 1).astype(np.float32)  # (M, S)
+
+        # Um único uniforme por célula decide se a série ocorre (u < p) e,
+        # reescalado, escolhe o quantil do valor na tabela; o índice além da
+        # tabela cai na coluna de zeros (série inativa no mês)
+        table = np.zeros((series, QUANTILE_POINTS + 1), dtype=np.float32)
+        table[:, :QUANTILE_POINTS] = model.sign[:, None] * np.exp(
+            model.log_mu[:, None] + model.log_sigma[:, None] * NORMAL_QUANTILES[None, :]
+        )
+        flat = table.ravel()
+        offsets = (np.arange(series) * (QUANTILE_POINTS + 1)).astype(np.int32)
+        scale = (QUANTILE_POINTS / np.maximum(model.p_active, 1e-6)).astype(np.float32)
+
+        net = np.zeros((paths, months), dtype=np.float32)
+        chunk = max(1, CHUNK_ELEMENTS // max(months * series, 1))
+        for begin in range(0, paths if series else 0, chunk):
+            n = min(chunk, paths - begin)
+            u = rng.random((n, months, series), dtype=np.float32)
+            u *= scale
+            index = np.minimum(u, QUANTILE_POINTS, out=u).astype(np.int32)
+            index += offsets
+            net[begin:begin + n] = np.einsum("nms,ms->nm", np.take(flat, index), weights)
+
+        balances = model.starting_balance + np.cumsum(net + recurring_monthly, axis=1)
+        bands = np.percentile(balances, PERCENTILES, axis=0)                # (P, M)
+
+        return {
+            "months": months,
+            "paths": paths,
+            "history_months": model.history_months,
+            "starting_balance": round(model.starting_balance, 2),
+            "annual_inflation": annual_inflation,
+            "percentiles": list(PERCENTILES),
+            "bands": [
+                {"month": month_label(model.first_month + m),
+                 **{f"p{p}": round(float(bands[i, m]), 2) for i, p in enumerate(PERCENTILES)}}
+                for m in range(months)
+            ],
+            "ending_balance": {f"p{p}": round(float(bands[i, -1]), 2) for i, p in enumerate(PERCENTILES)},
+            "probability_negative": round(float((balances.min(axis=1) < 0).mean()), 4),
+            "recurring": model.recurring,
+            "series": model.series,
+        }
+
+
+# Instância global
+cashflow_simulator = CashFlowSimulator()
@@ -0,0 +1,367 @@
+import asyncio
+import logging
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence
+from uuid import UUID
+
+import numpy as np
+from sqlalchemy import and_, func, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.db.ledger import get_ledger_version
+from app.models.description_embedding import DescriptionEmbedding
+from app.models.transaction import Transaction
+from app.services.llm_scheduler import LLMPriority
+from app.services.llm_service import llm_service
+
+logger = logging.getLogger(__name__)
+
+Embedder = Callable[..., Awaitable[Optional[List[List[float]]]]]
+
+
+def to_blob(vector: np.ndarray) -> bytes:
+    return np.asarray(vector, dtype=np.float32).tobytes()
+
+
+def from_blobs(blobs: Sequence[bytes], dim: int) -> np.ndarray:
+    """Matriz (n, dim) float32 a partir dos vetores em bytes, sem cópia por linha"""
+    if not blobs:
+        return np.empty((0, dim), dtype=np.float32)
+    return np.frombuffer(b"".join(blobs), dtype=np.float32).reshape(len(blobs), dim)
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.where(norms == 0, 1, norms)
+
+
+@dataclass
+class _UserIndex:
+    ledger_version: int
+    model: str
+    matrix: np.ndarray         # (n, d) descrições confirmadas, normalizadas
+    labels: np.ndarray         # (n,) índice da categoria em `categories`
+    weights: np.ndarray        # (n,) peso do voto (transações com a descrição)
+    categories: List[UUID]
+
+
+class CategoryIndex:
+    """
+    Sugestão de categoria por vizinhos mais próximos.
+
+    Cada usuário tem um índice em memória com os embeddings das descrições
+    de transações já categorizadas (reconstruído quando a versão do extrato
+    muda). Um lote importado vira uma única multiplicação de matrizes
+    (lote × índice); as k descrições mais parecidas votam na categoria,
+    ponderadas pela similaridade e pela quantidade de transações. Linhas sem
+    voto confiável ficam para o LLM.
+
+    Na importação só as descrições do lote são embedadas na hora; o
+    histórico que ainda não tem vetor é completado em background (sessão
+    própria), e até lá a sugestão usa o que já está gravado.
+    """
+
+    def __init__(
+        self,
+        k: int = None,
+        min_similarity: float = None,
+        min_confidence: float = None,
+        embedder: Embedder = None,
+        backfill_batch: int = 256,
+        max_users: int = 256,
+        session_factory: Callable[[], AsyncSession] = None
+    ):
+        self.k = k or settings.CATEGORY_KNN_K
+        self.min_similarity = min_similarity or settings.CATEGORY_KNN_MIN_SIMILARITY
+        self.min_confidence = min_confidence or settings.CATEGORY_KNN_MIN_CONFIDENCE
+        self.embedder = embedder or llm_service.embed
+        self.backfill_batch = backfill_batch
+        self.max_users = max_users
+        self._session_factory = session_factory
+        self._indexes: "OrderedDict[UUID, _UserIndex]" = OrderedDict()
+        self._backfills: Dict[UUID, asyncio.Task] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def model(self) -> str:
+        return settings.OLLAMA_EMBED_MODEL
+
+    async def suggest(
+        self,
+        db: AsyncSession,
+        user_id: UUID,
+        transactions: List[Dict]
+    ) -> List[Optional[UUID]]:
+        """
+        Categoria sugerida (id) para cada transação, ou None quando os
+        vizinhos não concordam o suficiente (ou o usuário ainda não tem
+        histórico categorizado).
+        """
+        empty = [None] * len(transactions)
+        if not transactions or not settings.CATEGORY_KNN_ENABLED:
+            return empty
+
+        index = await self.index_for(db, user_id, backfill=False)
+        if index is None or not len(index.matrix):
+            return empty
+
+        descriptions = [t["description"] for t in transactions]
+        vectors = await self._vectors(db, user_id, descriptions)
+        if vectors is None:
+            return empty
+
+        queries = np.vstack([vectors[d] for d in descriptions])
+        best, accepted = self.vote(queries, index)
+        suggestions = [index.categories[b] if ok else None for b, ok in zip(best, accepted)]
+
+        metrics.inc("categorize.knn.rows", int(accepted.sum()), outcome="suggested")
+        metrics.inc("categorize.knn.rows", int((~accepted).sum()), outcome="deferred")
+        return suggestions
+
+    def vote(self, queries: np.ndarray, index: _UserIndex):
+        """
+        (categoria vencedora por linha, linha aceita?) para a matriz de
+        consultas (m, d) contra o índice (n, d).
+        """
+        queries = _normalize(np.asarray(queries, dtype=np.float32))
+        sims = queries @ index.matrix.T                                  # (m, n)
+        k = min(self.k, sims.shape[1])
+        rows = np.arange(len(queries))[:, None]
+
+        top = np.argpartition(-sims, k - 1, axis=1)[:, :k]               # (m, k)
+        top_sims = np.take_along_axis(sims, top, axis=1)
+        weights = np.clip(top_sims, 0, None) * index.weights[top]
+
+        scores = np.zeros((len(queries), len(index.categories)), dtype=np.float32)
+        np.add.at(scores, (np.broadcast_to(rows, top.shape), index.labels[top]), weights)
+
+        best = scores.argmax(axis=1)
+        total = scores.sum(axis=1)
+        confidence = scores[rows[:, 0], best] / np.where(total > 0, total, 1)
+        accepted = (top_sims.max(axis=1) >= self.min_similarity) & (confidence >= self.min_confidence)
+        return best, accepted
+
+    async def index_for(self, db: AsyncSession, user_id: UUID, backfill: bool = True) -> Optional[_UserIndex]:
+        """
+        Índice do usuário, reconstruído se o extrato mudou desde a última carga.
+        Com backfill=False não embeda o histórico na hora: se faltam vetores,
+        agenda o backfill em background e devolve o índice parcial.
+        """
+        version = await get_ledger_version(db, user_id)
+        with self._lock:
+            index = self._indexes.get(user_id)
+            if index is not None and index.ledger_version == version and index.model == self.model:
+                self._indexes.move_to_end(user_id)
+                return index
+
+        started = time.perf_counter()
+        if backfill:
+            complete = await self._backfill(db, user_id)
+        else:
+            complete = not (await db.execute(self._missing(user_id).limit(1))).first()
+            if not complete:
+                self.schedule_backfill(user_id)
+        index = await self._load(db, user_id, version)
+        metrics.observe("categorize.knn.build_seconds", time.perf_counter() - started)
+
+        if not complete:
+            # Embeddings gravados não mudam a versão do extrato: um índice parcial
+            # em cache ficaria parcial até a próxima alteração. Tenta de novo na próxima chamada.
+            logger.info("Backfill de embeddings incompleto para %s; índice parcial não vai para o cache", user_id)
+            return index
+
+        with self._lock:
+            self._indexes[user_id] = index
+            self._indexes.move_to_end(user_id)
+            while len(self._indexes) > self.max_users:
+                self._indexes.popitem(last=False)
+        return index
+
+    def invalidate(self, user_id: UUID) -> None:
+        with self._lock:
+            self._indexes.pop(user_id, None)
+
+    def schedule_backfill(self, user_id: UUID) -> None:
+        """Completa os vetores do histórico em background (um job por usuário)"""
+        with self._lock:
+            running = self._backfills.get(user_id)
+            if running is not None and not running.done():
+                return
+            self._backfills[user_id] = asyncio.create_task(self._backfill_in_background(user_id))
+
+    async def _backfill_in_background(self, user_id: UUID) -> None:
+        if self._session_factory is None:
+            from app.db.session import AsyncSessionLocal
+            self._session_factory = AsyncSessionLocal
+        try:
+            async with self._session_factory() as db:
+                await self.index_for(db, user_id)
+        except Exception as e:
+            logger.warning("Falha no backfill de embeddings de %s: %s", user_id, e)
+        finally:
+            with self._lock:
+                self._backfills.pop(user_id, None)
+
+    async def stop(self) -> None:
+        """Cancela os backfills em andamento (lifespan da app)"""
+        with self._lock:
+            running = list(self._backfills.values())
+        for task in running:
+            task.cancel()
+        await asyncio.gather(*running, return_exceptions=True)
+
+    async def _load(self, db: AsyncSession, user_id: UUID, version: int) -> _UserIndex:
+        # Uma linha por (descrição, categoria) com a quantidade de transações
+        rows = (await db.execute(
+            select(
+                DescriptionEmbedding.vector,
+                DescriptionEmbedding.dim,
+                Transaction.category_id,
+                func.count(Transaction.id)
+            ).join(
+                Transaction,
+                and_(
+                    Transaction.user_id == DescriptionEmbedding.user_id,
+                    Transaction.description == DescriptionEmbedding.description
+                )
+            ).where(
+                DescriptionEmbedding.user_id == user_id,
+                DescriptionEmbedding.model == self.model,
+                Transaction.is_projection == False,
+                Transaction.category_id.isnot(None)
+            ).group_by(
+                DescriptionEmbedding.id,
+                Transaction.category_id
+            )
+        )).all()
+
+        dim = rows[0].dim if rows else 0
+        rows = [r for r in rows if r.dim == dim]
+        categories = list(dict.fromkeys(r.category_id for r in rows))
+        position = {cat: i for i, cat in enumerate(categories)}
+
+        return _UserIndex(
+            ledger_version=version,
+            model=self.model,
+            matrix=from_blobs([r.vector for r in rows], dim),
+            labels=np.array([position[r.category_id] for r in rows], dtype=np.intp),
+            weights=1 + np.log(np.array([r[3] for r in rows], dtype=np.float32)),
+            categories=categories,
+        )
+
+    async def _backfill(self, db: AsyncSession, user_id: UUID) -> bool:
+        """
+        Gera embeddings das descrições categorizadas que ainda não têm vetor,
+        em páginas de `backfill_batch` (ordem alfabética) até não faltar
+        nenhuma. False se o embedder falhou no meio do caminho.
+        """
+        after = None
+        while True:
+            query = self._missing(user_id)
+            if after is not None:
+                query = query.where(Transaction.description > after)
+            page = [row.description for row in (await db.execute(
+                query.distinct().order_by(Transaction.description).limit(self.backfill_batch)
+            )).all()]
+
+            if not page:
+                return True
+            if await self._embed_and_store(db, user_id, page) is None:
+                return False
+            metrics.inc("categorize.knn.backfilled", len(page))
+            if len(page) < self.backfill_batch:
+                return True
+            after = page[-1]
+
+    def _missing(self, user_id: UUID):
+        """Descrições categorizadas do usuário ainda sem vetor do modelo atual"""
+        return select(Transaction.description).outerjoin(
+            DescriptionEmbedding,
+            and_(
+                DescriptionEmbedding.user_id == Transaction.user_id,
+                DescriptionEmbedding.model == self.model,
+                DescriptionEmbedding.description == Transaction.description
+            )
+        ).where(
+            Transaction.user_id == user_id,
+            Transaction.is_projection == False,
+            Transaction.category_id.isnot(None),
+            DescriptionEmbedding.id.is_(None)
+        )
+
+    async def _vectors(
+        self,
+        db: AsyncSession,
+        user_id: UUID,
+        descriptions: List[str]
+    ) -> Optional[Dict[str, np.ndarray]]:
+        """Vetores das descrições: os já gravados + um único lote ao Ollama para o resto"""
+        unique = list(dict.fromkeys(descriptions))
+        stored = (await db.execute(
+            select(
+                DescriptionEmbedding.description, DescriptionEmbedding.vector, DescriptionEmbedding.dim
+            ).where(
+                DescriptionEmbedding.user_id == user_id,
+                DescriptionEmbedding.model == self.model,
+                DescriptionEmbedding.description.in_(unique)
+            )
+        )).all()
+        vectors = {r.description: from_blobs([r.vector], r.dim)[0] for r in stored}
+
+        missing = [d for d in unique if d not in vectors]
+        if missing:
+            created = await self._embed_and_store(db, user_id, missing)
+            if created is None:
+                return None
+            vectors.update(created)
+        return vectors
+
+    async def _embed_and_store(
+        self,
+        db: AsyncSession,
+        user_id: UUID,
+        descriptions: List[str]
+    ) -> Optional[Dict[str, np.ndarray]]:
+        embeddings = await self.embedder(descriptions, user_id=str(user_id), priority=LLMPriority.BULK)
+        if embeddings is None:
+            return None
+
+        matrix = _normalize(np.asarray(embeddings, dtype=np.float32))
+        # Importação concorrente pode ter gravado a mesma descrição: essa linha
+        # é ignorada (ON CONFLICT DO NOTHING, linha a linha) e o resto do lote fica
+        insert = postgresql.insert if db.get_bind().dialect.name == "postgresql" else sqlite.insert
+        await db.execute(
+            insert(DescriptionEmbedding).on_conflict_do_nothing(
+                index_elements=["user_id", "model", "description"]
+            ),
+            [
+                {
+                    "user_id": user_id,
+                    "model": self.model,
+                    "description": description,
+                    "dim": matrix.shape[1],
+                    "vector": to_blob(vector),
+                }
+                for description, vector in zip(descriptions, matrix)
+            ]
+        )
+        await db.commit()
+        return dict(zip(descriptions, matrix))
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            return {
+                "categorize.knn.users": len(self._indexes),
+                "categorize.knn.vectors": sum(len(i.matrix) for i in self._indexes.values()),
+            }
+
+
+# Instância global
+category_index = CategoryIndex()
+metrics.register_collector(category_index.stats)
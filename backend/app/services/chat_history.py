@@ -0,0 +1,255 @@
+import asyncio
+import base64
+import json
+import logging
+import zlib
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+from uuid import UUID
+
+from sqlalchemy import and_, delete, func, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.models.ai_chat import AIChatHistory, AIChatArchive
+
+logger = logging.getLogger(__name__)
+
+
+def encode_cursor(created_at: datetime, row_id: UUID) -> str:
+    """Cursor opaco da paginação por chave (created_at, id)"""
+    raw = f"{created_at.isoformat()}|{row_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, UUID]:
+    """(created_at, id) do cursor; ValueError se estiver malformado"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, row_id = raw.split("|")
+        return datetime.fromisoformat(created_at), UUID(row_id)
+    except ValueError as e:
+        raise ValueError("Cursor de paginação inválido") from e
+
+
+def _before(created_col, id_col, cursor: Optional[str]):
+    """Linhas estritamente depois do cursor na ordem (created_at desc, id desc)"""
+    created_at, row_id = decode_cursor(cursor)
+    return or_(created_col < created_at, and_(created_col == created_at, id_col < row_id))
+
+
+def compress_turns(rows: List[AIChatHistory]) -> bytes:
+    turns = [
+        {
+            "id": str(row.id),
+            "turn_index": row.turn_index,
+            "message": row.message,
+            "response": row.response,
+            "model": row.model,
+            "created_at": row.created_at.isoformat() if row.created_at else None,
+        }
+        for row in rows
+    ]
+    return zlib.compress(json.dumps(turns, ensure_ascii=False).encode("utf-8"), 6)
+
+
+def decompress_turns(payload: bytes) -> List[Dict]:
+    return json.loads(zlib.decompress(payload).decode("utf-8"))
+
+
+async def history_page(
+    db: AsyncSession,
+    user_id: UUID,
+    limit: int,
+    cursor: Optional[str] = None,
+    preview_chars: int = None
+) -> Dict:
+    """
+    Página do histórico (mais recentes primeiro) só com prévias: o texto
+    completo não sai do banco. Usa o índice (user_id, created_at, id).
+    """
+    preview_chars = preview_chars or settings.CHAT_HISTORY_PREVIEW_CHARS
+    query = select(
+        AIChatHistory.id,
+        AIChatHistory.session_id,
+        AIChatHistory.turn_index,
+        AIChatHistory.model,
+        AIChatHistory.created_at,
+        func.substr(AIChatHistory.message, 1, preview_chars).label("message_preview"),
+        func.substr(AIChatHistory.response, 1, preview_chars).label("response_preview"),
+        (
+            (func.length(AIChatHistory.message) > preview_chars)
+            | (func.length(AIChatHistory.response) > preview_chars)
+        ).label("truncated")
+    ).where(AIChatHistory.user_id == user_id)
+
+    if cursor:
+        query = query.where(_before(AIChatHistory.created_at, AIChatHistory.id, cursor))
+
+    rows = (await db.execute(
+        query.order_by(AIChatHistory.created_at.desc(), AIChatHistory.id.desc()).limit(limit + 1)
+    )).all()
+
+    items = [dict(row._mapping) for row in rows[:limit]]
+    next_cursor = None
+    if len(rows) > limit:
+        last = rows[limit - 1]
+        next_cursor = encode_cursor(last.created_at, last.id)
+    return {"items": items, "next_cursor": next_cursor}
+
+
+async def archive_page(db: AsyncSession, user_id: UUID, limit: int, cursor: Optional[str] = None) -> Dict:
+    """Conversas arquivadas (metadados, sem descomprimir), mais recentes primeiro"""
+    query = select(
+        AIChatArchive.id,
+        AIChatArchive.session_id,
+        AIChatArchive.started_at,
+        AIChatArchive.ended_at,
+        AIChatArchive.turn_count,
+        AIChatArchive.archived_at
+    ).where(AIChatArchive.user_id == user_id)
+
+    if cursor:
+        query = query.where(_before(AIChatArchive.ended_at, AIChatArchive.id, cursor))
+
+    rows = (await db.execute(
+        query.order_by(AIChatArchive.ended_at.desc(), AIChatArchive.id.desc()).limit(limit + 1)
+    )).all()
+
+    items = [dict(row._mapping) for row in rows[:limit]]
+    next_cursor = None
+    if len(rows) > limit:
+        last = rows[limit - 1]
+        next_cursor = encode_cursor(last.ended_at, last.id)
+    return {"items": items, "next_cursor": next_cursor}
+
+
+class ChatArchiver:
+    """
+    Job de retenção do histórico do chat.
+
+    Sessões sem turnos novos há mais de `retention_days` saem da tabela
+    `ai_chat_history` e viram uma linha em `ai_chat_archive` com os turnos
+    em JSON comprimido (os resumos de contexto são descartados). Cada lote
+    de sessões é movido numa única transação do banco.
+    """
+
+    def __init__(
+        self,
+        retention_days: int = None,
+        batch_sessions: int = None,
+        interval: float = None
+    ):
+        self.retention_days = retention_days or settings.CHAT_RETENTION_DAYS
+        self.batch_sessions = batch_sessions or settings.CHAT_ARCHIVE_BATCH_SESSIONS
+        self.interval = interval or settings.CHAT_ARCHIVE_INTERVAL_SECONDS
+        self._task: Optional[asyncio.Task] = None
+
+    async def run(self, db: AsyncSession, now: datetime = None) -> Dict[str, int]:
+        """Arquiva todas as sessões vencidas; retorna contagens"""
+        cutoff = (now or datetime.now(timezone.utc)) - timedelta(days=self.retention_days)
+        totals = {"sessions": 0, "turns": 0, "raw_bytes": 0, "compressed_bytes": 0}
+
+        while True:
+            moved = await self._archive_batch(db, cutoff)
+            if not moved["sessions"]:
+                break
+            for key in totals:
+                totals[key] += moved[key]
+
+        if totals["sessions"]:
+            logger.info(
+                "Chat arquivado: %s sessões, %s turnos (%s → %s bytes)",
+                totals["sessions"], totals["turns"], totals["raw_bytes"], totals["compressed_bytes"]
+            )
+        metrics.inc("chat.archive.sessions", totals["sessions"])
+        metrics.inc("chat.archive.turns", totals["turns"])
+        return totals
+
+    async def _archive_batch(self, db: AsyncSession, cutoff: datetime) -> Dict[str, int]:
+        sessions = (await db.execute(
+            select(
+                AIChatHistory.user_id,
+                AIChatHistory.session_id
+            ).group_by(
+                AIChatHistory.user_id, AIChatHistory.session_id
+            ).having(
+                func.max(AIChatHistory.created_at) < cutoff
+            ).limit(self.batch_sessions)
+        )).all()
+
+        moved = {"sessions": len(sessions), "turns": 0, "raw_bytes": 0, "compressed_bytes": 0}
+        if not sessions:
+            return moved
+
+        try:
+            for user_id, session_id in sessions:
+                session_filter = (
+                    AIChatHistory.session_id == session_id if session_id is not None
+                    else AIChatHistory.session_id.is_(None)
+                )
+                rows = (await db.execute(
+                    select(AIChatHistory).where(
+                        AIChatHistory.user_id == user_id,
+                        session_filter
+                    ).order_by(AIChatHistory.turn_index, AIChatHistory.created_at)
+                )).scalars().all()
+
+                payload = compress_turns(rows)
+                db.add(AIChatArchive(
+                    user_id=user_id,
+                    session_id=session_id,
+                    started_at=rows[0].created_at,
+                    ended_at=rows[-1].created_at,
+                    turn_count=len(rows),
+                    payload=payload
+                ))
+                await db.execute(
+                    delete(AIChatHistory).where(AIChatHistory.id.in_([row.id for row in rows])),
+                    execution_options={"synchronize_session": False}
+                )
+
+                moved["turns"] += len(rows)
+                moved["raw_bytes"] += sum(len(r.message) + len(r.response) for r in rows)
+                moved["compressed_bytes"] += len(payload)
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            raise
+        return moved
+
+    async def run_once(self) -> Dict[str, int]:
+        """Execução com sessão própria (job em background)"""
+        from app.db.session import AsyncSessionLocal
+
+        async with AsyncSessionLocal() as db:
+            return await self.run(db)
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.run_once()
+            except Exception as e:
+                logger.warning("Falha no job de retenção do chat: %s", e)
+
+    def start(self) -> None:
+        """Agenda o job periódico (lifespan da app)"""
+        if not settings.CHAT_ARCHIVE_ENABLED:
+            return
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+# Instância global
+chat_archiver = ChatArchiver()
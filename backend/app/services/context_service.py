@@ -0,0 +1,142 @@
+import threading
+from collections import OrderedDict
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Tuple
+from uuid import UUID
+
+from sqlalchemy import case, extract, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.ledger import get_ledger_version
+from app.models.category import Category
+from app.models.transaction import Transaction
+
+
+class FinancialContextBuilder:
+    """
+    Monta o resumo financeiro usado como contexto nos prompts de IA.
+
+    Tudo é agregado no banco (GROUP BY), então o custo de montar o prompt
+    não depende do número de transações. O resultado fica em cache por
+    (usuário, versão do extrato, período, dia).
+    """
+
+    def __init__(self, days: int = 90, top_merchants: int = 5, max_entries: int = 512):
+        self.days = days
+        self.top_merchants = top_merchants
+        self.max_entries = max_entries
+        self._cache: "OrderedDict[Tuple, str]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    async def build(self, db: AsyncSession, user_id: UUID, days: Optional[int] = None) -> str:
+        """Resumo textual dos últimos `days` dias (padrão: 90)"""
+        days = days or self.days
+        today = date.today()
+        key = (str(user_id), await get_ledger_version(db, user_id), days, today)
+
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+
+        summary = self._render(await self._aggregate(db, user_id, today - timedelta(days=days)), days)
+
+        with self._lock:
+            self._cache[key] = summary
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+        return summary
+
+    async def _aggregate(self, db: AsyncSession, user_id: UUID, since: date) -> Dict:
+        base_filter = (
+            Transaction.user_id == user_id,
+            Transaction.is_projection == False,
+            Transaction.date >= since,
+        )
+        income = func.coalesce(func.sum(case((Transaction.amount > 0, Transaction.amount), else_=0)), 0)
+        expenses = func.coalesce(func.sum(case((Transaction.amount < 0, -Transaction.amount), else_=0)), 0)
+
+        count, total_income, total_expenses = (await db.execute(
+            select(func.count(Transaction.id), income, expenses).where(*base_filter)
+        )).one()
+
+        by_category = (await db.execute(
+            select(
+                func.coalesce(Category.name, "Sem categoria"),
+                func.count(Transaction.id),
+                func.sum(func.abs(Transaction.amount)),
+            ).select_from(Transaction).outerjoin(
+                Category, Category.id == Transaction.category_id
+            ).where(*base_filter).group_by(
+                func.coalesce(Category.name, "Sem categoria")
+            ).order_by(func.sum(func.abs(Transaction.amount)).desc())
+        )).all()
+
+        merchants = (await db.execute(
+            select(
+                Transaction.description,
+                func.count(Transaction.id),
+                func.sum(-Transaction.amount),
+            ).where(
+                *base_filter, Transaction.amount < 0
+            ).group_by(Transaction.description).order_by(
+                func.sum(-Transaction.amount).desc()
+            ).limit(self.top_merchants)
+        )).all()
+
+        year = extract("year", Transaction.date)
+        month = extract("month", Transaction.date)
+        monthly = (await db.execute(
+            select(year, month, income, expenses).where(
+                *base_filter
+            ).group_by(year, month).order_by(year, month)
+        )).all()
+
+        return {
+            "count": count,
+            "income": float(total_income),
+            "expenses": float(total_expenses),
+            "by_category": [(name, n, float(total)) for name, n, total in by_category],
+            "merchants": [(desc, n, float(total)) for desc, n, total in merchants],
+            "monthly": [(int(y), int(m), float(i), float(e)) for y, m, i, e in monthly],
+        }
+
+    @staticmethod
+    def _render(data: Dict, days: int) -> str:
+        period = "Últimos 3 meses" if days == 90 else f"Últimos {days} dias"
+        if not data["count"]:
+            return f"Nenhuma transação registrada no período ({period.lower()})."
+
+        lines: List[str] = [
+            f"RESUMO FINANCEIRO ({period}):",
+            f"- Total de transações: {data['count']}",
+            f"- Receitas totais: R$ {data['income']:.2f}",
+            f"- Despesas totais: R$ {data['expenses']:.2f}",
+            f"- Saldo: R$ {data['income'] - data['expenses']:.2f}",
+            "",
+            "GASTOS POR CATEGORIA:",
+        ]
+        for name, count, total in data["by_category"]:
+            lines.append(f"- {name}: R$ {total:.2f} ({count} transações)")
+
+        if data["merchants"]:
+            lines += ["", "MAIORES DESPESAS POR ESTABELECIMENTO:"]
+            for desc, count, total in data["merchants"]:
+                lines.append(f"- {desc}: R$ {total:.2f} ({count}x)")
+
+        if data["monthly"]:
+            lines += ["", "EVOLUÇÃO MENSAL:"]
+            previous = None
+            for year, month, income, expenses in data["monthly"]:
+                line = f"- {month:02d}/{year}: receitas R$ {income:.2f}, despesas R$ {expenses:.2f}"
+                if previous and previous[1] > 0:
+                    delta = (expenses - previous[1]) / previous[1] * 100
+                    line += f" ({delta:+.1f}% despesas vs mês anterior)"
+                lines.append(line)
+                previous = (income, expenses)
+
+        return "\n".join(lines)
+
+
+# Instância global
+context_builder = FinancialContextBuilder()
@@ -0,0 +1,166 @@
+import uuid
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+from uuid import UUID
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.models.ai_chat import AIChatHistory
+
+# Sobrecarga aproximada por mensagem no template de chat
+MESSAGE_OVERHEAD_TOKENS = 4
+# Quanto de cada turno antigo entra no resumo
+SUMMARY_SNIPPET_CHARS = 160
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimativa barata de tokens (~4 caracteres por token em português)"""
+    return len(text) // 4 + 1 if text else 0
+
+
+def message_tokens(message: Dict[str, str]) -> int:
+    return estimate_tokens(message["content"]) + MESSAGE_OVERHEAD_TOKENS
+
+
+@dataclass
+class ConversationContext:
+    """Estado de uma sessão pronto para montar o prompt e gravar o próximo turno"""
+    session_id: UUID
+    turn_index: int                     # Índice do turno que será gravado
+    history: List[Dict[str, str]] = field(default_factory=list)
+    summary: Optional[str] = None       # Resumo dos turnos que ficaram fora do orçamento
+    summary_until_turn: int = 0
+    # Mensagens iniciais de `history` enviadas pelo cliente (não gravadas como turnos)
+    unstored: int = 0
+
+
+class ConversationContextManager:
+    """
+    Mantém o prompt do chat dentro de um orçamento de tokens.
+
+    Os turnos mais recentes entram inteiros; os mais antigos são compactados
+    em um resumo cumulativo gravado junto com o turno em AIChatHistory.
+    Com isso o cliente só precisa enviar o session_id e o servidor lê apenas
+    os turnos que ainda não estão no resumo.
+    """
+
+    def __init__(self, token_budget: int = None, summary_budget: int = None):
+        self.token_budget = token_budget or settings.CHAT_CONTEXT_TOKEN_BUDGET
+        self.summary_budget = summary_budget or settings.CHAT_SUMMARY_TOKEN_BUDGET
+
+    async def load(
+        self,
+        db: AsyncSession,
+        user_id: UUID,
+        session_id: Optional[UUID] = None,
+        client_history: Optional[List[Dict[str, str]]] = None
+    ) -> Optional[ConversationContext]:
+        """
+        Carrega a sessão do banco (ou inicia uma nova a partir do histórico
+        enviado pelo cliente). Retorna None se a sessão não pertence ao usuário.
+        """
+        if session_id is None:
+            history = list(client_history or [])
+            return ConversationContext(
+                session_id=uuid.uuid4(),
+                turn_index=0,
+                history=history,
+                unstored=len(history)
+            )
+
+        last = (await db.execute(
+            select(AIChatHistory).where(
+                AIChatHistory.user_id == user_id,
+                AIChatHistory.session_id == session_id
+            ).order_by(AIChatHistory.turn_index.desc()).limit(1)
+        )).scalar_one_or_none()
+
+        if last is None:
+            return None
+
+        summary_until = last.summary_until_turn or 0
+        rows = (await db.execute(
+            select(AIChatHistory).where(
+                AIChatHistory.user_id == user_id,
+                AIChatHistory.session_id == session_id,
+                AIChatHistory.turn_index >= summary_until
+            ).order_by(AIChatHistory.turn_index)
+        )).scalars().all()
+
+        history = []
+        for row in rows:
+            history.append({"role": "user", "content": row.message})
+            history.append({"role": "assistant", "content": row.response})
+
+        return ConversationContext(
+            session_id=session_id,
+            turn_index=last.turn_index + 1,
+            history=history,
+            summary=last.context_summary,
+            summary_until_turn=summary_until
+        )
+
+    def fit(self, context: ConversationContext, reserved_tokens: int) -> ConversationContext:
+        """
+        Mantém os turnos mais novos que cabem no orçamento (descontando
+        `reserved_tokens` do sistema + mensagem atual e o espaço do resumo)
+        e move o resto para o resumo.
+        """
+        available = self.token_budget - reserved_tokens - self.summary_budget
+
+        kept: List[Dict[str, str]] = []
+        used = 0
+        for message in reversed(context.history):
+            cost = message_tokens(message)
+            if used + cost > available:
+                break
+            kept.append(message)
+            used += cost
+        kept.reverse()
+
+        # Não começar a janela com a resposta de um turno cortado ao meio
+        while kept and kept[0]["role"] == "assistant" and len(kept) < len(context.history):
+            kept.pop(0)
+
+        dropped = context.history[:len(context.history) - len(kept)]
+        if not dropped:
+            context.history = kept
+            return context
+
+        context.summary = self.compact(context.summary, dropped)
+        context.history = kept
+        # Turnos gravados (pergunta + resposta) que saíram da janela
+        stored_dropped = dropped[context.unstored:]
+        context.summary_until_turn += sum(1 for m in stored_dropped if m["role"] == "user")
+        context.unstored = max(0, context.unstored - len(dropped))
+        return context
+
+    def summary_for_storage(self, context: ConversationContext) -> Optional[str]:
+        """
+        Resumo a gravar com o turno. Mensagens enviadas pelo cliente não
+        existem como turnos no banco, então entram no resumo.
+        """
+        if context.unstored:
+            return self.compact(context.summary, context.history[:context.unstored])
+        return context.summary
+
+    def compact(self, summary: Optional[str], dropped: List[Dict[str, str]]) -> str:
+        """Acrescenta os turnos descartados ao resumo, limitado ao orçamento"""
+        lines = summary.split("\n") if summary else []
+        for message in dropped:
+            speaker = "Usuário" if message["role"] == "user" else "Assistente"
+            snippet = " ".join(message["content"].split())
+            if len(snippet) > SUMMARY_SNIPPET_CHARS:
+                snippet = snippet[:SUMMARY_SNIPPET_CHARS].rstrip() + "…"
+            lines.append(f"- {speaker}: {snippet}")
+
+        # Resumo rolante: descarta as linhas mais antigas ao passar do orçamento
+        while len(lines) > 1 and estimate_tokens("\n".join(lines)) > self.summary_budget:
+            lines.pop(0)
+        return "\n".join(lines)
+
+
+# Instância global
+conversation_manager = ConversationContextManager()
@@ -0,0 +1,351 @@
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import date
+from itertools import product
+from typing import Dict, List, Optional, Tuple
+from uuid import UUID
+
+import numpy as np
+from sqlalchemy import extract, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.db.ledger import get_ledger_version
+from app.models.category import Category
+from app.models.transaction import Transaction
+from app.services.cashflow_simulation import month_index, month_label
+
+SEASON = 12
+DAMPING = 0.9          # Tendência amortecida: previsões longas não explodem
+Z_80, Z_95 = 1.2816, 1.96
+
+# Grade de parâmetros (alpha, beta, gamma) avaliada de uma vez para todas as categorias
+ALPHAS = (0.1, 0.3, 0.5, 0.8)
+BETAS = (0.0, 0.05, 0.2)
+GAMMAS = (0.0, 0.1, 0.3)
+
+
+@dataclass
+class _State:
+    """Estado ETS(A,Ad,A) de todas as categorias após o último mês observado"""
+    params: np.ndarray     # (C, 3) alpha, beta, gamma
+    level: np.ndarray      # (C,)
+    trend: np.ndarray      # (C,)
+    season: np.ndarray     # (C, 12) indexado pelo mês do calendário
+    sse: np.ndarray        # (C,) soma dos erros quadráticos de um passo
+    n_errors: int
+
+
+@dataclass
+class _UserForecast:
+    ledger_version: int
+    first_month: int
+    last_month: int        # Último mês completo incorporado ao estado
+    keys: List[Tuple]      # (category_id, nome) por linha
+    values: np.ndarray     # (C, T) histórico mensal
+    seasonal: bool
+    state: _State
+    backtest: Dict
+    fitted_through: int    # Último mês do ajuste completo (grade)
+
+
+def smooth(
+    values: np.ndarray,
+    params: np.ndarray,
+    first_month: int,
+    seasonal: bool,
+    state: Optional[_State] = None
+) -> _State:
+    """
+    Recursão ETS(A,Ad,A) na forma de correção de erro, vetorizada sobre
+    as séries (linhas); o laço é só sobre os meses. Sem `state`, inicializa
+    pelo primeiro ano (ou pelo primeiro mês, sem sazonalidade).
+    """
+    k, t_total = values.shape
+    alpha, beta, gamma = params[:, 0], params[:, 1], params[:, 2]
+
+    if state is None:
+        head = values[:, :min(t_total, SEASON)] if seasonal else values[:, :1]
+        level = head.mean(axis=1)
+        trend = np.zeros(k)
+        season = np.zeros((k, SEASON))
+        if seasonal:
+            slots = (first_month + np.arange(head.shape[1])) % SEASON
+            season[:, slots] = head - level[:, None]
+        sse, n_errors = np.zeros(k), 0
+        burn = SEASON if seasonal else 1
+    else:
+        level, trend, season = state.level.copy(), state.trend.copy(), state.season.copy()
+        sse, n_errors = state.sse.copy(), state.n_errors
+        burn = 0
+
+    for t in range(t_total):
+        slot = (first_month + t) % SEASON
+        predicted = level + DAMPING * trend + season[:, slot]
+        error = values[:, t] - predicted
+        level = level + DAMPING * trend + alpha * error
+        trend = DAMPING * trend + beta * error
+        season[:, slot] += gamma * error
+        if t >= burn:
+            sse += error ** 2
+            n_errors += 1
+
+    return _State(params, level, trend, season, sse, n_errors)
+
+
+def fit(values: np.ndarray, first_month: int, seasonal: bool) -> _State:
+    """Escolhe (alpha, beta, gamma) por categoria na grade, numa única passada vetorizada"""
+    grid = np.array([
+        (a, b, g) for a, b, g in product(ALPHAS, BETAS, GAMMAS if seasonal else (0.0,))
+        if b <= a
+    ])
+    c, g = len(values), len(grid)
+    expanded = smooth(np.repeat(values, g, axis=0), np.tile(grid, (c, 1)), first_month, seasonal)
+
+    best = expanded.sse.reshape(c, g).argmin(axis=1)
+    pick = np.arange(c) * g + best
+    return _State(
+        params=grid[best],
+        level=expanded.level[pick],
+        trend=expanded.trend[pick],
+        season=expanded.season[pick],
+        sse=expanded.sse[pick],
+        n_errors=expanded.n_errors
+    )
+
+
+def predict(state: _State, next_month: int, horizon: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Previsão (C, H) e desvio-padrão do erro de h passos (C, H)"""
+    steps = np.arange(1, horizon + 1)
+    damped = np.cumsum(DAMPING ** steps)                              # phi + ... + phi^h
+    slots = (next_month + steps - 1) % SEASON
+    mean = state.level[:, None] + damped[None, :] * state.trend[:, None] + state.season[:, slots]
+
+    # Var(h) = sigma² [1 + soma_{j<h} (alpha + beta * phi_j + gamma * [j múltiplo de 12])²]
+    alpha, beta, gamma = state.params[:, 0:1], state.params[:, 1:2], state.params[:, 2:3]
+    j = steps[:-1]
+    c = alpha + beta * damped[None, :-1] + gamma * (j % SEASON == 0)[None, :]
+    spread = np.concatenate([np.zeros((len(mean), 1)), np.cumsum(c ** 2, axis=1)], axis=1)
+    sigma = np.sqrt(state.sse / max(state.n_errors, 1))
+    return mean, sigma[:, None] * np.sqrt(1 + spread)
+
+
+class CategoryForecaster:
+    """
+    Previsão mensal por categoria (Holt-Winters aditivo amortecido).
+
+    O histórico vem de uma consulta agregada por (categoria, mês) dos meses
+    completos. O estado do modelo fica em cache por usuário: se o extrato
+    mudou só com meses novos, a recursão continua do estado anterior com os
+    mesmos parâmetros (incremental); se meses antigos mudaram, ou a cada
+    FORECAST_REFIT_EVERY_MONTHS meses novos, refaz o ajuste completo.
+    """
+
+    def __init__(self, max_users: int = None):
+        self.max_users = max_users or settings.FORECAST_CACHE_USERS
+        self._cache: "OrderedDict[str, _UserForecast]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    async def forecast(self, db: AsyncSession, user_id: UUID, months: int, today: date = None) -> Optional[Dict]:
+        """Previsão dos próximos `months` meses (None sem histórico suficiente)"""
+        entry = await self._entry(db, user_id, today or date.today())
+        if entry is None:
+            return None
+        return self._render(entry, months)
+
+    async def _entry(self, db: AsyncSession, user_id: UUID, today: date) -> Optional[_UserForecast]:
+        key = str(user_id)
+        version = await get_ledger_version(db, user_id)
+        last_month = month_index(today.year, today.month) - 1
+
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+        if cached is not None and cached.ledger_version == version and cached.last_month == last_month:
+            metrics.inc("forecast.cache.hits")
+            return cached
+
+        history = await self._history(db, user_id, last_month)
+        if history is None:
+            return None
+        first_month, keys, values = history
+
+        entry = self._update(cached, version, first_month, last_month, keys, values)
+        if entry is None:
+            entry = self._refit(version, first_month, last_month, keys, values)
+
+        with self._lock:
+            self._cache[key] = entry
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_users:
+                self._cache.popitem(last=False)
+        return entry
+
+    async def _history(self, db: AsyncSession, user_id: UUID, last_month: int):
+        """(primeiro mês, chaves das categorias, matriz categorias × meses)"""
+        first = (await db.execute(
+            select(func.min(Transaction.date)).where(
+                Transaction.user_id == user_id,
+                Transaction.is_projection == False
+            )
+        )).scalar()
+        if first is None:
+            return None
+        first_month = max(month_index(first.year, first.month), last_month - settings.FORECAST_LOOKBACK_MONTHS + 1)
+        if last_month - first_month + 1 < settings.FORECAST_MIN_MONTHS:
+            return None
+
+        start_year, start_month = divmod(first_month, 12)
+        end_year, end_month = divmod(last_month + 1, 12)
+        year = extract("year", Transaction.date)
+        month = extract("month", Transaction.date)
+        name = func.coalesce(Category.name, "Sem categoria")
+        rows = (await db.execute(
+            select(
+                Transaction.category_id, name, year, month, func.sum(Transaction.amount)
+            ).select_from(Transaction).outerjoin(
+                Category, Category.id == Transaction.category_id
+            ).where(
+                Transaction.user_id == user_id,
+                Transaction.is_projection == False,
+                Transaction.date >= date(start_year, start_month + 1, 1),
+                Transaction.date < date(end_year, end_month + 1, 1)
+            ).group_by(
+                Transaction.category_id, name, year, month
+            )
+        )).all()
+        if not rows:
+            return None
+
+        keys = sorted({(r[0], r[1]) for r in rows}, key=lambda k: k[1])
+        position = {k: i for i, k in enumerate(keys)}
+        values = np.zeros((len(keys), last_month - first_month + 1))
+        for category_id, category, y, m, total in rows:
+            values[position[(category_id, category)], month_index(int(y), int(m)) - first_month] = float(total)
+        return first_month, keys, values
+
+    def _update(self, cached, version, first_month, last_month, keys, values) -> Optional[_UserForecast]:
+        """
+        Atualização incremental: mesmas categorias, meses já vistos iguais e
+        só meses novos no fim. Retorna None quando precisa de ajuste completo.
+        """
+        if cached is None or cached.keys != keys or last_month < cached.last_month:
+            return None
+        if last_month - cached.fitted_through >= settings.FORECAST_REFIT_EVERY_MONTHS:
+            return None
+
+        overlap_start = max(first_month, cached.first_month)
+        old = cached.values[:, overlap_start - cached.first_month:]
+        new = values[:, overlap_start - first_month:overlap_start - first_month + old.shape[1]]
+        if old.shape != new.shape or not np.allclose(old, new):
+            return None
+
+        added = values[:, cached.last_month + 1 - first_month:]
+        state = cached.state
+        if added.shape[1]:
+            state = smooth(added, state.params, cached.last_month + 1, cached.seasonal, state)
+            metrics.inc("forecast.incremental")
+
+        return _UserForecast(
+            ledger_version=version,
+            first_month=first_month,
+            last_month=last_month,
+            keys=keys,
+            values=values,
+            seasonal=cached.seasonal,
+            state=state,
+            backtest=cached.backtest,
+            fitted_through=cached.fitted_through
+        )
+
+    def _refit(self, version, first_month, last_month, keys, values) -> _UserForecast:
+        metrics.inc("forecast.refits")
+        seasonal = values.shape[1] >= settings.FORECAST_SEASONAL_MIN_MONTHS
+        return _UserForecast(
+            ledger_version=version,
+            first_month=first_month,
+            last_month=last_month,
+            keys=keys,
+            values=values,
+            seasonal=seasonal,
+            state=fit(values, first_month, seasonal),
+            backtest=self._backtest(values, first_month, last_month, seasonal),
+            fitted_through=last_month
+        )
+
+    @staticmethod
+    def _backtest(values: np.ndarray, first_month: int, last_month: int, seasonal: bool) -> Dict:
+        """Ajusta sem os últimos meses e mede o erro da previsão neles"""
+        holdout = min(settings.FORECAST_BACKTEST_MONTHS, values.shape[1] - settings.FORECAST_MIN_MONTHS + 1)
+        if holdout < 1:
+            return {"months": 0, "mae": None, "mape": None, "by_category": np.empty(0)}
+
+        train, actual = values[:, :-holdout], values[:, -holdout:]
+        seasonal = seasonal and train.shape[1] >= settings.FORECAST_SEASONAL_MIN_MONTHS
+        predicted, _ = predict(fit(train, first_month, seasonal), last_month - holdout + 1, holdout)
+
+        errors = np.abs(predicted - actual)
+        total_actual, total_predicted = actual.sum(axis=0), predicted.sum(axis=0)
+        nonzero = np.abs(total_actual) > 0
+        mape = (
+            float(np.mean(np.abs(total_predicted - total_actual)[nonzero] / np.abs(total_actual[nonzero])))
+            if nonzero.any() else None
+        )
+        return {
+            "months": int(holdout),
+            "mae": round(float(np.abs(total_predicted - total_actual).mean()), 2),
+            "mape": round(mape, 4) if mape is not None else None,
+            "by_category": errors.mean(axis=1),
+        }
+
+    @staticmethod
+    def _render(entry: _UserForecast, horizon: int) -> Dict:
+        next_month = entry.last_month + 1
+        mean, std = predict(entry.state, next_month, horizon)
+        labels = [month_label(next_month + h) for h in range(horizon)]
+
+        def points(values, deviation):
+            return [
+                {
+                    "month": labels[h],
+                    "value": round(float(values[h]), 2),
+                    "lower_80": round(float(values[h] - Z_80 * deviation[h]), 2),
+                    "upper_80": round(float(values[h] + Z_80 * deviation[h]), 2),
+                    "lower_95": round(float(values[h] - Z_95 * deviation[h]), 2),
+                    "upper_95": round(float(values[h] + Z_95 * deviation[h]), 2),
+                }
+                for h in range(horizon)
+            ]
+
+        by_category = entry.backtest["by_category"]
+        categories = [
+            {
+                "category_id": category_id,
+                "category": name,
+                "history": [round(float(v), 2) for v in entry.values[i, -SEASON:]],
+                "forecast": points(mean[i], std[i]),
+                "params": dict(zip(("alpha", "beta", "gamma"), map(float, entry.state.params[i]))),
+                "backtest_mae": round(float(by_category[i]), 2) if len(by_category) else None,
+            }
+            for i, (category_id, name) in enumerate(entry.keys)
+        ]
+
+        # Total: soma das médias; erros tratados como independentes entre categorias
+        total = points(mean.sum(axis=0), np.sqrt((std ** 2).sum(axis=0)))
+        return {
+            "horizon": horizon,
+            "model": "holt-winters" if entry.seasonal else "holt",
+            "history_months": int(entry.values.shape[1]),
+            "last_month": month_label(entry.last_month),
+            "months": labels,
+            "categories": categories,
+            "total": total,
+            "backtest": {k: v for k, v in entry.backtest.items() if k != "by_category"},
+        }
+
+
+# Instância global
+category_forecaster = CategoryForecaster()
@@ -0,0 +1,209 @@
+import asyncio
+import logging
+import threading
+import time
+from enum import Enum
+from typing import Callable, Optional
+
+import ollama
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitState(str, Enum):
+    CLOSED = "closed"        # Ollama respondendo normalmente
+    OPEN = "open"            # Falhas consecutivas: chamadas degradam na hora
+    HALF_OPEN = "half_open"  # Cooldown expirou: uma sondagem decide se fecha
+
+
+class LLMHealthMonitor:
+    """
+    Monitor de disponibilidade do Ollama com cache e circuit breaker.
+
+    - A disponibilidade fica em cache por `ttl` segundos e é renovada em
+      background, então `is_available()` nunca espera por rede. Antes da
+      primeira sondagem o Ollama é dado como disponível: a chamada real
+      confirma ou registra a falha.
+    - Só uma sondagem roda por vez; quem pede outra enquanto ela está em
+      andamento fica com o resultado dela.
+    - Após `failure_threshold` falhas consecutivas (sondagens ou chamadas
+      reais) o circuito abre e tudo é considerado indisponível por
+      `reset_timeout` segundos.
+    - Depois do cooldown o circuito fica meio-aberto: uma única sondagem
+      em background fecha o circuito (sucesso) ou reabre (falha).
+    """
+
+    def __init__(
+        self,
+        probe: Optional[Callable[[], None]] = None,
+        ttl: float = None,
+        failure_threshold: int = None,
+        reset_timeout: float = None,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self._probe = probe or self._ollama_probe
+        self.ttl = ttl if ttl is not None else settings.LLM_HEALTH_TTL_SECONDS
+        self.failure_threshold = (
+            failure_threshold if failure_threshold is not None else settings.LLM_CIRCUIT_FAILURE_THRESHOLD
+        )
+        self.reset_timeout = (
+            reset_timeout if reset_timeout is not None else settings.LLM_CIRCUIT_RESET_SECONDS
+        )
+        self._clock = clock
+
+        self._lock = threading.Lock()
+        self._state = CircuitState.CLOSED
+        self._available: Optional[bool] = None  # None = ainda não sondado
+        self._checked_at = 0.0
+        self._opened_at = 0.0
+        self._failures = 0
+        self._refreshing = False
+        self._task: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def _ollama_probe() -> None:
+        """Sondagem barata: lista modelos com timeout curto"""
+        client = ollama.Client(
+            host=settings.OLLAMA_BASE_URL,
+            timeout=settings.LLM_HEALTH_PROBE_TIMEOUT_SECONDS
+        )
+        client.list()
+
+    @property
+    def state(self) -> CircuitState:
+        return self._state
+
+    def is_available(self) -> bool:
+        """
+        Resposta instantânea a partir do cache.
+        Se o cache estiver vencido, agenda uma renovação em background e
+        responde com o último valor conhecido.
+        """
+        with self._lock:
+            now = self._clock()
+
+            if self._state == CircuitState.OPEN:
+                if now - self._opened_at < self.reset_timeout:
+                    return False
+                self._state = CircuitState.HALF_OPEN
+
+            stale = self._available is None or now - self._checked_at >= self.ttl
+            needs_probe = (stale or self._state == CircuitState.HALF_OPEN) and not self._refreshing
+            if needs_probe:
+                self._refreshing = True
+
+            # Ainda não sondado (None) conta como disponível
+            available = self._available is not False and self._state == CircuitState.CLOSED
+
+        if needs_probe:
+            if not self._schedule_refresh():
+                # Sem event loop (scripts/threads): sondar de forma síncrona
+                self._probe_and_record()
+                return self.is_available()
+
+        return available
+
+    def _schedule_refresh(self) -> bool:
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return False
+
+        loop.run_in_executor(None, self._probe_and_record)
+        return True
+
+    def refresh(self) -> bool:
+        """
+        Executa a sondagem (bloqueante) e atualiza o estado. Se outra já
+        está em andamento, não sonda de novo e devolve o último valor.
+        """
+        with self._lock:
+            if self._refreshing:
+                return bool(self._available)
+            self._refreshing = True
+        return self._probe_and_record()
+
+    def _probe_and_record(self) -> bool:
+        """Sonda e libera a vez; quem chama já marcou `_refreshing`"""
+        try:
+            self._probe()
+        except Exception as e:
+            logger.debug("Sondagem do Ollama falhou: %s", e)
+            self.record_failure()
+            return False
+        else:
+            self.record_success()
+            return True
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+    def record_success(self) -> None:
+        """Registra uma chamada/sondagem bem-sucedida (fecha o circuito)"""
+        with self._lock:
+            if self._state != CircuitState.CLOSED:
+                logger.info("Ollama voltou a responder; circuito fechado")
+            self._state = CircuitState.CLOSED
+            self._failures = 0
+            self._available = True
+            self._checked_at = self._clock()
+
+    def record_failure(self) -> None:
+        """Registra uma falha; abre o circuito ao atingir o limite"""
+        with self._lock:
+            now = self._clock()
+            self._failures += 1
+            self._available = False
+            self._checked_at = now
+
+            if self._state == CircuitState.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != CircuitState.OPEN:
+                    logger.warning(
+                        "Ollama indisponível após %d falhas; circuito aberto por %.0fs",
+                        self._failures, self.reset_timeout
+                    )
+                self._state = CircuitState.OPEN
+                self._opened_at = now
+
+    def snapshot(self) -> dict:
+        """Estado atual para o endpoint de status"""
+        with self._lock:
+            now = self._clock()
+            return {
+                "circuit": self._state.value,
+                "consecutive_failures": self._failures,
+                "last_check_age_seconds": (
+                    round(now - self._checked_at, 1) if self._available is not None else None
+                ),
+            }
+
+    async def _run(self) -> None:
+        while True:
+            if self._state != CircuitState.OPEN or (
+                self._clock() - self._opened_at >= self.reset_timeout
+            ):
+                if self._state == CircuitState.OPEN:
+                    with self._lock:
+                        self._state = CircuitState.HALF_OPEN
+                await asyncio.to_thread(self.refresh)
+            await asyncio.sleep(self.ttl)
+
+    def start(self) -> None:
+        """Inicia a renovação periódica em background (lifespan da app)"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+# Instância global do monitor
+llm_health = LLMHealthMonitor()
@@ -0,0 +1,114 @@
+import asyncio
+import time
+from contextlib import contextmanager
+from typing import Any, Iterator, Mapping, Optional
+
+import httpx
+
+from app.core.metrics import metrics, current_endpoint
+
+# Durações do Ollama vêm em nanossegundos
+_NS = 1e9
+
+
+def is_timeout(exc: BaseException) -> bool:
+    return isinstance(exc, (asyncio.TimeoutError, httpx.TimeoutException))
+
+
+class LLMCall:
+    """
+    Medições de uma chamada ao Ollama.
+
+    - queue_wait: espera por um slot do scheduler
+    - ttft: tempo até o primeiro token; no streaming é medido no cliente a
+      partir do envio, sem streaming vem do servidor (carga + avaliação do prompt)
+    - total: do início da espera na fila até a resposta completa
+    - tokens de prompt/geração e tokens/s de geração, informados pelo Ollama
+
+    As métricas são rotuladas por operação, modelo e endpoint HTTP de origem.
+    """
+
+    def __init__(self, operation: str, model: str):
+        self.operation = operation
+        self.model = model
+        self.endpoint = current_endpoint()
+        self.started = time.perf_counter()
+        self.sent_at: Optional[float] = None
+        self.queue_wait: Optional[float] = None
+        self.ttft: Optional[float] = None
+        self.usage: Mapping[str, Any] = {}
+
+    def admitted(self, waited: float) -> None:
+        """Slot concedido: requisição sendo enviada ao Ollama"""
+        self.queue_wait = waited
+        self.sent_at = time.perf_counter()
+
+    def first_token(self) -> None:
+        if self.ttft is None and self.sent_at is not None:
+            self.ttft = time.perf_counter() - self.sent_at
+
+    def response(self, response: Any) -> None:
+        """Guarda contagens e durações da resposta final do Ollama"""
+        def field(name):
+            return response.get(name) if hasattr(response, "get") else getattr(response, name, None)
+
+        self.usage = {
+            name: field(name)
+            for name in ("prompt_eval_count", "eval_count", "eval_duration",
+                         "prompt_eval_duration", "load_duration")
+        }
+        if self.ttft is None and self.usage["prompt_eval_duration"] is not None:
+            self.ttft = ((self.usage["load_duration"] or 0) + self.usage["prompt_eval_duration"]) / _NS
+
+    def finish(self, outcome: str) -> None:
+        labels = {"operation": self.operation, "model": self.model, "endpoint": self.endpoint}
+        metrics.inc("llm.calls", outcome=outcome, **labels)
+        metrics.observe("llm.total_seconds", time.perf_counter() - self.started, **labels)
+        if self.queue_wait is not None:
+            metrics.observe("llm.queue_wait_seconds", self.queue_wait, **labels)
+        if outcome != "ok":
+            return
+
+        if self.ttft is not None:
+            metrics.observe("llm.ttft_seconds", self.ttft, **labels)
+
+        prompt_tokens = self.usage.get("prompt_eval_count")
+        eval_tokens = self.usage.get("eval_count")
+        if prompt_tokens is not None:
+            metrics.observe("llm.prompt_tokens", prompt_tokens, **labels)
+            metrics.inc("llm.prompt_tokens_total", prompt_tokens, **labels)
+        if eval_tokens is not None:
+            metrics.observe("llm.eval_tokens", eval_tokens, **labels)
+            metrics.inc("llm.eval_tokens_total", eval_tokens, **labels)
+
+        eval_duration = self.usage.get("eval_duration")
+        if eval_tokens and eval_duration:
+            metrics.observe("llm.tokens_per_second", eval_tokens / (eval_duration / _NS), **labels)
+
+        load_duration = self.usage.get("load_duration")
+        if load_duration:
+            metrics.observe("llm.load_seconds", load_duration / _NS, **labels)
+
+
+@contextmanager
+def track_llm_call(operation: str, model: str) -> Iterator[LLMCall]:
+    """
+    Mede uma chamada ao Ollama e registra o desfecho:
+    ok, timeout, error ou cancelled (cliente desconectou / tarefa cancelada).
+    """
+    call = LLMCall(operation, model)
+    try:
+        yield call
+    except Exception as e:
+        call.finish("timeout" if is_timeout(e) else "error")
+        raise
+    except BaseException:
+        call.finish("cancelled")
+        raise
+    else:
+        call.finish("ok")
+
+
+def record_fallback(operation: str, reason: str) -> None:
+    """Resposta degradada (sem LLM): unavailable, timeout, error ou invalid_answer"""
+    metrics.inc("llm.fallbacks", operation=operation, reason=reason, endpoint=current_endpoint())
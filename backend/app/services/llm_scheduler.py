@@ -0,0 +1,139 @@
+import asyncio
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from enum import IntEnum
+from typing import Deque, Dict, Optional
+
+from app.core.config import settings
+from app.core.metrics import metrics
+
+
+class LLMPriority(IntEnum):
+    """Classes de prioridade (menor valor = atendido primeiro)"""
+    CHAT = 0       # Chat interativo
+    ANALYZE = 1    # Análise sob demanda
+    BULK = 2       # Categorização em lote (importação de extrato)
+
+
+class LLMScheduler:
+    """
+    Fila de requisições na frente do Ollama.
+
+    - No máximo `max_in_flight` chamadas simultâneas (alinhar com
+      OLLAMA_NUM_PARALLEL do servidor).
+    - Prioridade estrita entre classes: chat > análise > lote.
+    - Chamadas em lote nunca ocupam os slots reservados para uso
+      interativo, então uma importação grande não atrasa o chat.
+    - Dentro de cada classe, usuários são atendidos em round-robin.
+    """
+
+    def __init__(self, max_in_flight: int = None, reserved_interactive: int = None):
+        self.max_in_flight = max(1, max_in_flight or settings.OLLAMA_NUM_PARALLEL)
+        reserved = (
+            reserved_interactive if reserved_interactive is not None
+            else settings.LLM_INTERACTIVE_RESERVED_SLOTS
+        )
+        self.bulk_limit = max(1, self.max_in_flight - reserved)
+
+        self._in_flight: Dict[LLMPriority, int] = {p: 0 for p in LLMPriority}
+        # prioridade -> usuário -> fila FIFO de futures aguardando slot
+        self._waiters: Dict[LLMPriority, "OrderedDict[str, Deque[asyncio.Future]]"] = {
+            p: OrderedDict() for p in LLMPriority
+        }
+
+    @property
+    def in_flight(self) -> int:
+        return sum(self._in_flight.values())
+
+    def queue_depth(self, priority: Optional[LLMPriority] = None) -> int:
+        priorities = [priority] if priority is not None else list(LLMPriority)
+        return sum(
+            sum(1 for fut in queue if not fut.done())
+            for p in priorities
+            for queue in self._waiters[p].values()
+        )
+
+    def _has_capacity(self, priority: LLMPriority) -> bool:
+        if self.in_flight >= self.max_in_flight:
+            return False
+        if priority == LLMPriority.BULK:
+            return self._in_flight[LLMPriority.BULK] < self.bulk_limit
+        return True
+
+    def _pop_next(self, priority: LLMPriority) -> Optional[asyncio.Future]:
+        users = self._waiters[priority]
+        while users:
+            user_key, queue = next(iter(users.items()))
+            fut = queue.popleft()
+            if queue:
+                users.move_to_end(user_key)  # próximo usuário na vez
+            else:
+                del users[user_key]
+            if not fut.done():
+                return fut
+        return None
+
+    def _dispatch(self) -> None:
+        for priority in LLMPriority:
+            while self._has_capacity(priority):
+                fut = self._pop_next(priority)
+                if fut is None:
+                    break
+                self._in_flight[priority] += 1
+                fut.set_result(None)
+
+    async def _acquire(self, priority: LLMPriority, user_key: str) -> None:
+        higher_waiting = any(self._waiters[p] for p in LLMPriority if p <= priority)
+        if not higher_waiting and self._has_capacity(priority):
+            self._in_flight[priority] += 1
+            return
+
+        fut = asyncio.get_running_loop().create_future()
+        self._waiters[priority].setdefault(user_key, deque()).append(fut)
+        try:
+            await fut
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():
+                # Slot concedido junto com o cancelamento: devolver
+                self._release(priority)
+            raise
+
+    def _release(self, priority: LLMPriority) -> None:
+        self._in_flight[priority] -= 1
+        self._dispatch()
+
+    @asynccontextmanager
+    async def slot(self, priority: LLMPriority, user_id: Optional[str] = None):
+        """
+        Aguarda um slot livre para chamar o Ollama.
+        Retorna (via `as`) o tempo de espera em fila, em segundos.
+        """
+        label = priority.name.lower()
+        started = time.perf_counter()
+        await self._acquire(priority, str(user_id) if user_id else "anonymous")
+        waited = time.perf_counter() - started
+
+        metrics.inc("llm.scheduler.admitted", priority=label)
+        metrics.observe("llm.scheduler.queue_wait_seconds", waited, priority=label)
+        try:
+            yield waited
+        finally:
+            self._release(priority)
+
+    def stats(self) -> dict:
+        """Gauges atuais para a superfície de métricas"""
+        result = {
+            "llm.scheduler.max_in_flight": self.max_in_flight,
+            "llm.scheduler.in_flight": self.in_flight,
+        }
+        for priority in LLMPriority:
+            label = priority.name.lower()
+            result[f"llm.scheduler.queue_depth{{priority={label}}}"] = self.queue_depth(priority)
+            result[f"llm.scheduler.in_flight{{priority={label}}}"] = self._in_flight[priority]
+        return result
+
+
+# Instância global do scheduler
+llm_scheduler = LLMScheduler()
+metrics.register_collector(llm_scheduler.stats)
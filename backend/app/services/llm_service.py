@@ -1,18 +1,90 @@
 import ollama
-from typing import Optional, List, Dict
+import asyncio
+import logging
+from functools import lru_cache
+from typing import Optional, List, Dict, AsyncIterator, Tuple
 from app.core.config import settings
+from app.services.llm_health import llm_health
+from app.services.llm_scheduler import llm_scheduler, LLMPriority
+from app.services.answer_cache import answer_cache
+from app.services.llm_warmup import model_warmer, keep_alive_value
+from app.services.llm_metrics import track_llm_call, record_fallback, is_timeout
+from app.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+# Categoria é curta e deve ser determinística
+CATEGORIZATION_OPTIONS = {"temperature": 0, "num_predict": 24}
+
+
+@lru_cache(maxsize=256)
+def categorization_prefix(categories: Tuple[str, ...]) -> str:
+    """
+    Prompt de sistema da categorização para um conjunto de categorias
+    (cacheado pelo hash da tupla de categorias).
+    """
+    category_list = "\n".join(f"- {cat}" for cat in categories)
+    prompt = f"""Você é um assistente financeiro que categoriza transações.
+
+Categorias disponíveis:
+{category_list}
+
+Analise a descrição da transação enviada e retorne APENAS o nome exato de UMA categoria da lista acima.
+Não adicione explicações, apenas o nome da categoria."""
+    return prompt
+
+
+def categorization_suffix(description: str, amount: float) -> str:
+    """Parte variável (por transação) do prompt de categorização"""
+    return f"""Transação:
+- Descrição: {description}
+- Valor: R$ {abs(amount):.2f} ({'despesa' if amount < 0 else 'receita'})
+
+Categoria:"""
+
+
+CHAT_SYSTEM_PROMPT = """Você é um assistente financeiro pessoal inteligente.
+Ajude o usuário a:
+- Entender seus gastos e receitas
+- Analisar padrões de consumo
+- Fazer previsões financeiras
+- Sugerir formas de economizar
+- Responder dúvidas sobre finanças pessoais
+
+Seja objetivo, claro e útil. Use português do Brasil."""
 
 
 class LLMService:
     def __init__(self, model: str = None):
         self.model = model or settings.OLLAMA_MODEL
         self.base_url = settings.OLLAMA_BASE_URL
+        self.health = llm_health
+        self.scheduler = llm_scheduler
+        self.answer_cache = answer_cache
+        self.warmer = model_warmer
+        self.keep_alive = keep_alive_value()
+        self._client: Optional[ollama.AsyncClient] = None
+        self._client_loop = None
+
+    @property
+    def client(self) -> ollama.AsyncClient:
+        """Cliente assíncrono do Ollama (um por event loop)"""
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._client_loop is not loop:
+            self._client = ollama.AsyncClient(
+                host=self.base_url,
+                timeout=settings.LLM_REQUEST_TIMEOUT_SECONDS
+            )
+            self._client_loop = loop
+        return self._client
 
     async def categorize_transaction(
         self,
         description: str,
         amount: float,
-        available_categories: List[str]
+        available_categories: List[str],
+        user_id: Optional[str] = None
     ) -> str:
         """
         Categoriza uma transação usando LLM.
@@ -21,31 +93,42 @@ class LLMService:
             description: Descrição da transação
             amount: Valor (negativo = despesa, positivo = receita)
             available_categories: Lista de categorias disponíveis
+            user_id: Usuário dono da requisição (fila justa entre usuários)
 
         Returns:
             Nome da categoria sugerida
         """
-        category_list = "\n".join(f"- {cat}" for cat in available_categories)
-
-        prompt = f"""Você é um assistente financeiro que categoriza transações.
-
-Categorias disponíveis:
-{category_list}
-
-Transação:
-- Descrição: {description}
-- Valor: R$ {abs(amount):.2f} ({'despesa' if amount < 0 else 'receita'})
-
-Analise a descrição e retorne APENAS o nome exato de UMA categoria da lista acima.
-Não adicione explicações, apenas o nome da categoria.
-
-Categoria:"""
+        fallback = available_categories[0] if available_categories else "Outros"
+
+        # Circuito aberto: degradar na hora em vez de esperar erro de conexão
+        if not self.health.is_available():
+            record_fallback("categorize", "unavailable")
+            return fallback
+
+        # Prefixo estável (instruções + categorias) como mensagem de sistema e
+        # só a transação na mensagem do usuário: o Ollama reaproveita o KV cache
+        # do prefixo entre linhas e avalia apenas o sufixo.
+        system_prompt = categorization_prefix(tuple(available_categories))
+        messages = [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": categorization_suffix(description, amount)},
+        ]
 
         try:
-            response = ollama.chat(
-                model=self.model,
-                messages=[{"role": "user", "content": prompt}]
-            )
+            await self.warmer.wait_ready()
+            # llm.prompt_tokens{operation=categorize} mede os tokens realmente
+            # avaliados por linha (o prefixo em cache não entra na conta)
+            with track_llm_call("categorize", self.model) as call:
+                async with self.scheduler.slot(LLMPriority.BULK, user_id) as waited:
+                    call.admitted(waited)
+                    response = await self.client.chat(
+                        model=self.model,
+                        messages=messages,
+                        options=CATEGORIZATION_OPTIONS,
+                        keep_alive=self.keep_alive
+                    )
+                call.response(response)
+            self._record_success()
 
             category = response['message']['content'].strip()
 
@@ -60,61 +143,95 @@ Categoria:"""
                     return cat
 
             # Se não encontrou, retornar a primeira categoria (fallback)
-            return available_categories[0] if available_categories else "Outros"
+            record_fallback("categorize", "invalid_answer")
+            return fallback
 
         except Exception as e:
-            print(f"Erro ao categorizar com LLM: {e}")
-            return available_categories[0] if available_categories else "Outros"
+            self._record_failure("categorize", e)
+            return fallback
+
+    async def categorize_transactions(
+        self,
+        transactions: List[Dict],
+        available_categories: List[str],
+        user_id: Optional[str] = None
+    ) -> List[Optional[str]]:
+        """
+        Categoriza um lote de transações em paralelo.
+        A concorrência real é limitada pelo scheduler (prioridade de lote),
+        então o lote nunca ocupa os slots reservados para o chat.
+
+        Args:
+            transactions: Itens com "description" e "amount"
+            available_categories: Lista de categorias disponíveis
+            user_id: Usuário dono da importação
+
+        Returns:
+            Categoria sugerida por item (None se o LLM estiver indisponível)
+        """
+        if not transactions or not self.check_availability():
+            return [None] * len(transactions)
+
+        return list(await asyncio.gather(*(
+            self.categorize_transaction(
+                description=trans["description"],
+                amount=trans["amount"],
+                available_categories=available_categories,
+                user_id=user_id
+            )
+            for trans in transactions
+        )))
 
     async def chat(
         self,
         message: str,
-        conversation_history: Optional[List[Dict[str, str]]] = None
+        conversation_history: Optional[List[Dict[str, str]]] = None,
+        user_id: Optional[str] = None,
+        financial_context: Optional[str] = None,
+        conversation_summary: Optional[str] = None
     ) -> str:
         """
         Conversa com o LLM sobre dados financeiros.
 
         Args:
             message: Mensagem do usuário
-            conversation_history: Histórico de mensagens anteriores
+            conversation_history: Histórico de mensagens anteriores (já dentro do orçamento)
+            user_id: Usuário dono da requisição
+            financial_context: Resumo financeiro do usuário (ancora as respostas)
+            conversation_summary: Resumo dos turnos antigos que saíram do histórico
 
         Returns:
             Resposta do LLM
         """
-        messages = conversation_history or []
-
-        # Sistema: contexto do assistente financeiro
-        system_message = {
-            "role": "system",
-            "content": """Você é um assistente financeiro pessoal inteligente.
-Ajude o usuário a:
-- Entender seus gastos e receitas
-- Analisar padrões de consumo
-- Fazer previsões financeiras
-- Sugerir formas de economizar
-- Responder dúvidas sobre finanças pessoais
-
-Seja objetivo, claro e útil. Use português do Brasil."""
-        }
-
-        messages.insert(0, system_message)
-        messages.append({"role": "user", "content": message})
+        messages = self._chat_messages(
+            message, conversation_history, financial_context, conversation_summary
+        )
 
         try:
-            response = ollama.chat(
-                model=self.model,
-                messages=messages
-            )
+            await self.warmer.wait_ready()
+            with track_llm_call("chat", self.model) as call:
+                async with self.scheduler.slot(LLMPriority.CHAT, user_id) as waited:
+                    call.admitted(waited)
+                    response = await self.client.chat(
+                        model=self.model,
+                        messages=messages,
+                        keep_alive=self.keep_alive
+                    )
+                call.response(response)
+            self._record_success()
 
             return response['message']['content']
 
         except Exception as e:
+            self._record_failure("chat", e)
             return f"Desculpe, não consegui processar sua mensagem. Erro: {str(e)}"
 
     async def analyze_transactions(
         self,
         transactions_summary: str,
-        user_question: str
+        user_question: str,
+        user_id: Optional[str] = None,
+        ledger_version: Optional[int] = None
     ) -> str:
         """
         Analisa transações e responde pergunta do usuário.
@@ -122,11 +239,228 @@ Seja objetivo, claro e útil. Use português do Brasil."""
         Args:
             transactions_summary: Resumo das transações em texto
             user_question: Pergunta do usuário
+            user_id: Usuário dono da requisição
+            ledger_version: Versão do extrato; com ela a resposta é cacheada
+                e perguntas repetidas não passam pelo LLM
 
         Returns:
             Análise do LLM
         """
-        prompt = f"""Você é um analista financeiro. Com base nos dados abaixo, responda a pergunta do usuário.
+        cached, embedding = await self._cached_answer(user_id, ledger_version, user_question)
+        if cached is not None:
+            return cached
+
+        prompt = self._analysis_prompt(transactions_summary, user_question)
+
+        try:
+            await self.warmer.wait_ready()
+            with track_llm_call("analyze", self.model) as call:
+                async with self.scheduler.slot(LLMPriority.ANALYZE, user_id) as waited:
+                    call.admitted(waited)
+                    response = await self.client.chat(
+                        model=self.model,
+                        messages=[{"role": "user", "content": prompt}],
+                        keep_alive=self.keep_alive
+                    )
+                call.response(response)
+            self._record_success()
+
+            answer = response['message']['content']
+            self._store_answer(user_id, ledger_version, user_question, answer, embedding)
+            return answer
+
+        except Exception as e:
+            self._record_failure("analyze", e)
+            return f"Erro ao analisar: {str(e)}"
+
+    def chat_stream(
+        self,
+        message: str,
+        conversation_history: Optional[List[Dict[str, str]]] = None,
+        user_id: Optional[str] = None,
+        financial_context: Optional[str] = None,
+        conversation_summary: Optional[str] = None
+    ) -> AsyncIterator[str]:
+        """
+        Versão em streaming de `chat`: produz os tokens conforme o Ollama gera.
+        Fechar o gerador (cliente desconectou) encerra a requisição ao Ollama,
+        que interrompe a geração.
+        """
+        messages = self._chat_messages(
+            message, conversation_history, financial_context, conversation_summary
+        )
+        return self._stream(LLMPriority.CHAT, user_id, messages, "chat_stream")
+
+    async def analyze_stream(
+        self,
+        transactions_summary: str,
+        user_question: str,
+        user_id: Optional[str] = None,
+        ledger_version: Optional[int] = None
+    ) -> AsyncIterator[str]:
+        """
+        Versão em streaming de `analyze_transactions`.
+        Em acerto de cache a resposta sai inteira em um único pedaço.
+        """
+        cached, embedding = await self._cached_answer(user_id, ledger_version, user_question)
+        if cached is not None:
+            yield cached
+            return
+
+        prompt = self._analysis_prompt(transactions_summary, user_question)
+        messages = [{"role": "user", "content": prompt}]
+        chunks = []
+        tokens = self._stream(LLMPriority.ANALYZE, user_id, messages, "analyze_stream")
+        try:
+            async for token in tokens:
+                chunks.append(token)
+                yield token
+        finally:
+            await tokens.aclose()
+
+        self._store_answer(user_id, ledger_version, user_question, "".join(chunks), embedding)
+
+    async def embed(
+        self,
+        texts: List[str],
+        user_id: Optional[str] = None,
+        priority: LLMPriority = LLMPriority.ANALYZE
+    ) -> Optional[List[List[float]]]:
+        """
+        Embeddings dos textos via Ollama (modelo OLLAMA_EMBED_MODEL).
+        Retorna None se o LLM estiver indisponível ou o modelo falhar.
+        """
+        if not texts:
+            return None
+        if not self.check_availability():
+            record_fallback("embed", "unavailable")
+            return None
+
+        try:
+            with track_llm_call("embed", settings.OLLAMA_EMBED_MODEL) as call:
+                async with self.scheduler.slot(priority, user_id) as waited:
+                    call.admitted(waited)
+                    response = await self.client.embed(
+                        model=settings.OLLAMA_EMBED_MODEL,
+                        input=texts,
+                        keep_alive=self.keep_alive
+                    )
+                call.response(response)
+            return [list(vector) for vector in response['embeddings']]
+        except Exception as e:
+            # Modelo de embedding ausente não indica Ollama fora: circuito intacto
+            logger.warning("Erro ao gerar embeddings (%s): %s", type(e).__name__, e)
+            record_fallback("embed", "timeout" if is_timeout(e) else "error")
+            return None
+
+    async def _cached_answer(
+        self,
+        user_id: Optional[str],
+        ledger_version: Optional[int],
+        question: str
+    ):
+        """(resposta em cache ou None, embedding da pergunta se calculado)"""
+        if user_id is None or ledger_version is None:
+            return None, None
+
+        cached = self.answer_cache.get(user_id, ledger_version, question)
+        if cached is not None:
+            metrics.inc("llm.answer_cache.hits", match="exact")
+            return cached, None
+
+        embedding = None
+        if settings.ANSWER_CACHE_SEMANTIC:
+            vectors = await self.embed([question], user_id=user_id)
+            embedding = vectors[0] if vectors else None
+            if embedding is not None:
+                cached = self.answer_cache.get_similar(user_id, ledger_version, embedding)
+                if cached is not None:
+                    metrics.inc("llm.answer_cache.hits", match="semantic")
+                    return cached, embedding
+
+        metrics.inc("llm.answer_cache.misses")
+        return None, embedding
+
+    def _store_answer(
+        self,
+        user_id: Optional[str],
+        ledger_version: Optional[int],
+        question: str,
+        answer: str,
+        embedding: Optional[List[float]]
+    ) -> None:
+        if user_id is None or ledger_version is None or not answer:
+            return
+        self.answer_cache.put(user_id, ledger_version, question, answer, embedding)
+
+    async def _stream(
+        self,
+        priority: LLMPriority,
+        user_id: Optional[str],
+        messages: List[Dict[str, str]],
+        operation: str
+    ) -> AsyncIterator[str]:
+        await self.warmer.wait_ready()
+        # O slot do scheduler fica ocupado durante todo o streaming
+        with track_llm_call(operation, self.model) as call:
+            async with self.scheduler.slot(priority, user_id) as waited:
+                call.admitted(waited)
+                stream = None
+                try:
+                    stream = await self.client.chat(
+                        model=self.model,
+                        messages=messages,
+                        stream=True,
+                        keep_alive=self.keep_alive
+                    )
+                    async for part in stream:
+                        content = part['message']['content']
+                        if part.get('done'):
+                            # Último pedaço traz as contagens de tokens e durações
+                            call.response(part)
+                        if content:
+                            call.first_token()
+                            yield content
+                except Exception as e:
+                    self._record_failure(operation, e)
+                    raise
+                else:
+                    self._record_success()
+                finally:
+                    if stream is not None:
+                        await stream.aclose()
+
+    @staticmethod
+    def system_prompt(
+        financial_context: Optional[str] = None,
+        conversation_summary: Optional[str] = None
+    ) -> str:
+        """Mensagem de sistema do chat (contexto do assistente financeiro)"""
+        content = CHAT_SYSTEM_PROMPT
+        if financial_context:
+            content += f"\n\nDADOS FINANCEIROS DO USUÁRIO:\n{financial_context}"
+        if conversation_summary:
+            content += f"\n\nRESUMO DA CONVERSA ATÉ AQUI:\n{conversation_summary}"
+        return content
+
+    @classmethod
+    def _chat_messages(
+        cls,
+        message: str,
+        conversation_history: Optional[List[Dict[str, str]]] = None,
+        financial_context: Optional[str] = None,
+        conversation_summary: Optional[str] = None
+    ) -> List[Dict[str, str]]:
+        # Nova lista: não altera o histórico recebido
+        return [
+            {"role": "system", "content": cls.system_prompt(financial_context, conversation_summary)},
+            *(conversation_history or []),
+            {"role": "user", "content": message},
+        ]
+
+    @staticmethod
+    def _analysis_prompt(transactions_summary: str, user_question: str) -> str:
+        return f"""Você é um analista financeiro. Com base nos dados abaixo, responda a pergunta do usuário.
 
 DADOS FINANCEIROS:
 {transactions_summary}
@@ -136,24 +470,29 @@ PERGUNTA DO USUÁRIO:
 
 Forneça uma resposta detalhada e útil, com insights práticos."""
 
-        try:
-            response = ollama.chat(
-                model=self.model,
-                messages=[{"role": "user", "content": prompt}]
-            )
-
-            return response['message']['content']
-
-        except Exception as e:
-            return f"Erro ao analisar: {str(e)}"
+    def _record_success(self) -> None:
+        """Chamada ao Ollama concluída: circuito fechado e modelo em uso"""
+        self.health.record_success()
+        self.warmer.touch()
+
+    def _record_failure(self, operation: str, error: Exception) -> None:
+        """Chamada ao Ollama falhou: conta para o circuit breaker"""
+        reason = "timeout" if is_timeout(error) else "error"
+        logger.warning(
+            "Falha na chamada ao LLM (%s, %s): %s", operation, type(error).__name__, error,
+            exc_info=reason == "error"
+        )
+        if operation in ("categorize", "chat", "analyze"):
+            # Essas operações respondem com texto degradado em vez de erro
+            record_fallback(operation, reason)
+        self.health.record_failure()
 
     def check_availability(self) -> bool:
-        """Verifica se o Ollama está disponível"""
-        try:
-            ollama.list()
-            return True
-        except:
-            return False
+        """
+        Verifica se o Ollama está disponível.
+        Resposta instantânea vinda do monitor de saúde (cache + circuit breaker).
+        """
+        return self.health.is_available()
 
 
 # Instância global do serviço
@@ -0,0 +1,156 @@
+import asyncio
+import logging
+import time
+from enum import Enum
+from typing import Optional, Union
+
+import ollama
+
+from app.core.config import settings
+from app.services.llm_health import llm_health
+
+logger = logging.getLogger(__name__)
+
+
+class ModelLoadState(str, Enum):
+    COLD = "cold"        # Modelo não carregado (ou Ollama reiniciou)
+    LOADING = "loading"  # Carregamento em andamento
+    READY = "ready"      # Modelo em memória
+    ERROR = "error"      # Última tentativa falhou
+
+
+def keep_alive_value(raw: str = None) -> Union[int, str]:
+    """
+    Valor de keep_alive para o Ollama: números (segundos; -1 = para sempre)
+    são enviados como inteiros, durações ("30m", "2h") como texto.
+    """
+    raw = (raw if raw is not None else settings.OLLAMA_KEEP_ALIVE).strip()
+    return int(raw) if raw.lstrip("-").isdigit() else raw
+
+
+class ModelWarmer:
+    """
+    Mantém o modelo do Ollama carregado para que nenhuma requisição de
+    usuário pague o tempo de carga.
+
+    - Na subida da aplicação carrega o modelo em background (prompt vazio
+      em /api/generate) já com `keep_alive`. Chamadas ao LLM que chegam
+      antes dessa carga terminar esperam por ela (`wait_ready`), até
+      `OLLAMA_WARMUP_WAIT_SECONDS`, em vez de disputar o carregamento.
+    - Com pouco tráfego, envia pings periódicos para renovar o keep_alive.
+    - Se o Ollama cair, volta para COLD e recarrega quando ele voltar.
+    """
+
+    def __init__(
+        self,
+        model: str = None,
+        keep_alive: str = None,
+        ping_interval: float = None,
+        check_interval: float = None
+    ):
+        self.model = model or settings.OLLAMA_MODEL
+        self.keep_alive = keep_alive_value(keep_alive)
+        self.ping_interval = ping_interval or settings.OLLAMA_KEEP_WARM_INTERVAL_SECONDS
+        self.check_interval = check_interval or min(self.ping_interval, settings.LLM_HEALTH_TTL_SECONDS)
+
+        self.state = ModelLoadState.COLD
+        self.last_error: Optional[str] = None
+        self.load_seconds: Optional[float] = None
+        self._last_activity = 0.0
+        self._task: Optional[asyncio.Task] = None
+        self._first_load: Optional[asyncio.Event] = None  # Criado no loop da app em start()
+
+    def touch(self) -> None:
+        """Registra uso do modelo (chamada real ao LLM)"""
+        self._last_activity = time.monotonic()
+        self.state = ModelLoadState.READY
+
+    async def warm(self, client: ollama.AsyncClient) -> bool:
+        """Carrega (ou renova) o modelo em memória"""
+        if self.state != ModelLoadState.READY:
+            self.state = ModelLoadState.LOADING
+
+        started = time.perf_counter()
+        try:
+            await client.generate(model=self.model, prompt="", keep_alive=self.keep_alive)
+        except Exception as e:
+            self.state = ModelLoadState.ERROR
+            self.last_error = str(e)
+            logger.warning("Falha ao pré-carregar o modelo %s: %s", self.model, e)
+            return False
+
+        if self.state != ModelLoadState.READY:
+            self.load_seconds = round(time.perf_counter() - started, 3)
+            logger.info("Modelo %s carregado em %.1fs", self.model, self.load_seconds)
+        self.state = ModelLoadState.READY
+        self.last_error = None
+        self._last_activity = time.monotonic()
+        return True
+
+    async def _run(self) -> None:
+        client = ollama.AsyncClient(host=settings.OLLAMA_BASE_URL)
+        try:
+            await self.warm(client)
+        finally:
+            # Sucesso ou falha: quem esperava pela carga segue
+            self._first_load.set()
+
+        while True:
+            await asyncio.sleep(self.check_interval)
+
+            if not llm_health.is_available():
+                # Ollama fora: o modelo precisará ser recarregado
+                self.state = ModelLoadState.COLD
+                continue
+
+            idle = time.monotonic() - self._last_activity
+            if self.state != ModelLoadState.READY or idle >= self.ping_interval:
+                await self.warm(client)
+
+    def start(self) -> None:
+        """Inicia o pré-carregamento e os pings (lifespan da app)"""
+        if not settings.OLLAMA_WARMUP_ENABLED:
+            return
+        if self._task is None or self._task.done():
+            self._first_load = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def wait_ready(self, timeout: float = None) -> None:
+        """
+        Espera a carga inicial do modelo terminar, no máximo `timeout`
+        segundos. Depois dela (ou sem warm-up em andamento) retorna na hora.
+        """
+        loaded = self._first_load
+        if loaded is None or loaded.is_set():
+            return
+        timeout = timeout if timeout is not None else settings.OLLAMA_WARMUP_WAIT_SECONDS
+        try:
+            await asyncio.wait_for(loaded.wait(), timeout)
+        except asyncio.TimeoutError:
+            logger.info("Modelo %s ainda carregando após %.0fs; seguindo sem esperar", self.model, timeout)
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._first_load is not None:
+            self._first_load.set()
+            self._first_load = None
+
+    def snapshot(self) -> dict:
+        """Estado de carga para o endpoint de status"""
+        return {
+            "model": self.model,
+            "state": self.state.value,
+            "keep_alive": self.keep_alive,
+            "load_seconds": self.load_seconds,
+            "last_error": self.last_error,
+        }
+
+
+# Instância global
+model_warmer = ModelWarmer()
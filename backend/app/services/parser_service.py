@@ -1,9 +1,12 @@
+import logging
 import pandas as pd
 from typing import List, Dict, Optional
 from datetime import datetime
 from io import StringIO, BytesIO
 import csv
 
+logger = logging.getLogger(__name__)
+
 
 class BankStatementParser:
     """Parser para extratos bancários em diferentes formatos"""
@@ -65,7 +68,7 @@ class BankStatementParser:
                 df, ["credito", "crédito", "credit", "entrada"]
             )
 
-            for _, row in df.iterrows():
+            for idx, row in df.iterrows():
                 try:
                     # Parse da data
                     date_str = str(row[date_col])
@@ -92,7 +95,7 @@ class BankStatementParser:
                         })
 
                 except Exception as e:
-                    print(f"Erro ao processar linha: {e}")
+                    logger.warning("Erro ao processar linha %s do CSV: %s", idx, e)
                     continue
 
             return transactions
@@ -0,0 +1,91 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional, Tuple
+
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.core.security import get_password_hash, verify_and_update_password
+
+
+class PasswordHasherSaturated(Exception):
+    """Fila de hashing cheia: o chamador deve responder 429"""
+
+
+class PasswordHasher:
+    """
+    bcrypt (~250ms de CPU por chamada) fora do event loop.
+
+    - Pool dedicado de `workers` threads; o bcrypt libera o GIL, então o
+      loop continua atendendo as outras requisições durante um pico de
+      logins.
+    - No máximo `workers + max_queue` pedidos pendentes; além disso,
+      `PasswordHasherSaturated` na hora (backpressure) em vez de enfileirar
+      sem limite.
+    - Latência de execução e espera em fila vão para as métricas.
+    """
+
+    def __init__(self, workers: int = None, max_queue: int = None):
+        self.workers = max(1, workers or settings.PASSWORD_HASH_WORKERS)
+        self.max_queue = max_queue if max_queue is not None else settings.PASSWORD_HASH_MAX_QUEUE
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bcrypt")
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._running = 0
+
+    @property
+    def capacity(self) -> int:
+        return self.workers + self.max_queue
+
+    async def _submit(self, operation: str, function: Callable, *args):
+        with self._lock:
+            if self._pending >= self.capacity:
+                metrics.inc("auth.password_hash.rejected", operation=operation)
+                raise PasswordHasherSaturated()
+            self._pending += 1
+        queued_at = time.perf_counter()
+
+        def run():
+            started = time.perf_counter()
+            with self._lock:
+                self._running += 1
+            try:
+                return function(*args)
+            finally:
+                finished = time.perf_counter()
+                with self._lock:
+                    self._running -= 1
+                metrics.observe("auth.password_hash.queue_wait_seconds", started - queued_at, operation=operation)
+                metrics.observe("auth.password_hash.seconds", finished - started, operation=operation)
+
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, run)
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    async def hash(self, password: str) -> str:
+        """Hash novo com o custo configurado"""
+        return await self._submit("hash", get_password_hash, password)
+
+    async def verify(self, password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+        """(senha confere, hash novo se o custo/esquema mudou)"""
+        valid, new_hash = await self._submit("verify", verify_and_update_password, password, hashed_password)
+        if new_hash is not None:
+            metrics.inc("auth.password_hash.rehashed")
+        return valid, new_hash
+
+    def stats(self) -> dict:
+        """Gauges atuais para a superfície de métricas"""
+        with self._lock:
+            return {
+                "auth.password_hash.workers": self.workers,
+                "auth.password_hash.running": self._running,
+                "auth.password_hash.pending": self._pending,
+            }
+
+
+# Instância global
+password_hasher = PasswordHasher()
+metrics.register_collector(password_hasher.stats)
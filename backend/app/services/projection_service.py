@@ -0,0 +1,549 @@
+from datetime import date
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional, Tuple
+from uuid import UUID
+
+import numpy as np
+from sqlalchemy import Integer, Numeric, and_, case, delete, func, insert, literal, literal_column, or_, select, union_all
+from sqlalchemy.dialects.postgresql import UUID as PG_UUID
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+
+from app.core.config import settings
+
+from app.db.functions import month_bucket, new_uuid, week_bucket
+from app.models.category import Category
+from app.models.projection import Projection
+from app.models.projection_item import ProjectionItem
+from app.models.projection_override import ProjectionOverride
+from app.models.projection_rule import ProjectionRule
+from app.models.transaction import Transaction
+from app.schemas.projection import ProjectionResponse, ProjectionWithStats
+from app.services.recurrence import Occurrences, expand
+
+SIDES = ("projection", "real")
+BUCKETS = {"month": month_bucket, "week": week_bucket}
+
+
+def _empty_totals() -> Dict[str, float]:
+    return {"income": 0.0, "expenses": 0.0, "count": 0}
+
+
+def _bucket_dates(dates: np.ndarray, granularity: str) -> np.ndarray:
+    """Mesmo rótulo de período do SQL ('YYYY-MM' ou segunda-feira 'YYYY-MM-DD')"""
+    if granularity == "month":
+        return dates.astype("datetime64[M]").astype(str)
+    # 1970-01-01 foi quinta-feira: (dias + 3) % 7 é 0 na segunda
+    days = dates.astype("datetime64[D]")
+    return (days - (days.astype(np.int64) + 3) % 7).astype(str)
+
+
+class ProjectionService:
+    """Consultas agregadas e escritas em massa dos cenários de projeção"""
+
+    @staticmethod
+    def chain(user_id: UUID, projection_ids: Optional[Iterable[UUID]] = None):
+        """
+        CTE recursiva (target_id, id, depth): cada cenário pedido e seus
+        ancestrais, com a distância até ele (0 = o próprio cenário).
+        """
+        base = select(
+            Projection.id.label("target_id"),
+            Projection.id.label("id"),
+            Projection.parent_id.label("parent_id"),
+            literal_column("0", Integer).label("depth")
+        ).where(Projection.user_id == user_id)
+        if projection_ids is not None:
+            base = base.where(Projection.id.in_(list(projection_ids)))
+
+        chain = base.cte("projection_chain", recursive=True)
+        parent = aliased(Projection)
+        return chain.union_all(
+            select(
+                chain.c.target_id, parent.id, parent.parent_id, chain.c.depth + 1
+            ).select_from(chain).join(
+                parent, parent.id == chain.c.parent_id
+            ).where(chain.c.depth < settings.PROJECTION_MAX_DEPTH)
+        )
+
+    def resolved_items(self, user_id: UUID, projection_ids: Optional[Iterable[UUID]] = None):
+        """
+        Itens efetivos de cada cenário (subquery), resolvendo a cadeia de
+        variações numa única consulta recursiva: transações do cenário e dos
+        ancestrais com os overrides da cadeia. O override mais próximo do
+        cenário pedido decide se o item aparece (remove o esconde); cada
+        campo vem do override mais próximo que o preenche, então edições em
+        níveis diferentes se somam.
+
+        Colunas: projection_id (cenário pedido), id, source_projection_id,
+        depth, date, description, amount, category_id, modified.
+        """
+        chain = self.chain(user_id, projection_ids)
+        item_chain = chain.alias("item_chain")
+        override_chain = chain.alias("override_chain")
+
+        applicable = select(
+            ProjectionOverride.item_id,
+            ProjectionOverride.action,
+            ProjectionOverride.date,
+            ProjectionOverride.description,
+            ProjectionOverride.amount,
+            ProjectionOverride.category_id,
+            override_chain.c.target_id,
+            override_chain.c.depth
+        ).join(
+            override_chain, override_chain.c.id == ProjectionOverride.projection_id
+        ).subquery("applicable")
+
+        window = {"partition_by": (item_chain.c.target_id, ProjectionItem.id)}
+
+        def nearest(field, inherited):
+            # Overrides que preenchem o campo primeiro, do mais próximo ao mais distante
+            value = func.first_value(field).over(order_by=(field.is_(None), applicable.c.depth), **window)
+            return func.coalesce(value, inherited)
+
+        ranked = select(
+            item_chain.c.target_id.label("projection_id"),
+            ProjectionItem.id.label("id"),
+            ProjectionItem.projection_id.label("source_projection_id"),
+            item_chain.c.depth.label("depth"),
+            nearest(applicable.c.date, ProjectionItem.date).label("date"),
+            nearest(applicable.c.description, ProjectionItem.description).label("description"),
+            nearest(applicable.c.amount, ProjectionItem.amount).label("amount"),
+            nearest(applicable.c.category_id, ProjectionItem.category_id).label("category_id"),
+            applicable.c.action.label("action"),
+            func.row_number().over(order_by=applicable.c.depth, **window).label("rank")
+        ).select_from(ProjectionItem).join(
+            item_chain, item_chain.c.id == ProjectionItem.projection_id
+        ).outerjoin(
+            applicable,
+            and_(
+                applicable.c.item_id == ProjectionItem.id,
+                applicable.c.target_id == item_chain.c.target_id,
+                applicable.c.depth < item_chain.c.depth
+            )
+        ).where(
+            ProjectionItem.user_id == user_id
+        ).subquery("ranked")
+
+        return select(
+            ranked.c.projection_id,
+            ranked.c.id,
+            ranked.c.source_projection_id,
+            ranked.c.depth,
+            ranked.c.date,
+            ranked.c.description,
+            ranked.c.amount,
+            ranked.c.category_id,
+            case((ranked.c.action == "modify", True), else_=False).label("modified")
+        ).where(
+            ranked.c.rank == 1,
+            or_(ranked.c.action.is_(None), ranked.c.action != "remove")
+        ).subquery("resolved")
+
+    async def list_items(
+        self,
+        db: AsyncSession,
+        user_id: UUID,
+        projection_id: UUID,
+        item_id: Optional[UUID] = None
+    ) -> List[Dict]:
+        """Itens efetivos de um cenário, em ordem de data"""
+        items = self.resolved_items(user_id, [projection_id])
+        query = select(items).order_by(items.c.date, items.c.description)
+        if item_id is not None:
+            query = query.where(items.c.id == item_id)
+        return [
+            {**row._mapping, "inherited": row.source_projection_id != projection_id}
+            for row in await db.execute(query)
+        ]
+
+    async def chain_depth(self, db: AsyncSession, user_id: UUID, projection_id: UUID) -> int:
+        """Quantos ancestrais o cenário tem (0 = cenário raiz)"""
+        chain = self.chain(user_id, [projection_id])
+        return (await db.execute(select(func.max(chain.c.depth)))).scalar() or 0
+
+    async def override_item(
+        self,
+        db: AsyncSession,
+        projection: Projection,
+        item_id: UUID,
+        changes: Optional[Dict] = None
+    ) -> bool:
+        """
+        Altera (changes) ou remove (changes=None) um item do cenário. Item
+        próprio é alterado diretamente; item herdado ganha um
+        override neste cenário, sem tocar no pai. Não faz commit.
+
+        Returns:
+            False se o item não existe no cenário
+        """
+        current = await self.list_items(db, projection.user_id, projection.id, item_id)
+        if not current:
+            return False
+
+        if current[0]["source_projection_id"] == projection.id:
+            if changes is None:
+                await db.execute(
+                    delete(ProjectionItem).where(ProjectionItem.id == item_id),
+                    execution_options={"synchronize_session": False}
+                )
+            else:
+                item = await db.get(ProjectionItem, item_id)
+                for field, value in changes.items():
+                    setattr(item, field, value)
+            return True
+
+        override = (await db.execute(
+            select(ProjectionOverride).where(
+                ProjectionOverride.projection_id == projection.id,
+                ProjectionOverride.item_id == item_id
+            )
+        )).scalar_one_or_none()
+        if override is None:
+            override = ProjectionOverride(projection_id=projection.id, item_id=item_id)
+            db.add(override)
+
+        if changes is None:
+            override.action = "remove"
+            override.date = override.description = override.amount = override.category_id = None
+        else:
+            override.action = "modify"
+            for field, value in changes.items():
+                setattr(override, field, value)
+        return True
+
+    def _stats_subquery(self, user_id: UUID, projection_id: Optional[UUID] = None):
+        """Quantidade, receitas e despesas por cenário (itens resolvidos pela cadeia)"""
+        items = self.resolved_items(user_id, None if projection_id is None else [projection_id])
+        return select(
+            items.c.projection_id.label("projection_id"),
+            func.count(items.c.id).label("total_transactions"),
+            func.sum(case((items.c.amount > 0, items.c.amount), else_=0)).label("total_income"),
+            func.sum(case((items.c.amount < 0, -items.c.amount), else_=0)).label("total_expenses"),
+        ).group_by(items.c.projection_id).subquery()
+
+    async def rules_by_projection(
+        self,
+        db: AsyncSession,
+        user_id: UUID,
+        projection_ids: Optional[Iterable[UUID]] = None
+    ) -> Dict[UUID, Tuple[List[ProjectionRule], date, date]]:
+        """
+        Regras recorrentes de cada cenário, herdadas dos ancestrais, com a
+        janela (início, fim) do cenário pedido. As regras não têm override:
+        pertencem ao cenário que as definiu e valem para os derivados.
+        """
+        chain = self.chain(user_id, projection_ids)
+        target = aliased(Projection)
+        rows = await db.execute(
+            select(ProjectionRule, chain.c.target_id, target.start_date, target.end_date).join(
+                chain, chain.c.id == ProjectionRule.projection_id
+            ).join(
+                target, target.id == chain.c.target_id
+            ).order_by(chain.c.target_id, ProjectionRule.start_date, ProjectionRule.created_at)
+        )
+
+        grouped: Dict[UUID, Tuple[List[ProjectionRule], date, date]] = {}
+        for rule, target_id, start, end in rows:
+            grouped.setdefault(target_id, ([], start, end))[0].append(rule)
+        return grouped
+
+    async def _rule_stats(self, db: AsyncSession, user_id: UUID, projection_id: Optional[UUID] = None) -> Dict[UUID, Dict]:
+        """
+        Estatísticas das regras recorrentes por cenário, expandidas na janela
+        de cada cenário (uma consulta, expansão vetorizada em memória).
+        """
+        grouped = await self.rules_by_projection(db, user_id, None if projection_id is None else [projection_id])
+        return {
+            pid: {**expand(rules, start, end).summary(), "rules": len(rules)}
+            for pid, (rules, start, end) in grouped.items()
+        }
+
+    async def list_with_stats(
+        self,
+        db: AsyncSession,
+        user_id: UUID,
+        projection_id: Optional[UUID] = None
+    ) -> List[ProjectionWithStats]:
+        """
+        Cenários do usuário com estatísticas em uma única consulta
+        (LEFT JOIN com o agregado; cenário sem transações fica zerado),
+        somadas às ocorrências das regras recorrentes.
+        """
+        stats = self._stats_subquery(user_id, projection_id)
+        query = select(
+            Projection,
+            func.coalesce(stats.c.total_transactions, 0),
+            func.coalesce(stats.c.total_income, 0),
+            func.coalesce(stats.c.total_expenses, 0),
+        ).outerjoin(
+            stats, stats.c.projection_id == Projection.id
+        ).where(
+            Projection.user_id == user_id
+        )
+        if projection_id is not None:
+            query = query.where(Projection.id == projection_id)
+
+        rows = (await db.execute(query.order_by(Projection.created_at.desc()))).all()
+        rule_stats = await self._rule_stats(db, user_id, projection_id) if rows else {}
+        return [
+            self._with_stats(projection, count, income, expenses, rule_stats.get(projection.id))
+            for projection, count, income, expenses in rows
+        ]
+
+    async def get_with_stats(self, db: AsyncSession, user_id: UUID, projection_id: UUID) -> Optional[ProjectionWithStats]:
+        rows = await self.list_with_stats(db, user_id, projection_id)
+        return rows[0] if rows else None
+
+    @staticmethod
+    async def copy_real_transactions(
+        db: AsyncSession,
+        user_id: UUID,
+        projection_id: UUID,
+        start_date: date,
+        end_date: date,
+        scale: Decimal = Decimal("1")
+    ) -> int:
+        """
+        Copia as transações reais do período para os itens do cenário com um único
+        INSERT ... SELECT (nada passa pelo Python), multiplicando os valores
+        por `scale`. Roda na transação da sessão; o commit fica com quem chamou.
+
+        Returns:
+            Quantidade de transações copiadas
+        """
+        amount = Transaction.amount
+        if scale != 1:
+            amount = func.round(amount * literal(scale, Numeric(10, 4)), 2)
+
+        source = select(
+            new_uuid(),
+            Transaction.user_id,
+            literal(projection_id, PG_UUID(as_uuid=True)),
+            Transaction.date,
+            Transaction.description,
+            amount,
+            Transaction.category_id,
+        ).where(
+            Transaction.user_id == user_id,
+            Transaction.is_projection == False,
+            Transaction.date >= start_date,
+            Transaction.date <= end_date
+        )
+
+        result = await db.execute(
+            insert(ProjectionItem).from_select(
+                [
+                    ProjectionItem.id,
+                    ProjectionItem.user_id,
+                    ProjectionItem.projection_id,
+                    ProjectionItem.date,
+                    ProjectionItem.description,
+                    ProjectionItem.amount,
+                    ProjectionItem.category_id,
+                ],
+                source
+            )
+        )
+        return result.rowcount
+
+    async def rule_occurrences(
+        self,
+        db: AsyncSession,
+        projection: Projection,
+        start: Optional[date] = None,
+        end: Optional[date] = None
+    ) -> Tuple[List[ProjectionRule], Occurrences]:
+        """Regras do cenário (com as herdadas) e suas ocorrências no período (padrão: janela do cenário)"""
+        grouped = await self.rules_by_projection(db, projection.user_id, [projection.id])
+        rules, _, _ = grouped.get(projection.id, ([], None, None))
+        return rules, expand(rules, start or projection.start_date, end or projection.end_date)
+
+    async def compare(
+        self,
+        db: AsyncSession,
+        user_id: UUID,
+        projection_ids: Iterable[UUID],
+        granularity: str = "month"
+    ) -> List[Dict]:
+        """
+        Projetado vs real de vários cenários: totais, por categoria e por
+        período (mês ou semana), com diferenças.
+
+        Uma única consulta agrega os dois lados: UNION ALL das transações do
+        cenário com as transações reais dentro da janela de cada cenário,
+        somas com FILTER por sinal e GROUP BY (cenário, lado, categoria,
+        período). As regras recorrentes entram pelo lado projetado,
+        expandidas em memória. A memória fica em O(categorias × períodos).
+        """
+        projection_ids = list(dict.fromkeys(projection_ids))
+        projections = (await db.execute(
+            select(Projection).where(
+                Projection.user_id == user_id,
+                Projection.id.in_(projection_ids)
+            )
+        )).scalars().all()
+        by_id = {p.id: p for p in projections}
+        if not by_id:
+            return []
+
+        bucket = BUCKETS[granularity]
+        ids = list(by_id)
+        items = self.resolved_items(user_id, ids)
+        projected = select(
+            items.c.projection_id.label("projection_id"),
+            literal("projection").label("side"),
+            items.c.category_id.label("category_id"),
+            bucket(items.c.date).label("period"),
+            items.c.amount.label("amount")
+        )
+        real = select(
+            Projection.id,
+            literal("real"),
+            Transaction.category_id,
+            bucket(Transaction.date),
+            Transaction.amount
+        ).select_from(Transaction).join(
+            Projection,
+            and_(
+                Projection.user_id == Transaction.user_id,
+                Transaction.date >= Projection.start_date,
+                Transaction.date <= Projection.end_date
+            )
+        ).where(
+            Transaction.user_id == user_id,
+            Transaction.is_projection == False,
+            Projection.id.in_(ids)
+        )
+        rows = union_all(projected, real).subquery()
+
+        query = select(
+            rows.c.projection_id,
+            rows.c.side,
+            rows.c.category_id,
+            Category.name,
+            rows.c.period,
+            func.count(),
+            func.coalesce(func.sum(rows.c.amount).filter(rows.c.amount > 0), 0),
+            func.coalesce(func.sum(-rows.c.amount).filter(rows.c.amount < 0), 0)
+        ).select_from(rows).outerjoin(
+            Category, Category.id == rows.c.category_id
+        ).group_by(
+            rows.c.projection_id, rows.c.side, rows.c.category_id, Category.name, rows.c.period
+        )
+
+        # (cenário) -> {"categories": {categoria: {lado: totais}}, "periods": {...}, "totals": {...}}
+        acc = {pid: {"categories": {}, "periods": {}, "totals": {side: _empty_totals() for side in SIDES}} for pid in ids}
+        names: Dict[Optional[UUID], str] = {}
+
+        def add(pid, side, category_id, period, count, income, expenses):
+            for target in (
+                acc[pid]["totals"][side],
+                acc[pid]["categories"].setdefault(category_id, {s: _empty_totals() for s in SIDES})[side],
+                acc[pid]["periods"].setdefault(period, {s: _empty_totals() for s in SIDES})[side],
+            ):
+                target["count"] += count
+                target["income"] += income
+                target["expenses"] += expenses
+
+        for pid, side, category_id, name, period, count, income, expenses in await db.execute(query):
+            names[category_id] = name
+            add(pid, side, category_id, period, int(count), float(income), float(expenses))
+
+        # Regras recorrentes do lado projetado, agregadas por (categoria, período)
+        grouped = await self.rules_by_projection(db, user_id, ids)
+        missing = {r.category_id for rules, _, _ in grouped.values() for r in rules} - set(names)
+        if missing - {None}:
+            names.update((await db.execute(
+                select(Category.id, Category.name).where(Category.id.in_(missing - {None}))
+            )).all())
+
+        for pid, (pid_rules, start, end) in grouped.items():
+            occ = expand(pid_rules, start, end)
+            if not len(occ):
+                continue
+            categories = np.array([str(r.category_id) for r in pid_rules])[occ.rule_index]
+            periods = _bucket_dates(occ.dates, granularity)
+            keys, inverse = np.unique(np.stack([categories, periods]), axis=1, return_inverse=True)
+            inverse = inverse.ravel()
+            income = np.bincount(inverse, np.clip(occ.amounts, 0, None), keys.shape[1])
+            expenses = np.bincount(inverse, np.clip(-occ.amounts, 0, None), keys.shape[1])
+            counts = np.bincount(inverse, minlength=keys.shape[1])
+            category_ids = {str(r.category_id): r.category_id for r in pid_rules}
+            for j in range(keys.shape[1]):
+                add(pid, "projection", category_ids[keys[0, j]], keys[1, j],
+                    int(counts[j]), float(income[j]), float(expenses[j]))
+
+        return [self._comparison(by_id[pid], acc[pid], names, granularity) for pid in projection_ids if pid in by_id]
+
+    @staticmethod
+    def _comparison(projection: Projection, acc: Dict, names: Dict, granularity: str) -> Dict:
+        def side(totals):
+            return {
+                "total_income": round(totals["income"], 2),
+                "total_expenses": round(totals["expenses"], 2),
+                "balance": round(totals["income"] - totals["expenses"], 2),
+                "transactions_count": totals["count"],
+            }
+
+        def delta(pair):
+            projected, real = side(pair["projection"]), side(pair["real"])
+            return {
+                "income": round(projected["total_income"] - real["total_income"], 2),
+                "expenses": round(projected["total_expenses"] - real["total_expenses"], 2),
+                "balance": round(projected["balance"] - real["balance"], 2),
+            }
+
+        totals = acc["totals"]
+        categories = sorted(
+            acc["categories"].items(),
+            key=lambda item: -abs(delta(item[1])["balance"])
+        )
+        return {
+            "projection_id": projection.id,
+            "name": projection.name,
+            "start_date": projection.start_date,
+            "end_date": projection.end_date,
+            "granularity": granularity,
+            "projection": {"name": projection.name, **side(totals["projection"])},
+            "real": side(totals["real"]),
+            "difference": delta(totals),
+            "by_category": [
+                {
+                    "category_id": category_id,
+                    "category": names.get(category_id) or "Sem categoria",
+                    "projection": side(pair["projection"]),
+                    "real": side(pair["real"]),
+                    "difference": delta(pair),
+                }
+                for category_id, pair in categories
+            ],
+            "by_period": [
+                {
+                    "period": period,
+                    "projection": side(pair["projection"]),
+                    "real": side(pair["real"]),
+                    "difference": delta(pair),
+                }
+                for period, pair in sorted(acc["periods"].items())
+            ],
+        }
+
+    @staticmethod
+    def _with_stats(projection: Projection, count, income, expenses, rules: Optional[Dict] = None) -> ProjectionWithStats:
+        rules = rules or {"count": 0, "income": 0.0, "expenses": 0.0, "rules": 0}
+        income = float(income) + rules["income"]
+        expenses = float(expenses) + rules["expenses"]
+        return ProjectionWithStats(
+            **ProjectionResponse.model_validate(projection).model_dump(),
+            total_transactions=int(count) + rules["count"],
+            total_income=round(income, 2),
+            total_expenses=round(expenses, 2),
+            balance=round(income - expenses, 2),
+            total_rules=rules["rules"]
+        )
+
+
+# Instância global
+projection_service = ProjectionService()
@@ -0,0 +1,112 @@
+from dataclasses import dataclass
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from app.core.config import settings
+
+FREQUENCIES = ("monthly", "weekly", "yearly")
+
+
+@dataclass
+class Occurrences:
+    """Ocorrências expandidas de várias regras, em arrays paralelos"""
+    dates: np.ndarray        # datetime64[D]
+    amounts: np.ndarray      # float64, com sinal
+    rule_index: np.ndarray   # posição da regra na lista de entrada
+
+    def __len__(self) -> int:
+        return len(self.dates)
+
+    def summary(self) -> Dict[str, float]:
+        """Quantidade, receitas e despesas (mesmo formato das estatísticas do cenário)"""
+        return {
+            "count": int(len(self.amounts)),
+            "income": float(self.amounts[self.amounts > 0].sum()),
+            "expenses": float(-self.amounts[self.amounts < 0].sum()),
+        }
+
+
+def _months(values: np.ndarray) -> np.ndarray:
+    """Índice absoluto do mês (ano * 12 + mês - 1)"""
+    return values.astype("datetime64[M]").astype(np.int64) + 1970 * 12
+
+
+def occurrence_dates(frequency: str, interval: int, start: date, until: date) -> np.ndarray:
+    """
+    Datas de start até until (inclusive), sem laço em Python.
+
+    Mensal e anual mantêm o dia de start, limitado ao último dia do mês
+    (31/01 → 28/02 → 31/03).
+    """
+    if until < start:
+        return np.empty(0, dtype="datetime64[D]")
+
+    anchor = np.datetime64(start, "D")
+    if frequency == "weekly":
+        step = 7 * interval
+        return anchor + np.arange(0, (until - start).days + 1, step)
+
+    step = interval if frequency == "monthly" else 12 * interval
+    span = (until.year - start.year) * 12 + until.month - start.month
+    months = np.datetime64(start, "M") + np.arange(0, span + 1, step)
+    first_day = months.astype("datetime64[D]")
+    month_length = ((months + 1).astype("datetime64[D]") - first_day).astype(np.int64)
+    dates = first_day + np.minimum(start.day, month_length) - 1
+    return dates[dates <= np.datetime64(until, "D")]
+
+
+def anniversaries(dates: np.ndarray, start: date) -> np.ndarray:
+    """Aniversários completos de start em cada data (base do reajuste anual)"""
+    month_diff = _months(dates) - (start.year * 12 + start.month - 1)
+    day = (dates - dates.astype("datetime64[M]").astype("datetime64[D]")).astype(np.int64) + 1
+    return (month_diff - (day < start.day)) // 12
+
+
+def rule_window(rule, window_start: Optional[date], window_end: Optional[date], max_years: int = None):
+    """
+    Intervalo efetivo da regra dentro da janela do cenário. Sem fim na
+    regra nem no cenário, vale por `max_years` a partir do início da regra.
+    """
+    max_years = max_years or settings.PROJECTION_RULE_MAX_YEARS
+    first = max(rule.start_date, window_start) if window_start else rule.start_date
+    ends = [d for d in (rule.end_date, window_end) if d is not None]
+    last = min(ends) if ends else rule.start_date + timedelta(days=round(365.25 * max_years) - 1)
+    return first, last
+
+
+def expand(
+    rules: Sequence,
+    window_start: Optional[date] = None,
+    window_end: Optional[date] = None,
+    max_years: int = None
+) -> Occurrences:
+    """
+    Expande as regras (frequency, interval, start_date, end_date, amount,
+    growth_rate) em ocorrências dentro da janela. O reajuste é composto a
+    cada aniversário do início da regra e cada valor é arredondado em
+    centavos, como uma transação gravada seria.
+    """
+    dates: List[np.ndarray] = []
+    amounts: List[np.ndarray] = []
+    index: List[np.ndarray] = []
+
+    for i, rule in enumerate(rules):
+        first, last = rule_window(rule, window_start, window_end, max_years)
+        rule_dates = occurrence_dates(rule.frequency, rule.interval or 1, rule.start_date, last)
+        rule_dates = rule_dates[rule_dates >= np.datetime64(first, "D")]
+        if not len(rule_dates):
+            continue
+
+        growth = 1 + float(rule.growth_rate or 0)
+        values = float(rule.amount) * growth ** anniversaries(rule_dates, rule.start_date)
+        dates.append(rule_dates)
+        amounts.append(np.round(values, 2))
+        index.append(np.full(len(rule_dates), i, dtype=np.int64))
+
+    if not dates:
+        return Occurrences(
+            np.empty(0, dtype="datetime64[D]"), np.empty(0), np.empty(0, dtype=np.int64)
+        )
+    return Occurrences(np.concatenate(dates), np.concatenate(amounts), np.concatenate(index))
@@ -0,0 +1,397 @@
+"""
+Servidor HTTP que imita o Ollama para testes e benchmarks sem modelo.
+
+Modos:
+- synthetic: respostas geradas localmente (categorias por palavras-chave,
+  texto fixo no chat, embeddings determinísticos por hash de palavras)
+- record: repassa cada requisição para um Ollama real e grava a resposta
+  num cassete (JSONL)
+- replay: responde a partir do cassete; requisição não gravada vira erro
+  ou resposta sintética (`replay_miss`)
+
+O tempo de resposta segue um modelo simples e configurável:
+latência fixa + tokens de prompt / prompt_tokens_per_second até o primeiro
+token, depois um token a cada 1 / tokens_per_second. No máximo
+`num_parallel` requisições são processadas ao mesmo tempo, como no servidor real.
+
+Uso:
+    python -m benchmarks.fake_ollama --port 11435 --latency-ms 50 --tokens-per-second 40
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+import unicodedata
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+import httpx
+import numpy as np
+import uvicorn
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from app.core.config import settings
+
+FIXTURES = Path(__file__).parent / "fixtures"
+DEFAULT_RULES = FIXTURES / "fake_rules.json"
+
+# Campos que não mudam a resposta e ficam fora da chave do cassete
+_VOLATILE_FIELDS = ("stream", "keep_alive")
+
+
+def _tokens(text: str) -> int:
+    """Estimativa de tokens (~4 caracteres por token)"""
+    return len(text) // 4 + 1
+
+
+def _words(text: str) -> List[str]:
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return re.findall(r"\w+", text)
+
+
+def _load_rules(path: Path) -> Dict[str, str]:
+    if not path or not Path(path).exists():
+        return {}
+    return {k.lower(): v for k, v in json.loads(Path(path).read_text(encoding="utf-8")).items()}
+
+
+@dataclass
+class FakeOllamaConfig:
+    models: List[str] = field(default_factory=lambda: [settings.OLLAMA_MODEL, settings.OLLAMA_EMBED_MODEL])
+    mode: str = "synthetic"                 # synthetic | record | replay
+    cassette: Optional[Path] = None
+    upstream: str = "http://localhost:11434"
+    replay_miss: str = "error"              # error | synthetic
+    latency_ms: float = 0.0                 # Antes do primeiro token
+    prompt_tokens_per_second: float = 0.0   # 0 = avaliação de prompt instantânea
+    tokens_per_second: float = 0.0          # 0 = geração instantânea
+    num_parallel: int = 4
+    error_rate: float = 0.0                 # Fração de respostas 500
+    chat_reply_tokens: int = 40
+    embedding_dim: int = 64
+    rules_path: Optional[Path] = DEFAULT_RULES
+    seed: int = 0
+
+
+class Cassette:
+    """Respostas gravadas (JSONL), indexadas pelo hash da requisição"""
+
+    def __init__(self, path: Optional[Path]):
+        self.path = Path(path) if path else None
+        self._entries: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+        if self.path and self.path.exists():
+            for line in self.path.read_text(encoding="utf-8").splitlines():
+                if line.strip():
+                    entry = json.loads(line)
+                    self._entries[entry["key"]] = entry["response"]
+
+    @staticmethod
+    def key(path: str, body: dict) -> str:
+        stable = {k: v for k, v in body.items() if k not in _VOLATILE_FIELDS}
+        raw = json.dumps([path, stable], sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, path: str, body: dict) -> Optional[dict]:
+        return self._entries.get(self.key(path, body))
+
+    def put(self, path: str, body: dict, response: dict) -> None:
+        key = self.key(path, body)
+        with self._lock:
+            self._entries[key] = response
+            if self.path:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                with self.path.open("a", encoding="utf-8") as f:
+                    f.write(json.dumps({"key": key, "path": path, "response": response},
+                                       ensure_ascii=False) + "\n")
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class FakeOllama:
+    """Aplicação FastAPI com a API do Ollama usada pelo backend"""
+
+    def __init__(self, config: FakeOllamaConfig = None):
+        self.config = config or FakeOllamaConfig()
+        self.rules = _load_rules(self.config.rules_path)
+        self.cassette = Cassette(self.config.cassette)
+        self.requests: Dict[str, int] = {}
+        self._random = random.Random(self.config.seed)
+        self._seen_prefixes = set()
+        self._slots: Optional[asyncio.Semaphore] = None
+        self.app = self._build_app()
+
+    # ------------------------------------------------------------------
+    # Respostas sintéticas
+    # ------------------------------------------------------------------
+
+    def _categorize(self, system: str, user: str) -> str:
+        categories = re.findall(r"^- (.+)$", system, re.M)
+        description = user.split("Descrição:", 1)[-1].split("\n", 1)[0]
+        words = set(_words(description))
+        for keyword, category in self.rules.items():
+            if keyword in words and (not categories or category in categories):
+                return category
+        return categories[-1] if categories else "Outros"
+
+    def _chat_reply(self, messages: List[dict]) -> str:
+        system = next((m["content"] for m in messages if m.get("role") == "system"), "")
+        user = next((m["content"] for m in reversed(messages) if m.get("role") == "user"), "")
+        if "Categorias disponíveis:" in system:
+            return self._categorize(system, user)
+        words = ["Seus", "gastos", "estão", "dentro", "do", "esperado", "para", "o", "período."]
+        return " ".join(words[i % len(words)] for i in range(self.config.chat_reply_tokens))
+
+    def _prompt_eval_count(self, messages: List[dict]) -> int:
+        """Tokens avaliados; prefixo de sistema já visto sai da conta (KV cache)"""
+        total = 0
+        for message in messages:
+            content = message.get("content", "")
+            if message.get("role") == "system":
+                if content in self._seen_prefixes:
+                    continue
+                self._seen_prefixes.add(content)
+            total += _tokens(content)
+        return total
+
+    def embedding(self, text: str) -> List[float]:
+        """Bag-of-words por hash: textos com palavras em comum ficam próximos"""
+        vector = np.zeros(self.config.embedding_dim, dtype=np.float32)
+        for word in _words(text):
+            digest = hashlib.md5(word.encode("utf-8")).digest()
+            vector[int.from_bytes(digest[:4], "little") % self.config.embedding_dim] += 1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def _synthetic(self, path: str, body: dict) -> dict:
+        model = body.get("model", "")
+        if path == "/api/chat":
+            messages = body.get("messages") or []
+            content = self._chat_reply(messages)
+            return {
+                "model": model,
+                "message": {"role": "assistant", "content": content},
+                "done": True,
+                "done_reason": "stop",
+                "prompt_eval_count": self._prompt_eval_count(messages),
+                "eval_count": len(content.split()) or 1,
+            }
+        if path == "/api/generate":
+            prompt = body.get("prompt") or ""
+            return {"model": model, "response": "", "done": True,
+                    "prompt_eval_count": _tokens(prompt) if prompt else 0, "eval_count": 0}
+        if path == "/api/embed":
+            inputs = body.get("input") or []
+            inputs = [inputs] if isinstance(inputs, str) else inputs
+            return {"model": model, "embeddings": [self.embedding(t) for t in inputs],
+                    "prompt_eval_count": sum(_tokens(t) for t in inputs)}
+        if path == "/api/embeddings":
+            return {"embedding": self.embedding(body.get("prompt") or "")}
+        raise HTTPException(status_code=404, detail=f"rota não suportada: {path}")
+
+    # ------------------------------------------------------------------
+    # Gravação / reprodução
+    # ------------------------------------------------------------------
+
+    async def _resolve(self, path: str, body: dict) -> dict:
+        mode = self.config.mode
+        if mode == "record":
+            async with httpx.AsyncClient(base_url=self.config.upstream, timeout=None) as client:
+                upstream = await client.post(path, json={**body, "stream": False})
+            if upstream.status_code != 200:
+                raise HTTPException(status_code=upstream.status_code, detail=upstream.text)
+            response = upstream.json()
+            self.cassette.put(path, body, response)
+            return response
+
+        if mode == "replay":
+            response = self.cassette.get(path, body)
+            if response is not None:
+                return response
+            if self.config.replay_miss != "synthetic":
+                raise HTTPException(status_code=404, detail="requisição não gravada no cassete")
+
+        return self._synthetic(path, body)
+
+    # ------------------------------------------------------------------
+    # Modelo de tempo
+    # ------------------------------------------------------------------
+
+    def _timings(self, response: dict) -> Dict[str, float]:
+        """(segundos até o primeiro token, segundos por token gerado)"""
+        config = self.config
+        prompt_tokens = response.get("prompt_eval_count") or 0
+        ttft = config.latency_ms / 1000
+        if config.prompt_tokens_per_second:
+            ttft += prompt_tokens / config.prompt_tokens_per_second
+        per_token = 1 / config.tokens_per_second if config.tokens_per_second else 0.0
+        return {"ttft": ttft, "per_token": per_token}
+
+    @staticmethod
+    def _with_durations(response: dict, prompt_seconds: float, eval_seconds: float, total: float) -> dict:
+        return {
+            **response,
+            "load_duration": 0,
+            "prompt_eval_duration": int(prompt_seconds * 1e9),
+            "eval_duration": int(eval_seconds * 1e9),
+            "total_duration": int(total * 1e9),
+        }
+
+    def _pieces(self, content: str) -> List[str]:
+        return re.findall(r"\S+\s*|\s+", content) or [""]
+
+    # ------------------------------------------------------------------
+    # App
+    # ------------------------------------------------------------------
+
+    def _build_app(self) -> FastAPI:
+        app = FastAPI(title="Fake Ollama")
+
+        @app.get("/api/tags")
+        async def tags():
+            self._count("/api/tags")
+            return {"models": [
+                {"name": name, "model": name, "size": 0, "digest": hashlib.sha256(name.encode()).hexdigest()}
+                for name in self.config.models
+            ]}
+
+        @app.get("/api/version")
+        async def version():
+            return {"version": "0.0.0-fake"}
+
+        @app.post("/api/chat")
+        async def chat(request: Request):
+            return await self._handle("/api/chat", await request.json())
+
+        @app.post("/api/generate")
+        async def generate(request: Request):
+            return await self._handle("/api/generate", await request.json())
+
+        @app.post("/api/embed")
+        async def embed(request: Request):
+            return await self._handle("/api/embed", await request.json())
+
+        @app.post("/api/embeddings")
+        async def embeddings(request: Request):
+            return await self._handle("/api/embeddings", await request.json())
+
+        return app
+
+    def _count(self, path: str) -> None:
+        self.requests[path] = self.requests.get(path, 0) + 1
+
+    async def _handle(self, path: str, body: dict):
+        self._count(path)
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.config.num_parallel)
+
+        if self.config.error_rate and self._random.random() < self.config.error_rate:
+            return JSONResponse({"error": "falha simulada"}, status_code=500)
+
+        model = body.get("model")
+        if model and model not in self.config.models and model.split(":")[0] not in self.config.models:
+            return JSONResponse({"error": f"model '{model}' not found"}, status_code=404)
+
+        response = await self._resolve(path, body)
+        streaming = body.get("stream", True) and path in ("/api/chat", "/api/generate")
+        if streaming:
+            return StreamingResponse(self._stream(path, response), media_type="application/x-ndjson")
+
+        async with self._slots:
+            started = time.perf_counter()
+            timing = self._timings(response)
+            eval_seconds = timing["per_token"] * (response.get("eval_count") or 0)
+            await asyncio.sleep(timing["ttft"] + eval_seconds)
+            return self._with_durations(response, timing["ttft"], eval_seconds, time.perf_counter() - started)
+
+    async def _stream(self, path: str, response: dict):
+        async with self._slots:
+            started = time.perf_counter()
+            timing = self._timings(response)
+            await asyncio.sleep(timing["ttft"])
+
+            key = "message" if path == "/api/chat" else "response"
+            content = response["message"]["content"] if key == "message" else response.get("response", "")
+            final = {k: v for k, v in response.items() if k not in ("message", "response")}
+
+            for piece in self._pieces(content):
+                if timing["per_token"]:
+                    await asyncio.sleep(timing["per_token"])
+                chunk = {"model": response.get("model"), "done": False}
+                chunk[key] = {"role": "assistant", "content": piece} if key == "message" else piece
+                yield json.dumps(chunk, ensure_ascii=False) + "\n"
+
+            eval_seconds = time.perf_counter() - started - timing["ttft"]
+            last = self._with_durations(final, timing["ttft"], eval_seconds, time.perf_counter() - started)
+            last[key] = {"role": "assistant", "content": ""} if key == "message" else ""
+            last["done"] = True
+            yield json.dumps(last, ensure_ascii=False) + "\n"
+
+
+@contextmanager
+def serve(fake: FakeOllama, host: str = "127.0.0.1", port: int = 0) -> Iterator[str]:
+    """Sobe o servidor numa thread e devolve a URL base"""
+    server = uvicorn.Server(uvicorn.Config(fake.app, host=host, port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        if not thread.is_alive():
+            raise RuntimeError("Servidor fake do Ollama não subiu")
+        time.sleep(0.01)
+
+    bound_port = server.servers[0].sockets[0].getsockname()[1]
+    try:
+        yield f"http://{host}:{bound_port}"
+    finally:
+        server.should_exit = True
+        thread.join(timeout=5)
+
+
+def config_from_args(args: argparse.Namespace) -> FakeOllamaConfig:
+    return FakeOllamaConfig(
+        mode=args.mode,
+        cassette=args.cassette,
+        upstream=args.upstream,
+        replay_miss=args.replay_miss,
+        latency_ms=args.latency_ms,
+        prompt_tokens_per_second=args.prompt_tokens_per_second,
+        tokens_per_second=args.tokens_per_second,
+        num_parallel=args.num_parallel,
+        error_rate=args.error_rate,
+    )
+
+
+def add_server_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--mode", choices=["synthetic", "record", "replay"], default="synthetic")
+    parser.add_argument("--cassette", type=Path, help="Arquivo JSONL de gravação/reprodução")
+    parser.add_argument("--upstream", default="http://localhost:11434", help="Ollama real (modo record)")
+    parser.add_argument("--replay-miss", choices=["error", "synthetic"], default="error")
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--prompt-tokens-per-second", type=float, default=0.0)
+    parser.add_argument("--tokens-per-second", type=float, default=0.0)
+    parser.add_argument("--num-parallel", type=int, default=4)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Servidor fake do Ollama")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    add_server_arguments(parser)
+    args = parser.parse_args()
+
+    fake = FakeOllama(config_from_args(args))
+    uvicorn.run(fake.app, host=args.host, port=args.port, log_level="info")
+
+
+if __name__ == "__main__":
+    main()
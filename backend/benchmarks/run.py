@@ -0,0 +1,297 @@
+"""
+Benchmark dos caminhos da API que usam o LLM, contra o Ollama fake.
+
+Sobe o servidor fake (sintético, gravando ou reproduzindo um cassete),
+aponta o backend para ele e dispara, com concorrência configurável:
+- POST /api/upload/statement com o extrato rotulado (categorização em lote)
+- POST /api/ai/chat
+
+Relata vazão, latência p50/p95, acurácia da categorização contra os
+rótulos do fixture e as métricas llm.* coletadas pelo backend.
+
+Exemplos:
+    python -m benchmarks.run --uploads 10 --chats 20 --concurrency 4 --latency-ms 30 --tokens-per-second 50
+    python -m benchmarks.run --mode record --cassette benchmarks/cassettes/llama3.2.jsonl --upstream http://localhost:11434
+    python -m benchmarks.run --mode replay --cassette benchmarks/cassettes/llama3.2.jsonl --min-accuracy 0.8
+"""
+import argparse
+import asyncio
+import csv
+import io
+import json
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Tuple
+
+import httpx
+import numpy as np
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
+
+from app.db.base import Base  # Antes de app.main: registra todos os modelos
+from app.main import app
+from app.db.session import get_db
+from app.db.routing import ReadRouter
+from app.core.deps import get_read_router
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.core.security import get_password_hash
+from app.models.user import User
+from app.services.llm_service import llm_service
+from benchmarks.fake_ollama import (
+    FIXTURES, FakeOllama, FakeOllamaConfig, add_server_arguments, config_from_args, serve
+)
+
+DEFAULT_FIXTURE = FIXTURES / "categorization.csv"
+LABEL_COLUMN = "categoria"
+
+CHAT_QUESTIONS = [
+    "Quanto gastei com alimentação este mês?",
+    "Onde posso economizar?",
+    "Meus gastos com transporte estão altos?",
+    "Qual foi minha maior despesa?",
+    "Como está meu saldo comparado ao mês passado?",
+]
+
+BENCH_EMAIL = "benchmark@example.com"
+BENCH_PASSWORD = "benchmark123"
+
+
+def load_labeled_statement(path: Path = DEFAULT_FIXTURE) -> Tuple[bytes, List[str]]:
+    """Extrato CSV sem a coluna de rótulo + rótulos na ordem das linhas"""
+    with open(path, encoding="utf-8", newline="") as f:
+        rows = list(csv.DictReader(f))
+
+    columns = [c for c in rows[0] if c != LABEL_COLUMN]
+    out = io.StringIO()
+    writer = csv.DictWriter(out, fieldnames=columns, extrasaction="ignore")
+    writer.writeheader()
+    writer.writerows(rows)
+    return out.getvalue().encode("utf-8"), [row[LABEL_COLUMN] for row in rows]
+
+
+def _latency_summary(latencies: List[float]) -> Dict[str, float]:
+    if not latencies:
+        return {"p50": None, "p95": None, "max": None}
+    p50, p95 = np.percentile(np.asarray(latencies) * 1000, [50, 95]).tolist()
+    return {"p50": round(p50, 2), "p95": round(p95, 2), "max": round(max(latencies) * 1000, 2)}
+
+
+async def _drive(
+    total: int,
+    concurrency: int,
+    request: Callable[[int], Awaitable[bool]]
+) -> Dict[str, float]:
+    """Executa `total` requisições com no máximo `concurrency` simultâneas"""
+    latencies: List[float] = []
+    errors = 0
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i: int) -> None:
+        nonlocal errors
+        async with semaphore:
+            started = time.perf_counter()
+            ok = await request(i)
+            latencies.append(time.perf_counter() - started)
+            errors += not ok
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(total)))
+    wall = time.perf_counter() - started
+
+    return {
+        "requests": total,
+        "errors": errors,
+        "wall_seconds": round(wall, 3),
+        "throughput_rps": round(total / wall, 2) if wall else None,
+        "latency_ms": _latency_summary(latencies),
+    }
+
+
+def _create_user(session_factory) -> None:
+    db = session_factory()
+    try:
+        db.add(User(email=BENCH_EMAIL, name="Benchmark", hashed_password=get_password_hash(BENCH_PASSWORD)))
+        db.commit()
+    finally:
+        db.close()
+
+
+async def _scenarios(
+    client: httpx.AsyncClient,
+    uploads: int,
+    chats: int,
+    concurrency: int,
+    fixture: Path
+) -> Dict[str, dict]:
+    response = await client.post("/api/auth/login", json={"email": BENCH_EMAIL, "password": BENCH_PASSWORD})
+    response.raise_for_status()
+    headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+    statement, labels = load_labeled_statement(fixture)
+    correct = unsuggested = 0
+
+    async def upload(_: int) -> bool:
+        nonlocal correct, unsuggested
+        response = await client.post(
+            "/api/upload/statement",
+            files={"file": ("extrato.csv", statement, "text/csv")},
+            headers=headers
+        )
+        if response.status_code != 200:
+            return False
+        for item, label in zip(response.json()["transactions"], labels):
+            correct += item["suggested_category"] == label
+            unsuggested += item["suggested_category"] is None
+        return True
+
+    async def chat(i: int) -> bool:
+        response = await client.post(
+            "/api/ai/chat",
+            json={"message": CHAT_QUESTIONS[i % len(CHAT_QUESTIONS)]},
+            headers=headers
+        )
+        return response.status_code == 200
+
+    results = {}
+    if uploads:
+        result = await _drive(uploads, concurrency, upload)
+        rows = len(labels) * (uploads - result["errors"])
+        result["rows"] = rows
+        result["rows_per_second"] = round(rows / result["wall_seconds"], 2) if result["wall_seconds"] else None
+        result["accuracy"] = round(correct / rows, 4) if rows else None
+        result["unsuggested_rows"] = unsuggested
+        results["upload"] = result
+    if chats:
+        results["chat"] = await _drive(chats, concurrency, chat)
+    return results
+
+
+def run_benchmark(
+    config: FakeOllamaConfig = None,
+    uploads: int = 5,
+    chats: int = 10,
+    concurrency: int = 4,
+    fixture: Path = DEFAULT_FIXTURE
+) -> dict:
+    """Executa o benchmark completo e devolve o relatório"""
+    fake = FakeOllama(config)
+    original_url = settings.OLLAMA_BASE_URL
+
+    with serve(fake) as base_url, tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{tmp}/benchmark.db", connect_args={"check_same_thread": False})
+        Base.metadata.create_all(bind=engine)
+        session_factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+        _create_user(session_factory)
+        async_engine = create_async_engine(f"sqlite+aiosqlite:///{tmp}/benchmark.db", poolclass=NullPool)
+        async_session_factory = async_sessionmaker(async_engine, expire_on_commit=False, autoflush=False)
+
+        async def override_get_db():
+            async with async_session_factory() as db:
+                yield db
+
+        settings.OLLAMA_BASE_URL = base_url
+        llm_service.base_url = base_url
+        llm_service._client = None
+        app.dependency_overrides[get_db] = override_get_db
+        app.dependency_overrides[get_read_router] = lambda: ReadRouter(async_engine)
+        metrics.reset()
+        llm_service.health.refresh()
+
+        async def main():
+            try:
+                async with app.router.lifespan_context(app):
+                    transport = httpx.ASGITransport(app=app)
+                    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+                        return await _scenarios(client, uploads, chats, concurrency, fixture)
+            finally:
+                await async_engine.dispose()
+
+        try:
+            scenarios = asyncio.run(main())
+        finally:
+            settings.OLLAMA_BASE_URL = original_url
+            llm_service.base_url = original_url
+            llm_service._client = None
+            app.dependency_overrides.pop(get_db, None)
+            app.dependency_overrides.pop(get_read_router, None)
+            engine.dispose()
+
+    snapshot = metrics.snapshot()
+    return {
+        "config": {
+            "mode": fake.config.mode,
+            "latency_ms": fake.config.latency_ms,
+            "prompt_tokens_per_second": fake.config.prompt_tokens_per_second,
+            "tokens_per_second": fake.config.tokens_per_second,
+            "num_parallel": fake.config.num_parallel,
+            "error_rate": fake.config.error_rate,
+            "uploads": uploads,
+            "chats": chats,
+            "concurrency": concurrency,
+        },
+        "scenarios": scenarios,
+        "ollama_requests": fake.requests,
+        "llm": {
+            "counters": {k: v for k, v in snapshot["counters"].items() if k.startswith("llm.")},
+            "distributions": {k: v for k, v in snapshot["distributions"].items() if k.startswith("llm.")},
+        },
+    }
+
+
+def _print_report(report: dict) -> None:
+    print(f"{'cenário':<10}{'req':>6}{'erros':>7}{'req/s':>9}{'p50 ms':>10}{'p95 ms':>10}{'acurácia':>10}")
+    for name, result in report["scenarios"].items():
+        latency = result["latency_ms"]
+        accuracy = result.get("accuracy")
+        print(
+            f"{name:<10}{result['requests']:>6}{result['errors']:>7}{result['throughput_rps'] or 0:>9.2f}"
+            f"{latency['p50'] or 0:>10.1f}{latency['p95'] or 0:>10.1f}"
+            f"{'-' if accuracy is None else f'{accuracy:.1%}':>10}"
+        )
+
+
+def check_thresholds(report: dict, min_accuracy: float = None, max_p95_ms: float = None) -> List[str]:
+    """Violações dos limites (para falhar o CI)"""
+    failures = []
+    upload = report["scenarios"].get("upload")
+    if min_accuracy is not None and upload and (upload["accuracy"] or 0) < min_accuracy:
+        failures.append(f"acurácia {upload['accuracy']} < {min_accuracy}")
+    for name, result in report["scenarios"].items():
+        if result["errors"]:
+            failures.append(f"{name}: {result['errors']} requisições com erro")
+        p95 = result["latency_ms"]["p95"]
+        if max_p95_ms is not None and p95 is not None and p95 > max_p95_ms:
+            failures.append(f"{name}: p95 {p95}ms > {max_p95_ms}ms")
+    return failures
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark dos endpoints com LLM")
+    parser.add_argument("--uploads", type=int, default=5)
+    parser.add_argument("--chats", type=int, default=10)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--fixture", type=Path, default=DEFAULT_FIXTURE)
+    parser.add_argument("--json", type=Path, help="Salvar relatório completo em JSON")
+    parser.add_argument("--min-accuracy", type=float)
+    parser.add_argument("--max-p95-ms", type=float)
+    add_server_arguments(parser)
+    args = parser.parse_args()
+
+    report = run_benchmark(config_from_args(args), args.uploads, args.chats, args.concurrency, args.fixture)
+    _print_report(report)
+    if args.json:
+        args.json.write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding="utf-8")
+
+    failures = check_thresholds(report, args.min_accuracy, args.max_p95_ms)
+    for failure in failures:
+        print(f"FALHOU: {failure}", file=sys.stderr)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
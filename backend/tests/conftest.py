@@ -1,48 +1,106 @@
+import asyncio
+import os
+import tempfile
+
 import pytest
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy.pool import StaticPool
+from sqlalchemy.pool import NullPool
 
+import app.main as app_main
+import app.services.llm_service as llm_module
 from app.main import app
 from app.db.base import Base
 from app.db.session import get_db
+from app.db.routing import ReadRouter
+from app.core.deps import get_read_router
+from app.core.metrics import metrics
 from app.models.user import User
 from app.core.security import get_password_hash
+from app.services.llm_health import LLMHealthMonitor
+from app.services.llm_scheduler import LLMScheduler
+from app.services.llm_warmup import ModelWarmer
 
-# Usar banco de dados em memória para testes
-SQLALCHEMY_DATABASE_URL = "sqlite:///:memory:"
+# Arquivo SQLite temporário: a aplicação usa o driver assíncrono (aiosqlite) e as
+# fixtures preparam/conferem os dados por uma sessão síncrona no mesmo banco
+DATABASE_PATH = os.path.join(tempfile.mkdtemp(prefix="dashboard-tests-"), "test.db")
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL,
+sync_engine = create_engine(
+    f"sqlite:///{DATABASE_PATH}",
     connect_args={"check_same_thread": False},
-    poolclass=StaticPool,
+    poolclass=NullPool,
 )
-TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=sync_engine)
+
+engine = create_async_engine(f"sqlite+aiosqlite:///{DATABASE_PATH}", poolclass=NullPool)
+TestingAsyncSessionLocal = async_sessionmaker(engine, expire_on_commit=False, autoflush=False)
+
+
+def run_async(function):
+    """Roda `function(sessão assíncrona)` num event loop próprio (testes de serviços)"""
+    async def scenario():
+        async with TestingAsyncSessionLocal() as session:
+            return await function(session)
+    return asyncio.run(scenario())
+
+
+def _ollama_offline():
+    raise ConnectionError("Ollama não roda nos testes")
+
+
+@pytest.fixture(autouse=True)
+def llm_singletons(monkeypatch):
+    """
+    Monitor de saúde, scheduler e warmer novos a cada teste no lugar das
+    instâncias globais: no llm_service global, nos LLMService criados pelo
+    teste e no lifespan da app. O monkeypatch devolve os originais no teardown.
+    """
+    health = LLMHealthMonitor(probe=_ollama_offline)
+    scheduler = LLMScheduler()
+    warmer = ModelWarmer()
+
+    monkeypatch.setattr(llm_module, "llm_health", health)
+    monkeypatch.setattr(llm_module, "llm_scheduler", scheduler)
+    monkeypatch.setattr(llm_module, "model_warmer", warmer)
+    monkeypatch.setattr(llm_module.llm_service, "health", health)
+    monkeypatch.setattr(llm_module.llm_service, "scheduler", scheduler)
+    monkeypatch.setattr(llm_module.llm_service, "warmer", warmer)
+    monkeypatch.setattr(app_main, "llm_health", health)
+    monkeypatch.setattr(app_main, "model_warmer", warmer)
+
+
+@pytest.fixture
+def metrics_registry():
+    """Registro global de métricas zerado no início e no fim do teste"""
+    metrics.reset()
+    yield metrics
+    metrics.reset()
 
 
 @pytest.fixture(scope="function")
 def db():
     """Criar banco de dados de teste"""
-    Base.metadata.create_all(bind=engine)
+    Base.metadata.create_all(bind=sync_engine)
     db = TestingSessionLocal()
     try:
         yield db
     finally:
         db.close()
-        Base.metadata.drop_all(bind=engine)
+        Base.metadata.drop_all(bind=sync_engine)
 
 
 @pytest.fixture(scope="function")
 def client(db):
     """Criar cliente de teste"""
-    def override_get_db():
-        try:
-            yield db
-        finally:
-            pass
+    async def override_get_db():
+        async with TestingAsyncSessionLocal() as session:
+            yield session
 
     app.dependency_overrides[get_db] = override_get_db
+    # Sem réplica: leituras roteadas no mesmo banco (tests/test_read_routing.py usa duas)
+    app.dependency_overrides[get_read_router] = lambda: ReadRouter(engine)
     with TestClient(app) as test_client:
         yield test_client
     app.dependency_overrides.clear()
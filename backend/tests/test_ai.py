@@ -0,0 +1,247 @@
+"""
+Testes para os endpoints de IA (sem Ollama: o serviço é substituído por fakes)
+"""
+import json
+import uuid
+import pytest
+from fastapi import status
+
+from app.models.ai_chat import AIChatHistory
+from app.services.llm_service import llm_service
+from tests.conftest import run_async
+
+
+def parse_sse(body: str):
+    """Converte o corpo SSE em lista de (evento, dados)"""
+    events = []
+    for block in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.split("\n"))
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+@pytest.fixture
+def llm_online(monkeypatch):
+    """LLM disponível e gerando tokens fixos"""
+    monkeypatch.setattr(llm_service, "check_availability", lambda: True)
+
+    async def fake_stream(*args, **kwargs):
+        for token in ["Você ", "gastou ", "R$ 100"]:
+            yield token
+
+    monkeypatch.setattr(llm_service, "chat_stream", fake_stream)
+    monkeypatch.setattr(llm_service, "analyze_stream", fake_stream)
+
+
+def test_chat_stream_sends_tokens_and_persists(client, auth_headers, llm_online, db):
+    """Testar streaming do chat e gravação do histórico ao final"""
+    response = client.post(
+        "/api/ai/chat/stream",
+        headers=auth_headers,
+        json={"message": "Quanto gastei?"}
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"].startswith("text/event-stream")
+
+    events = parse_sse(response.text)
+    assert [e for e, _ in events] == ["token", "token", "token", "done"]
+    assert events[-1][1]["message"] == "Você gastou R$ 100"
+
+    history = db.query(AIChatHistory).all()
+    assert len(history) == 1
+    assert history[0].response == "Você gastou R$ 100"
+
+
+def test_concurrent_turn_in_same_session_is_rejected(client, auth_headers, llm_online, monkeypatch, db, test_user):
+    """Testar turno simultâneo na mesma sessão: índice único, o segundo recebe erro"""
+    first = client.post("/api/ai/chat/stream", headers=auth_headers, json={"message": "Oi"})
+    session_id = uuid.UUID(parse_sse(first.text)[-1][1]["session_id"])
+
+    async def racing_stream(*args, **kwargs):
+        # Outra requisição grava o turno 1 enquanto esta ainda gera a resposta
+        db.add(AIChatHistory(user_id=test_user.id, message="retry", response="ok",
+                             session_id=session_id, turn_index=1))
+        db.commit()
+        yield "Resposta"
+
+    monkeypatch.setattr(llm_service, "chat_stream", racing_stream)
+    response = client.post(
+        "/api/ai/chat/stream", headers=auth_headers, json={"message": "E agora?", "session_id": str(session_id)}
+    )
+    events = parse_sse(response.text)
+    assert events[-1][0] == "error"
+    assert [row.message for row in db.query(AIChatHistory).filter_by(turn_index=1).all()] == ["retry"]
+
+
+def test_chat_stream_error_does_not_persist(client, auth_headers, monkeypatch, db):
+    """Testar que falha no meio do stream não grava histórico"""
+    monkeypatch.setattr(llm_service, "check_availability", lambda: True)
+
+    async def broken_stream(*args, **kwargs):
+        yield "Parcial"
+        raise ConnectionError("ollama caiu")
+
+    monkeypatch.setattr(llm_service, "chat_stream", broken_stream)
+
+    response = client.post(
+        "/api/ai/chat/stream",
+        headers=auth_headers,
+        json={"message": "Oi"}
+    )
+    events = parse_sse(response.text)
+    assert [e for e, _ in events] == ["token", "error"]
+    assert db.query(AIChatHistory).count() == 0
+
+
+def test_analyze_stream(client, auth_headers, llm_online):
+    """Testar streaming da análise"""
+    response = client.post(
+        "/api/ai/analyze/stream?question=Onde economizar?",
+        headers=auth_headers
+    )
+    events = parse_sse(response.text)
+    assert events[-1][0] == "done"
+    assert events[-1][1]["answer"] == "Você gastou R$ 100"
+
+
+def test_stream_unavailable_returns_503(client, auth_headers, monkeypatch):
+    """Testar 503 quando o LLM está indisponível"""
+    monkeypatch.setattr(llm_service, "check_availability", lambda: False)
+    response = client.post(
+        "/api/ai/chat/stream",
+        headers=auth_headers,
+        json={"message": "Oi"}
+    )
+    assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+
+
+@pytest.fixture
+def ledger(db, test_user):
+    """Extrato com categorias para o resumo financeiro"""
+    from datetime import date, timedelta
+    from decimal import Decimal
+    from app.models.category import Category
+    from app.models.transaction import Transaction
+
+    food = Category(user_id=test_user.id, name="Alimentação")
+    db.add(food)
+    db.flush()
+
+    today = date.today()
+    db.add_all([
+        Transaction(user_id=test_user.id, date=today, description="Salário",
+                    amount=Decimal("5000.00"), is_projection=False),
+        Transaction(user_id=test_user.id, date=today, description="Mercado",
+                    amount=Decimal("-300.00"), category_id=food.id, is_projection=False),
+        Transaction(user_id=test_user.id, date=today - timedelta(days=1), description="Mercado",
+                    amount=Decimal("-200.00"), category_id=food.id, is_projection=False),
+        Transaction(user_id=test_user.id, date=today, description="Projeção",
+                    amount=Decimal("-999.00"), is_projection=True),
+    ])
+    db.commit()
+    return test_user
+
+
+def test_context_builder_aggregates_in_sql(db, ledger):
+    """Testar resumo agregado (totais, categorias, estabelecimentos)"""
+    from app.services.context_service import FinancialContextBuilder
+
+    summary = run_async(lambda session: FinancialContextBuilder().build(session, ledger.id))
+    assert "Total de transações: 3" in summary
+    assert "Receitas totais: R$ 5000.00" in summary
+    assert "Despesas totais: R$ 500.00" in summary
+    assert "- Alimentação: R$ 500.00 (2 transações)" in summary
+    assert "- Mercado: R$ 500.00 (2x)" in summary
+    assert "999" not in summary
+
+
+def test_context_builder_cache_follows_ledger_version(db, ledger):
+    """Testar que o cache é invalidado quando o extrato muda"""
+    from datetime import date
+    from decimal import Decimal
+    from app.models.transaction import Transaction
+    from app.services.context_service import FinancialContextBuilder
+
+    builder = FinancialContextBuilder()
+    first = run_async(lambda session: builder.build(session, ledger.id))
+    assert run_async(lambda session: builder.build(session, ledger.id)) is first
+
+    db.add(Transaction(user_id=ledger.id, date=date.today(), description="Farmácia",
+                       amount=Decimal("-50.00"), is_projection=False))
+    db.commit()
+
+    second = run_async(lambda session: builder.build(session, ledger.id))
+    assert second is not first
+    assert "Total de transações: 4" in second
+
+    # O incremento da versão não conta como alteração do usuário
+    db.refresh(ledger)
+    assert ledger.ledger_version > 0
+    assert ledger.updated_at is None
+
+
+def test_chat_session_loaded_server_side(client, auth_headers, monkeypatch):
+    """Testar que o histórico da sessão é carregado pelo servidor"""
+    calls = []
+
+    async def fake_chat(**kwargs):
+        calls.append(kwargs)
+        return f"resposta {len(calls)}"
+
+    monkeypatch.setattr(llm_service, "check_availability", lambda: True)
+    monkeypatch.setattr(llm_service, "chat", fake_chat)
+
+    first = client.post("/api/ai/chat", headers=auth_headers, json={"message": "Olá"})
+    assert first.status_code == status.HTTP_200_OK
+    session_id = first.json()["session_id"]
+
+    second = client.post(
+        "/api/ai/chat",
+        headers=auth_headers,
+        json={"message": "E agora?", "session_id": str(session_id)}
+    )
+    assert second.json()["session_id"] == session_id
+    assert calls[1]["conversation_history"] == [
+        {"role": "user", "content": "Olá"},
+        {"role": "assistant", "content": "resposta 1"},
+    ]
+
+    turns = client.get(f"/api/ai/chat/sessions/{session_id}", headers=auth_headers).json()
+    assert [t["message"] for t in turns] == ["Olá", "E agora?"]
+
+
+def test_chat_unknown_session_returns_404(client, auth_headers, monkeypatch):
+    """Testar sessão inexistente"""
+    monkeypatch.setattr(llm_service, "check_availability", lambda: True)
+    response = client.post(
+        "/api/ai/chat",
+        headers=auth_headers,
+        json={"message": "Oi", "session_id": "00000000-0000-0000-0000-000000000000"}
+    )
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+def test_conversation_manager_compacts_old_turns():
+    """Testar orçamento de tokens e resumo dos turnos antigos"""
+    import uuid
+    from app.services.conversation_service import (
+        ConversationContext, ConversationContextManager, message_tokens
+    )
+
+    history = []
+    for i in range(10):
+        history.append({"role": "user", "content": f"pergunta {i} " + "x" * 200})
+        history.append({"role": "assistant", "content": f"resposta {i} " + "y" * 200})
+
+    manager = ConversationContextManager(token_budget=600, summary_budget=200)
+    context = manager.fit(
+        ConversationContext(session_id=uuid.uuid4(), turn_index=10, history=list(history)),
+        reserved_tokens=100
+    )
+
+    assert sum(message_tokens(m) for m in context.history) <= 600 - 100 - 200
+    assert context.history[0]["role"] == "user"
+    assert context.history[-1] == history[-1]
+    assert context.summary_until_turn == 10 - len(context.history) // 2
+    assert "resposta" in context.summary
+    assert len(context.summary) // 4 <= 200
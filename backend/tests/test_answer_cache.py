@@ -0,0 +1,96 @@
+"""
+Testes para o cache de respostas de análise
+"""
+import asyncio
+
+from app.services.answer_cache import AnswerCache, normalize_question
+from app.services.llm_service import LLMService
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_normalized_question_hits():
+    """Testar acerto exato ignorando acentos, caixa e pontuação"""
+    cache = AnswerCache(ttl=60, max_entries=10)
+    cache.put("u1", 3, "Quanto gastei com alimentação?", "R$ 500")
+
+    assert normalize_question("  QUANTO gastei com Alimentacao ") == "quanto gastei com alimentacao"
+    assert cache.get("u1", 3, "quanto gastei com alimentacao") == "R$ 500"
+    assert cache.get("u2", 3, "quanto gastei com alimentacao") is None
+
+
+def test_ledger_change_invalidates_user_entries():
+    """Testar invalidação quando a versão do extrato muda"""
+    cache = AnswerCache(ttl=60, max_entries=10)
+    cache.put("u1", 3, "pergunta", "resposta")
+
+    assert cache.get("u1", 4, "pergunta") is None
+    assert cache.get("u1", 3, "pergunta") is None
+
+
+def test_explicit_zero_ttl_is_kept():
+    """Testar que ttl=0 não é trocado pelo valor das Settings"""
+    clock = FakeClock()
+    cache = AnswerCache(ttl=0, max_entries=10, clock=clock)
+    assert cache.ttl == 0
+
+    cache.put("u1", 3, "pergunta", "resposta")
+    clock.now += 0.001
+    assert cache.get("u1", 3, "pergunta") is None
+
+
+def test_ttl_and_lru_eviction():
+    """Testar expiração por TTL e limite LRU por usuário"""
+    clock = FakeClock()
+    cache = AnswerCache(ttl=10, max_entries=2, clock=clock)
+    cache.put("u1", 1, "a", "A")
+    cache.put("u1", 1, "b", "B")
+    cache.get("u1", 1, "a")
+    cache.put("u1", 1, "c", "C")
+
+    assert cache.get("u1", 1, "b") is None
+    assert cache.get("u1", 1, "a") == "A"
+
+    clock.now = 11
+    assert cache.get("u1", 1, "a") is None
+
+
+def test_semantic_match_by_cosine_similarity():
+    """Testar acerto semântico pela matriz de embeddings"""
+    cache = AnswerCache(ttl=60, max_entries=10, similarity_threshold=0.9)
+    cache.put("u1", 1, "quanto gastei com comida", "R$ 500", embedding=[1.0, 0.0, 0.1])
+    cache.put("u1", 1, "qual meu saldo", "R$ 2000", embedding=[0.0, 1.0, 0.0])
+
+    assert cache.get_similar("u1", 1, [0.98, 0.02, 0.12]) == "R$ 500"
+    assert cache.get_similar("u1", 1, [0.5, 0.5, 0.5]) is None
+
+
+def test_analyze_transactions_uses_cache():
+    """Testar que a pergunta repetida não chama o LLM de novo"""
+    calls = []
+
+    class FakeClient:
+        async def chat(self, **kwargs):
+            calls.append(kwargs)
+            return {"message": {"content": "Gaste menos com delivery"}}
+
+    async def scenario():
+        service = LLMService()
+        service.answer_cache = AnswerCache(ttl=60, max_entries=10)
+        service._client = FakeClient()
+        service._client_loop = asyncio.get_running_loop()
+
+        first = await service.analyze_transactions("resumo", "Onde economizar?", "u1", ledger_version=7)
+        second = await service.analyze_transactions("resumo", "onde economizar", "u1", ledger_version=7)
+        third = await service.analyze_transactions("resumo", "onde economizar", "u1", ledger_version=8)
+        return first, second, third
+
+    first, second, third = asyncio.run(scenario())
+    assert first == second == third == "Gaste menos com delivery"
+    assert len(calls) == 2
@@ -91,3 +91,103 @@ def test_get_current_user_without_token(client):
     """Testar obter usuário sem token"""
     response = client.get("/api/auth/me")
     assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+
+def test_current_user_cached_until_user_changes(client, auth_headers, db, test_user):
+    """Testar principal em cache (sem SELECT em users) e invalidação ao alterar/excluir"""
+    from tests.test_projections import count_queries
+
+    client.get("/api/auth/me", headers=auth_headers)
+    with count_queries() as statements:
+        response = client.get("/api/auth/me", headers=auth_headers)
+    assert response.status_code == status.HTTP_200_OK
+    assert statements == []
+
+    test_user.name = "Outro Nome"
+    db.commit()
+    assert client.get("/api/auth/me", headers=auth_headers).json()["name"] == "Outro Nome"
+
+    db.delete(test_user)
+    db.commit()
+    assert client.get("/api/auth/me", headers=auth_headers).status_code == status.HTTP_401_UNAUTHORIZED
+
+
+def test_principal_and_token_caches_expire():
+    """Testar TTL do principal e memoização do token só até o exp"""
+    from uuid import uuid4
+    from app.core.principal import Principal, PrincipalCache
+    from app.core.security import TokenCache
+
+    now = [1000.0]
+    principals = PrincipalCache(ttl=30, clock=lambda: now[0])
+    principal = Principal(id=uuid4(), email="a@b.com", name=None, created_at=None, updated_at=None)
+    principals.put("sub", principal)
+    now[0] += 29
+    assert principals.get("sub") is principal
+    now[0] += 1
+    assert principals.get("sub") is None
+
+    tokens = TokenCache(max_entries=2, clock=lambda: now[0])
+    tokens.put("a", {"sub": "1", "exp": now[0] + 60})
+    tokens.put("b", {"sub": "2", "exp": now[0] + 5})
+    tokens.put("c", {"sub": "3", "exp": now[0] + 60})
+    assert tokens.get("a") is None             # LRU
+    assert tokens.get("c")["sub"] == "3"
+    now[0] += 5
+    assert tokens.get("b") is None             # Expirado
+
+
+def test_login_rehashes_when_cost_changes(client, db):
+    """Testar hash refeito no login quando o custo do bcrypt configurado mudou"""
+    from passlib.context import CryptContext
+    from app.core.config import settings
+    from app.models.user import User
+
+    old_hash = CryptContext(schemes=["bcrypt"], bcrypt__rounds=4).hash("senha-antiga")
+    user = User(email="old@example.com", name="Old", hashed_password=old_hash)
+    db.add(user)
+    db.commit()
+
+    response = client.post("/api/auth/login", json={"email": "old@example.com", "password": "senha-antiga"})
+    assert response.status_code == status.HTTP_200_OK
+
+    db.refresh(user)
+    assert user.hashed_password != old_hash
+    assert user.hashed_password.startswith(f"$2b${settings.BCRYPT_ROUNDS:02d}$")
+
+    # Hash novo continua válido e não é refeito de novo
+    current = user.hashed_password
+    assert client.post("/api/auth/login", json={"email": "old@example.com", "password": "senha-antiga"}).status_code == 200
+    db.refresh(user)
+    assert user.hashed_password == current
+
+
+def test_password_hasher_backpressure(client, test_user, monkeypatch):
+    """Testar pool limitado: pedidos além da fila são recusados com 429"""
+    import asyncio
+    import threading
+    from app.api import auth
+    from app.services.password_hasher import PasswordHasher, PasswordHasherSaturated
+
+    hasher = PasswordHasher(workers=1, max_queue=1)
+    release = threading.Event()
+
+    async def scenario():
+        blocked = [asyncio.ensure_future(hasher._submit("hash", release.wait)) for _ in range(2)]
+        await asyncio.sleep(0.05)
+        assert hasher.stats()["auth.password_hash.pending"] == 2
+        with pytest.raises(PasswordHasherSaturated):
+            await hasher.hash("x")
+        release.set()
+        await asyncio.gather(*blocked)
+        return await hasher.verify("x", await hasher.hash("x"))
+
+    assert asyncio.run(scenario()) == (True, None)
+    assert hasher.stats()["auth.password_hash.pending"] == 0
+
+    # Fila cheia no endpoint → 429 com Retry-After
+    monkeypatch.setattr(auth, "password_hasher", PasswordHasher(workers=1, max_queue=0))
+    auth.password_hasher._pending = 1
+    response = client.post("/api/auth/login", json={"email": "test@example.com", "password": "testpass123"})
+    assert response.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+    assert response.headers["Retry-After"] == "1"
@@ -0,0 +1,106 @@
+"""
+Testes para a simulação Monte Carlo do fluxo de caixa
+"""
+import time
+from datetime import date
+from decimal import Decimal
+
+import pytest
+from fastapi import status
+
+from app.models.transaction import Transaction
+from app.services.cashflow_simulation import CashFlowSimulator
+from tests.conftest import run_async
+
+TODAY = date(2025, 7, 15)
+
+
+@pytest.fixture
+def history(db, test_user):
+    """Seis meses completos: salário e aluguel fixos, mercado variável, um extra esporádico"""
+    for month in range(1, 7):
+        rows = [
+            (5, "SALARIO EMPRESA", "5000.00"),
+            (10, "ALUGUEL", "-1500.00"),
+            (12, "MERCADO", str(-400 - 37 * month)),
+            (20, "MERCADO", str(-250 - 11 * month)),
+        ]
+        if month in (2, 5):
+            rows.append((25, "FREELA", "800.00"))
+        for day, description, amount in rows:
+            db.add(Transaction(
+                user_id=test_user.id, date=date(2025, month, day),
+                description=description, amount=Decimal(amount)
+            ))
+    # Mês corrente (incompleto) não entra no ajuste
+    db.add(Transaction(user_id=test_user.id, date=date(2025, 7, 3), description="MERCADO", amount=Decimal("-9999")))
+    db.commit()
+
+
+def test_fit_detects_recurring_and_variable_series(db, test_user, history):
+    """Testar itens recorrentes como valores fixos e o resto como séries por sinal"""
+    model = run_async(lambda session: CashFlowSimulator().fit(session, test_user.id, lookback_months=12, today=TODAY))
+
+    assert model.history_months == 6
+    assert {(r["description"], r["amount"]) for r in model.recurring} == {
+        ("SALARIO EMPRESA", 5000.0), ("ALUGUEL", -1500.0)
+    }
+    types = sorted(s["type"] for s in model.series)
+    assert types == ["expense", "income"]
+    income = model.series[[s["type"] for s in model.series].index("income")]
+    assert income["mean_monthly"] == pytest.approx(1600 / 6, abs=0.01)
+
+
+def test_simulation_bands_are_ordered(db, test_user, history):
+    """Testar percentis ordenados e mediana coerente com o fluxo médio"""
+    result = run_async(lambda session: CashFlowSimulator().simulate(
+        session, test_user.id, months=12, paths=5000, starting_balance=0.0, seed=1, today=TODAY
+    ))
+
+    assert len(result["bands"]) == 12
+    assert result["bands"][0]["month"] == "2025-07"
+    for band in result["bands"]:
+        assert band["p5"] <= band["p25"] <= band["p50"] <= band["p75"] <= band["p95"]
+
+    # Fluxo médio histórico ≈ 5000 - 1500 - 888.5 + 266.67 por mês
+    assert result["ending_balance"]["p50"] == pytest.approx(12 * 2878, rel=0.05)
+    assert result["probability_negative"] == 0
+
+
+def test_simulation_cached_until_ledger_changes(db, test_user, history):
+    """Testar cache por versão do extrato"""
+    simulator = CashFlowSimulator()
+    first = run_async(lambda session: simulator.simulate(session, test_user.id, months=12, paths=1000, today=TODAY))
+    assert run_async(lambda session: simulator.simulate(session, test_user.id, months=12, paths=1000, today=TODAY)) is first
+
+    db.add(Transaction(user_id=test_user.id, date=date(2025, 6, 28), description="PIX", amount=Decimal("-50")))
+    db.commit()
+
+    assert run_async(lambda session: simulator.simulate(session, test_user.id, months=12, paths=1000, today=TODAY)) is not first
+
+
+def test_simulation_10k_paths_60_months_is_fast(db, test_user, history):
+    """Testar o custo do caso grande (10k caminhos × 60 meses)"""
+    model = run_async(lambda session: CashFlowSimulator().fit(session, test_user.id, lookback_months=12, today=TODAY))
+
+    started = time.perf_counter()
+    result = CashFlowSimulator().run(model, months=60, paths=10000, seed=3)
+    elapsed = time.perf_counter() - started
+
+    assert len(result["bands"]) == 60
+    assert elapsed < 2.0
+
+
+def test_simulate_endpoint(client, auth_headers, history):
+    """Testar endpoint, limites do horizonte e ausência de histórico"""
+    response = client.get("/api/projections/simulate", params={"months": 12, "paths": 500}, headers=auth_headers)
+    assert response.status_code == status.HTTP_200_OK
+    assert len(response.json()["bands"]) == 12
+
+    too_long = client.get("/api/projections/simulate", params={"months": 61}, headers=auth_headers)
+    assert too_long.status_code == 422
+
+
+def test_simulate_without_history(client, auth_headers):
+    response = client.get("/api/projections/simulate", headers=auth_headers)
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
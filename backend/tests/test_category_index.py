@@ -0,0 +1,163 @@
+"""
+Testes para a sugestão de categoria por vizinhos mais próximos
+"""
+from datetime import date
+
+import numpy as np
+
+from app.models.category import Category
+from app.models.description_embedding import DescriptionEmbedding
+from app.models.transaction import Transaction
+from app.services.category_index import CategoryIndex, _UserIndex
+from benchmarks.fake_ollama import FakeOllama
+from tests.conftest import TestingAsyncSessionLocal, run_async
+
+
+class FakeEmbedder:
+    """Embeddings determinísticos (bag-of-words por hash) contando as chamadas"""
+
+    def __init__(self):
+        self.fake = FakeOllama()
+        self.calls = []
+
+    async def __call__(self, texts, user_id=None, priority=None):
+        self.calls.append(list(texts))
+        return [self.fake.embedding(text) for text in texts]
+
+
+def _categorized(db, user, name, descriptions):
+    category = Category(user_id=user.id, name=name)
+    db.add(category)
+    db.flush()
+    for description in descriptions:
+        db.add(Transaction(
+            user_id=user.id,
+            date=date(2025, 3, 1),
+            description=description,
+            amount=-10,
+            category_id=category.id
+        ))
+    db.commit()
+    return category
+
+
+def test_vote_requires_similarity_and_agreement():
+    """Testar voto ponderado: vizinho parecido e maioria clara"""
+    index = _UserIndex(
+        ledger_version=1,
+        model="m",
+        matrix=np.array([[1, 0, 0], [0.96, 0.28, 0], [0, 1, 0], [0, 0, 1]], dtype=np.float32),
+        labels=np.array([0, 0, 1, 2]),
+        weights=np.ones(4, dtype=np.float32),
+        categories=["transporte", "lazer", "moradia"],
+    )
+    service = CategoryIndex(k=3, min_similarity=0.9, min_confidence=0.6, embedder=FakeEmbedder())
+
+    best, accepted = service.vote(np.array([[1, 0.05, 0], [0.5, 0.5, 0.5], [0, 0.7, 0.7]]), index)
+    assert best[0] == 0 and accepted[0]
+    assert not accepted[1]
+    assert not accepted[2]
+
+
+def test_suggest_from_confirmed_history(db, test_user):
+    """Testar sugestões a partir do histórico e reaproveitamento dos vetores gravados"""
+    transporte = _categorized(db, test_user, "Transporte", ["UBER TRIP CENTRO", "UBER TRIP AEROPORTO"])
+    lazer = _categorized(db, test_user, "Lazer", ["NETFLIX ASSINATURA MENSAL"])
+    embedder = FakeEmbedder()
+    service = CategoryIndex(
+        k=3, min_similarity=0.6, min_confidence=0.6, embedder=embedder, session_factory=TestingAsyncSessionLocal
+    )
+
+    batch = [
+        {"description": "UBER TRIP PAULISTA", "amount": -20.0},
+        {"description": "NETFLIX ASSINATURA MENSAL", "amount": -55.9},
+        {"description": "PIX ENVIADO", "amount": -100.0},
+    ]
+
+    async def first_import(session):
+        # Histórico sem vetores: nada é embedado na requisição, o backfill vai para background
+        before = await service.suggest(session, test_user.id, batch)
+        assert embedder.calls == []
+        await service._backfills[test_user.id]
+        return before, await service.suggest(session, test_user.id, batch)
+
+    before, suggestions = run_async(first_import)
+
+    assert before == [None, None, None]
+    assert suggestions == [transporte.id, lazer.id, None]
+    # Backfill do histórico (background) + um único lote para as descrições novas do extrato
+    assert len(embedder.calls) == 2
+    assert sorted(embedder.calls[1]) == ["PIX ENVIADO", "UBER TRIP PAULISTA"]
+    assert db.query(DescriptionEmbedding).count() == 5
+
+    # Mesmo extrato de novo: índice em cache e vetores já gravados
+    assert run_async(lambda session: service.suggest(session, test_user.id, batch)) == suggestions
+    assert len(embedder.calls) == 2
+
+
+def test_index_rebuilds_when_ledger_changes(db, test_user):
+    """Testar que confirmar novas transações entra no índice"""
+    _categorized(db, test_user, "Transporte", ["UBER TRIP CENTRO"])
+    embedder = FakeEmbedder()
+    service = CategoryIndex(k=3, min_similarity=0.6, min_confidence=0.6, embedder=embedder)
+    batch = [{"description": "SMART FIT ACADEMIA", "amount": -99.0}]
+
+    assert run_async(lambda session: service.index_for(session, test_user.id)) is not None
+    assert run_async(lambda session: service.suggest(session, test_user.id, batch)) == [None]
+
+    saude = _categorized(db, test_user, "Saúde", ["SMART FIT ACADEMIA"])
+    assert run_async(lambda session: service.suggest(session, test_user.id, batch)) == [saude.id]
+    assert service.stats()["categorize.knn.vectors"] == 2
+
+
+def test_upload_marks_suggestion_source(client, auth_headers):
+    """Testar que o upload informa a origem da sugestão"""
+    csv_content = "data,descricao,valor\n01/03/2025,UBER TRIP,-20.00\n"
+    response = client.post(
+        "/api/upload/statement",
+        files={"file": ("extrato.csv", csv_content.encode(), "text/csv")},
+        headers=auth_headers
+    )
+    assert response.status_code == 200
+    item = response.json()["transactions"][0]
+    assert item["suggestion_source"] in (None, "llm")
+
+
+def test_backfill_pages_through_history(db, test_user):
+    """Testar backfill em várias páginas e índice parcial fora do cache"""
+    descriptions = [f"MERCADO LOJA {i}" for i in range(5)]
+    _categorized(db, test_user, "Mercado", descriptions)
+
+    class FlakyEmbedder(FakeEmbedder):
+        fail = True
+
+        async def __call__(self, texts, user_id=None, priority=None):
+            if len(self.calls) == 1 and self.fail:
+                self.calls.append(None)
+                return None
+            return await super().__call__(texts, user_id, priority)
+
+    embedder = FlakyEmbedder()
+    service = CategoryIndex(k=3, min_similarity=0.6, min_confidence=0.6, embedder=embedder, backfill_batch=2)
+
+    # Ollama falha na segunda página: índice parcial, sem cache
+    index = run_async(lambda session: service.index_for(session, test_user.id))
+    assert len(index.matrix) == 2
+    assert service.stats()["categorize.knn.users"] == 0
+
+    # Próxima chamada retoma de onde parou e completa o histórico
+    embedder.fail = False
+    index = run_async(lambda session: service.index_for(session, test_user.id))
+    assert len(index.matrix) == 5
+    assert service.stats()["categorize.knn.users"] == 1
+    assert [len(c) for c in embedder.calls if c] == [2, 2, 1]
+
+
+def test_store_skips_descriptions_already_saved(db, test_user):
+    """Testar gravação de lote com descrição já gravada por outra requisição"""
+    service = CategoryIndex(embedder=FakeEmbedder())
+    run_async(lambda session: service._embed_and_store(session, test_user.id, ["UBER TRIP"]))
+    vectors = run_async(lambda session: service._embed_and_store(session, test_user.id, ["UBER TRIP", "IFOOD"]))
+
+    assert set(vectors) == {"UBER TRIP", "IFOOD"}
+    assert sorted(e.description for e in db.query(DescriptionEmbedding).all()) == ["IFOOD", "UBER TRIP"]
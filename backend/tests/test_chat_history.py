@@ -0,0 +1,101 @@
+"""
+Testes para o histórico paginado do chat e o arquivamento de conversas
+"""
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.models.ai_chat import AIChatHistory, AIChatArchive
+from app.services.chat_history import ChatArchiver, decode_cursor
+from app.services.llm_service import llm_service
+from tests.conftest import run_async
+
+NOW = datetime(2025, 6, 1, 12, 0, 0)
+
+
+def _turns(db, user, session_id, count, start, text="pergunta"):
+    rows = []
+    for i in range(count):
+        row = AIChatHistory(
+            user_id=user.id,
+            session_id=session_id,
+            turn_index=i,
+            message=f"{text} {i} " + "x" * 300,
+            response=f"resposta {i}",
+            model="llama3.2:3b",
+            created_at=start + timedelta(minutes=i)
+        )
+        db.add(row)
+        rows.append(row)
+    db.commit()
+    return rows
+
+
+def test_history_keyset_pagination_with_previews(client, auth_headers, db, test_user):
+    """Testar páginas sem repetição, em ordem decrescente e só com prévias"""
+    rows = _turns(db, test_user, uuid.uuid4(), 5, NOW)
+
+    seen, cursor = [], None
+    while True:
+        params = {"limit": 2, **({"cursor": cursor} if cursor else {})}
+        page = client.get("/api/ai/chat/history", params=params, headers=auth_headers).json()
+        seen.extend(item["id"] for item in page["items"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+
+    assert seen == [str(row.id) for row in reversed(rows)]
+
+    item = client.get("/api/ai/chat/history", params={"limit": 1}, headers=auth_headers).json()["items"][0]
+    assert len(item["message_preview"]) == 160
+    assert item["truncated"] is True
+    assert "message" not in item
+
+    full = client.get(f"/api/ai/chat/history/{item['id']}", headers=auth_headers).json()
+    assert full["message"].startswith("pergunta 4 ") and len(full["message"]) > 300
+
+
+def test_invalid_cursor_is_rejected(client, auth_headers):
+    """Testar cursor malformado"""
+    with pytest.raises(ValueError):
+        decode_cursor("nao-e-cursor")
+    for url in ("/api/ai/chat/history", "/api/ai/chat/archive"):
+        response = client.get(url, params={"cursor": "nao-e-cursor"}, headers=auth_headers)
+        assert response.status_code == 400
+
+
+def test_archiver_moves_old_sessions(client, auth_headers, db, test_user, monkeypatch):
+    """Testar retenção: sessões antigas comprimidas no arquivo e fora da tabela quente"""
+    old_session = uuid.uuid4()
+    _turns(db, test_user, old_session, 3, NOW - timedelta(days=120), text="antiga")
+    _turns(db, test_user, None, 2, NOW - timedelta(days=200), text="sem sessão")
+    recent = _turns(db, test_user, uuid.uuid4(), 2, NOW - timedelta(days=1))
+
+    totals = run_async(lambda session: ChatArchiver(retention_days=90, batch_sessions=1).run(session, now=NOW))
+
+    assert totals["sessions"] == 2
+    assert totals["turns"] == 5
+    assert totals["compressed_bytes"] < totals["raw_bytes"]
+    assert {row.id for row in db.query(AIChatHistory).all()} == {row.id for row in recent}
+    assert db.query(AIChatArchive).count() == 2
+
+    archived = client.get("/api/ai/chat/archive", headers=auth_headers).json()["items"]
+    assert [a["turn_count"] for a in archived] == [3, 2]
+
+    detail = client.get(f"/api/ai/chat/archive/{archived[0]['id']}", headers=auth_headers).json()
+    assert [t["turn_index"] for t in detail["turns"]] == [0, 1, 2]
+    assert detail["turns"][0]["message"].startswith("antiga 0")
+
+    session = client.get(f"/api/ai/chat/sessions/{old_session}", headers=auth_headers).json()
+    assert len(session) == 3 and session[0]["session_id"] == str(old_session)
+
+    # Sessão arquivada é somente leitura
+    monkeypatch.setattr(llm_service, "check_availability", lambda: True)
+    response = client.post(
+        "/api/ai/chat", json={"message": "e agora?", "session_id": str(old_session)}, headers=auth_headers
+    )
+    assert response.status_code == 409
+
+    # Nada mais vencido: segunda execução não faz nada
+    assert run_async(lambda session: ChatArchiver(retention_days=90).run(session, now=NOW))["sessions"] == 0
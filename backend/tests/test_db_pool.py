@@ -0,0 +1,65 @@
+"""
+Testes para a configuração e as métricas do pool de conexões
+"""
+import pytest
+from fastapi import status
+from sqlalchemy import create_engine, exc
+
+from app.core.config import settings
+from app.db.pool import MonitoredAsyncQueuePool, engine_options, pool_collector, pool_stats
+
+
+def test_engine_options_from_settings(monkeypatch):
+    """Testar pool, echo e statement timeout derivados das Settings"""
+    monkeypatch.setattr(settings, "DEBUG", True)
+    monkeypatch.setattr(settings, "DB_POOL_SIZE", 7)
+    monkeypatch.setattr(settings, "DB_STATEMENT_TIMEOUT_MS", 5000)
+    url = "postgresql://postgres:postgres@db:5432/dashboard_db"
+
+    options = engine_options(url, is_async=True)
+    assert options["echo"] is False
+    assert options["poolclass"] is MonitoredAsyncQueuePool
+    assert options["pool_size"] == 7
+    assert options["pool_pre_ping"] is True
+    assert options["connect_args"] == {"server_settings": {"statement_timeout": "5000"}}
+    assert engine_options(url, is_async=False)["connect_args"] == {"options": "-c statement_timeout=5000"}
+
+    # SQLite: sem statement timeout; em memória, sem pool com fila
+    assert "connect_args" not in engine_options("sqlite:///./app.db", is_async=False)
+    assert "pool_size" not in engine_options("sqlite://", is_async=False)
+
+
+def test_pool_stats_and_timeout(monkeypatch, tmp_path, metrics_registry):
+    """Testar gauges de ocupação, espera no checkout e timeout com o pool esgotado"""
+    monkeypatch.setattr(settings, "DB_POOL_SIZE", 1)
+    monkeypatch.setattr(settings, "DB_MAX_OVERFLOW", 0)
+    monkeypatch.setattr(settings, "DB_POOL_TIMEOUT_SECONDS", 0.05)
+    url = f"sqlite:///{tmp_path}/pool.db"
+    engine = create_engine(url, **engine_options(url, is_async=False, name="teste"))
+    metrics_registry.reset()
+
+    try:
+        with engine.connect():
+            assert pool_stats(engine)["checked_out"] == 1
+            with pytest.raises(exc.TimeoutError):
+                engine.connect()
+            gauges = pool_collector(engine, "teste")()
+            assert gauges["db.pool.checked_out{pool=teste}"] == 1
+            assert gauges["db.pool.size{pool=teste}"] == 1
+        assert pool_stats(engine)["checked_out"] == 0
+    finally:
+        engine.dispose()
+
+    snapshot = metrics_registry.snapshot()
+    assert snapshot["counters"]["db.pool.timeouts{pool=teste}"] == 1
+    assert snapshot["distributions"]["db.pool.wait_seconds{pool=teste}"]["count"] == 2
+
+
+def test_health_db(client):
+    """Testar /health/db com o banco respondendo"""
+    response = client.get("/health/db")
+    assert response.status_code == status.HTTP_200_OK
+    data = response.json()
+    assert data["status"] == "healthy"
+    assert data["latency_ms"] >= 0
+    assert data["pool"]["size"] == settings.DB_POOL_SIZE
@@ -0,0 +1,104 @@
+"""
+Testes para o Ollama fake e o benchmark dos endpoints com LLM
+"""
+import asyncio
+
+import numpy as np
+import ollama
+import pytest
+
+from app.services.llm_health import LLMHealthMonitor
+from app.services.llm_service import LLMService, llm_service
+from benchmarks.fake_ollama import FakeOllama, FakeOllamaConfig, serve
+from benchmarks.run import check_thresholds, load_labeled_statement, run_benchmark
+
+
+def _service(base_url):
+    service = LLMService()
+    service.base_url = base_url
+    service.health.record_success()
+    return service
+
+
+def test_synthetic_categorization_and_prefix_cache():
+    """Testar categoria por palavra-chave e prefixo de sistema fora da contagem repetida"""
+    fake = FakeOllama()
+
+    with serve(fake) as base_url:
+        async def scenario():
+            service = _service(base_url)
+            return await service.categorize_transactions(
+                [{"description": "UBER *TRIP", "amount": -20.0},
+                 {"description": "NETFLIX.COM", "amount": -55.9},
+                 {"description": "TED RECEBIDA", "amount": 900.0}],
+                ["Transporte", "Lazer", "Outros"],
+                user_id="u1"
+            )
+
+        assert asyncio.run(scenario()) == ["Transporte", "Lazer", "Outros"]
+        assert fake.requests["/api/chat"] == 3
+        assert len(fake._seen_prefixes) == 1
+
+
+def test_stream_and_embeddings():
+    """Testar streaming NDJSON, /api/embed e /api/tags"""
+    fake = FakeOllama(FakeOllamaConfig(chat_reply_tokens=5, tokens_per_second=500))
+
+    with serve(fake) as base_url:
+        async def scenario():
+            service = _service(base_url)
+            tokens = [t async for t in service.chat_stream("oi", user_id="u1")]
+            vectors = await service.embed(["uber trip centro", "uber trip aeroporto", "netflix"])
+            return tokens, vectors
+
+        tokens, vectors = asyncio.run(scenario())
+        models = ollama.Client(host=base_url).list()
+
+    assert "".join(tokens).split() == ["Seus", "gastos", "estão", "dentro", "do"]
+    matrix = np.asarray(vectors)
+    assert matrix[0] @ matrix[1] > matrix[0] @ matrix[2]
+    assert {m.model for m in models.models} == set(fake.config.models)
+
+
+def test_record_then_replay(tmp_path):
+    """Testar gravação contra um upstream e reprodução sem ele"""
+    cassette = tmp_path / "cassette.jsonl"
+    upstream = FakeOllama(FakeOllamaConfig(chat_reply_tokens=3))
+    messages = [{"role": "user", "content": "Resuma meus gastos"}]
+
+    def ask(base_url):
+        return ollama.Client(host=base_url).chat(model=upstream.config.models[0], messages=messages)
+
+    with serve(upstream) as upstream_url:
+        recorder = FakeOllama(FakeOllamaConfig(mode="record", cassette=cassette, upstream=upstream_url))
+        with serve(recorder) as recorder_url:
+            recorded = ask(recorder_url)
+
+    replayer = FakeOllama(FakeOllamaConfig(mode="replay", cassette=cassette))
+    assert len(replayer.cassette) == 1
+    with serve(replayer) as replay_url:
+        replayed = ask(replay_url)
+        with pytest.raises(ollama.ResponseError):
+            ollama.Client(host=replay_url).chat(
+                model=upstream.config.models[0],
+                messages=[{"role": "user", "content": "outra pergunta"}]
+            )
+
+    assert replayed.message.content == recorded.message.content
+
+
+def test_benchmark_reports_latency_and_accuracy(monkeypatch, metrics_registry):
+    """Testar relatório do benchmark (upload + chat) contra o fixture rotulado"""
+    # Sondagem de verdade, contra o Ollama fake que o benchmark sobe
+    monkeypatch.setattr(llm_service, "health", LLMHealthMonitor())
+    _, labels = load_labeled_statement()
+    report = run_benchmark(uploads=1, chats=2, concurrency=2)
+
+    upload = report["scenarios"]["upload"]
+    assert upload["rows"] == len(labels)
+    assert upload["accuracy"] >= 0.8
+    assert upload["latency_ms"]["p95"] >= upload["latency_ms"]["p50"]
+    assert report["scenarios"]["chat"]["errors"] == 0
+    assert any(k.startswith("llm.calls{endpoint=POST /api/upload/statement") for k in report["llm"]["counters"])
+    assert check_thresholds(report, min_accuracy=0.8) == []
+    assert check_thresholds(report, min_accuracy=1.0)
@@ -0,0 +1,140 @@
+"""
+Testes para a previsão por categoria (Holt-Winters)
+"""
+import math
+from datetime import date
+from decimal import Decimal
+
+import numpy as np
+import pytest
+from fastapi import status
+
+from app.models.category import Category
+from app.models.transaction import Transaction
+from app.services.forecast_service import CategoryForecaster, fit, predict
+from tests.conftest import run_async
+
+
+def _add_month(db, user, categories, year, month):
+    """Salário fixo, mercado com sazonalidade anual (dezembro mais caro) e luz com tendência"""
+    index = (year - 2023) * 12 + month
+    market = -800 - 300 * math.cos(2 * math.pi * (month - 12) / 12)
+    db.add_all([
+        Transaction(user_id=user.id, date=date(year, month, 5), description="SALARIO",
+                    amount=Decimal("5000.00"), category_id=categories["Salário"].id),
+        Transaction(user_id=user.id, date=date(year, month, 12), description="MERCADO",
+                    amount=Decimal(str(round(market, 2))), category_id=categories["Mercado"].id),
+        Transaction(user_id=user.id, date=date(year, month, 20), description="LUZ",
+                    amount=Decimal(str(-100 - 2 * index))),
+    ])
+
+
+@pytest.fixture
+def categories(db, test_user):
+    rows = {name: Category(user_id=test_user.id, name=name) for name in ("Salário", "Mercado")}
+    db.add_all(rows.values())
+    db.commit()
+    return rows
+
+
+@pytest.fixture
+def history(db, test_user, categories):
+    """Dois anos e meio completos (01/2023 a 06/2025)"""
+    for year, month in [(y, m) for y in (2023, 2024, 2025) for m in range(1, 13)][:30]:
+        _add_month(db, test_user, categories, year, month)
+    db.commit()
+
+
+def test_fit_recovers_seasonal_series():
+    """Testar ajuste vetorizado da grade numa série sazonal sem ruído"""
+    months = np.arange(36)
+    series = np.vstack([
+        1000 + 200 * np.sin(2 * np.pi * months / 12),
+        np.full(36, -300.0),
+    ])
+    state = fit(series, first_month=0, seasonal=True)
+    mean, std = predict(state, next_month=36, horizon=12)
+
+    expected = 1000 + 200 * np.sin(2 * np.pi * np.arange(36, 48) / 12)
+    assert mean[0] == pytest.approx(expected, abs=25)
+    assert mean[1] == pytest.approx(np.full(12, -300.0), abs=1e-6)
+    assert np.all(np.diff(std[0]) >= 0)
+
+
+def test_forecast_endpoint(client, auth_headers, db, test_user, categories):
+    """Testar formato da resposta, intervalos ordenados e backtest"""
+    # Seis meses completos antes do mês corrente (o endpoint usa a data de hoje)
+    current = date.today().year * 12 + date.today().month - 1
+    for index in range(current - 6, current):
+        _add_month(db, test_user, categories, index // 12, index % 12 + 1)
+    db.commit()
+
+    response = client.get("/api/transactions/forecast", params={"months": 3}, headers=auth_headers)
+    assert response.status_code == status.HTTP_200_OK
+    data = response.json()
+
+    assert data["horizon"] == 3
+    assert len(data["months"]) == 3
+    assert {c["category"] for c in data["categories"]} == {"Salário", "Mercado", "Sem categoria"}
+    assert data["backtest"]["months"] >= 1
+
+    salary = next(c for c in data["categories"] if c["category"] == "Salário")
+    assert [p["value"] for p in salary["forecast"]] == [5000.0] * 3
+
+    for point in data["total"] + [p for c in data["categories"] for p in c["forecast"]]:
+        assert point["lower_95"] <= point["lower_80"] <= point["value"] <= point["upper_80"] <= point["upper_95"]
+
+
+def test_forecast_requires_history(client, auth_headers, db, test_user):
+    """Testar 400 sem meses completos suficientes"""
+    response = client.get("/api/transactions/forecast", headers=auth_headers)
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    db.add(Transaction(user_id=test_user.id, date=date.today(), description="PIX", amount=Decimal("-10")))
+    db.commit()
+    response = client.get("/api/transactions/forecast", headers=auth_headers)
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+def test_forecast_seasonal_model(db, test_user, history):
+    """Testar Holt-Winters com dois anos de histórico: dezembro acima da média"""
+    result = run_async(lambda session: CategoryForecaster().forecast(
+        session, test_user.id, months=12, today=date(2025, 7, 10)
+    ))
+
+    assert result["model"] == "holt-winters"
+    assert result["last_month"] == "2025-06"
+    assert result["months"][0] == "2025-07"
+
+    market = next(c for c in result["categories"] if c["category"] == "Mercado")
+    by_month = {p["month"]: p["value"] for p in market["forecast"]}
+    assert by_month["2025-12"] < by_month["2026-06"] - 400
+    assert result["backtest"]["mape"] is not None
+
+
+def test_forecast_cache_and_incremental_update(db, test_user, categories, history, metrics_registry):
+    """Testar cache por versão do extrato e atualização incremental com mês novo"""
+    forecaster = CategoryForecaster()
+    metrics_registry.reset()
+
+    first = run_async(lambda session: forecaster.forecast(session, test_user.id, months=6, today=date(2025, 7, 10)))
+    entry = forecaster._cache[str(test_user.id)]
+    run_async(lambda session: forecaster.forecast(session, test_user.id, months=6, today=date(2025, 7, 20)))
+    assert forecaster._cache[str(test_user.id)] is entry
+
+    # Julho fecha: só meses novos → continua do estado anterior, sem reajuste
+    _add_month(db, test_user, categories, 2025, 7)
+    db.commit()
+    second = run_async(lambda session: forecaster.forecast(session, test_user.id, months=6, today=date(2025, 8, 2)))
+    counters = metrics_registry.snapshot()["counters"]
+    assert counters["forecast.refits"] == 1
+    assert counters["forecast.incremental"] == 1
+    assert counters["forecast.cache.hits"] == 1
+    assert second["last_month"] == "2025-07"
+    assert second["months"][0] == first["months"][1]
+
+    # Mês antigo alterado → ajuste completo
+    db.add(Transaction(user_id=test_user.id, date=date(2024, 3, 3), description="LUZ", amount=Decimal("-500")))
+    db.commit()
+    run_async(lambda session: forecaster.forecast(session, test_user.id, months=6, today=date(2025, 8, 2)))
+    assert metrics_registry.snapshot()["counters"]["forecast.refits"] == 2
@@ -0,0 +1,142 @@
+"""
+Testes para o monitor de saúde do LLM (cache + circuit breaker)
+"""
+import asyncio
+import threading
+
+import pytest
+
+from app.services.llm_health import LLMHealthMonitor, CircuitState
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeProbe:
+    def __init__(self):
+        self.up = True
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if not self.up:
+            raise ConnectionError("ollama down")
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def probe():
+    return FakeProbe()
+
+
+@pytest.fixture
+def monitor(probe, clock):
+    return LLMHealthMonitor(
+        probe=probe, ttl=10, failure_threshold=3, reset_timeout=30, clock=clock
+    )
+
+
+def test_availability_is_cached_within_ttl(monitor, probe, clock):
+    """Testar que a sondagem só roda de novo após o TTL"""
+    assert monitor.is_available() is True
+    assert monitor.is_available() is True
+    assert probe.calls == 1
+
+    clock.now += 11
+    assert monitor.is_available() is True
+    assert probe.calls == 2
+
+
+def test_circuit_opens_after_consecutive_failures(monitor, probe, clock):
+    """Testar que o circuito abre e degrada sem sondar"""
+    for _ in range(3):
+        monitor.record_failure()
+
+    assert monitor.state == CircuitState.OPEN
+    assert monitor.is_available() is False
+    assert probe.calls == 0
+
+
+def test_explicit_zero_threshold_is_kept(probe, clock):
+    """Testar que failure_threshold=0 não é trocado pelo valor das Settings"""
+    monitor = LLMHealthMonitor(probe=probe, failure_threshold=0, clock=clock)
+    assert monitor.failure_threshold == 0
+
+    monitor.record_failure()
+    assert monitor.state == CircuitState.OPEN
+
+
+def test_half_open_probe_closes_circuit(monitor, probe, clock):
+    """Testar recuperação via sondagem meio-aberta"""
+    for _ in range(3):
+        monitor.record_failure()
+
+    clock.now += 31
+    assert monitor.is_available() is True
+    assert monitor.state == CircuitState.CLOSED
+    assert probe.calls == 1
+
+
+def test_half_open_failure_reopens_circuit(monitor, probe, clock):
+    """Testar que uma falha no estado meio-aberto reabre o circuito"""
+    for _ in range(3):
+        monitor.record_failure()
+
+    probe.up = False
+    clock.now += 31
+    assert monitor.is_available() is False
+    assert monitor.state == CircuitState.OPEN
+
+    clock.now += 5
+    assert monitor.is_available() is False
+    assert probe.calls == 1
+
+
+def test_status_endpoint_exposes_circuit(client):
+    """Testar que /api/ai/status responde com o estado do circuito"""
+    response = client.get("/api/ai/status")
+    assert response.status_code == 200
+    data = response.json()
+    assert "available" in data
+    assert data["health"]["circuit"] in {"closed", "open", "half_open"}
+
+
+def test_unknown_state_is_available_while_first_probe_runs(monitor, probe):
+    """Testar que antes da primeira sondagem a chamada não é recusada"""
+    async def scenario():
+        available = monitor.is_available()
+        await asyncio.sleep(0.05)
+        return available
+
+    assert asyncio.run(scenario()) is True
+    assert probe.calls == 1
+
+
+def test_refresh_shares_in_flight_probe(probe, clock):
+    """Testar que refresh durante uma sondagem não dispara outra"""
+    started, release = threading.Event(), threading.Event()
+
+    def slow_probe():
+        started.set()
+        release.wait(1)
+        probe()
+
+    monitor = LLMHealthMonitor(probe=slow_probe, ttl=10, clock=clock)
+    first = threading.Thread(target=monitor.refresh)
+    first.start()
+    started.wait(1)
+
+    assert monitor.refresh() is False   # Em andamento: devolve o último valor, sem sondar
+    release.set()
+    first.join()
+    assert probe.calls == 1
+    assert monitor.is_available() is True
@@ -0,0 +1,126 @@
+"""
+Testes para a instrumentação das chamadas ao LLM
+"""
+import asyncio
+
+import httpx
+from fastapi import APIRouter, FastAPI
+from fastapi.testclient import TestClient
+
+from app.core.metrics import current_endpoint, EndpointContextMiddleware
+from app.services.llm_service import LLMService
+
+FINAL_USAGE = {
+    "done": True,
+    "prompt_eval_count": 120,
+    "eval_count": 40,
+    "eval_duration": 2_000_000_000,
+    "prompt_eval_duration": 300_000_000,
+    "load_duration": 100_000_000,
+}
+
+
+def _service(model, client):
+    service = LLMService(model=model)
+    service.health.record_success()
+    service._client = client
+    return service
+
+
+def _labels(model, operation):
+    return f"endpoint=-,model={model},operation={operation}"
+
+
+def test_chat_records_tokens_and_latency(metrics_registry):
+    """Testar tokens, tokens/s, TTFT do servidor e fila numa chamada simples"""
+    class FakeClient:
+        async def chat(self, **kwargs):
+            return {"message": {"content": "Olá"}, **FINAL_USAGE}
+
+    async def scenario():
+        service = _service("metrics-chat", FakeClient())
+        service._client_loop = asyncio.get_running_loop()
+        return await service.chat("oi", user_id="u1")
+
+    assert asyncio.run(scenario()) == "Olá"
+
+    snapshot = metrics_registry.snapshot()
+    labels = _labels("metrics-chat", "chat")
+    dists = snapshot["distributions"]
+    assert snapshot["counters"][f"llm.calls{{{labels},outcome=ok}}"] == 1
+    assert snapshot["counters"][f"llm.eval_tokens_total{{{labels}}}"] == 40
+    assert dists[f"llm.prompt_tokens{{{labels}}}"]["max"] == 120
+    assert dists[f"llm.tokens_per_second{{{labels}}}"]["max"] == 20
+    assert abs(dists[f"llm.ttft_seconds{{{labels}}}"]["max"] - 0.4) < 1e-9
+    assert dists[f"llm.queue_wait_seconds{{{labels}}}"]["count"] == 1
+
+
+def test_stream_measures_time_to_first_token(metrics_registry):
+    """Testar TTFT medido no cliente e contagens do último pedaço do stream"""
+    class FakeClient:
+        async def chat(self, **kwargs):
+            async def parts():
+                await asyncio.sleep(0.01)
+                yield {"message": {"content": "Gaste"}}
+                yield {"message": {"content": " menos"}}
+                yield {"message": {"content": ""}, **FINAL_USAGE}
+            return parts()
+
+    async def scenario():
+        service = _service("metrics-stream", FakeClient())
+        service._client_loop = asyncio.get_running_loop()
+        return [token async for token in service.chat_stream("oi", user_id="u1")]
+
+    assert asyncio.run(scenario()) == ["Gaste", " menos"]
+
+    snapshot = metrics_registry.snapshot()
+    labels = _labels("metrics-stream", "chat_stream")
+    assert snapshot["counters"][f"llm.calls{{{labels},outcome=ok}}"] == 1
+    ttft = snapshot["distributions"][f"llm.ttft_seconds{{{labels}}}"]["max"]
+    assert 0.005 < ttft < 0.4
+
+
+def test_timeout_is_counted_as_fallback(metrics_registry):
+    """Testar timeout contado em llm.calls e em llm.fallbacks"""
+    class FakeClient:
+        async def chat(self, **kwargs):
+            raise httpx.ReadTimeout("timed out")
+
+    async def scenario():
+        service = _service("metrics-timeout", FakeClient())
+        service._client_loop = asyncio.get_running_loop()
+        return await service.categorize_transaction("UBER", -20.0, ["Transporte"], "u1")
+
+    assert asyncio.run(scenario()) == "Transporte"
+
+    counters = metrics_registry.snapshot()["counters"]
+    labels = _labels("metrics-timeout", "categorize")
+    assert counters[f"llm.calls{{{labels},outcome=timeout}}"] == 1
+    assert counters["llm.fallbacks{endpoint=-,operation=categorize,reason=timeout}"] == 1
+
+
+def test_endpoint_label_comes_from_request():
+    """Testar que o middleware expõe o endpoint da requisição em andamento"""
+    app = FastAPI()
+    app.add_middleware(EndpointContextMiddleware)
+
+    @app.post("/api/ai/chat")
+    async def endpoint():
+        return {"endpoint": current_endpoint()}
+
+    projections = APIRouter()
+
+    @projections.get("/{projection_id}/compare")
+    async def compare(projection_id: str):
+        return {"endpoint": current_endpoint()}
+
+    app.include_router(projections, prefix="/api/projections")
+
+    with TestClient(app) as client:
+        assert client.post("/api/ai/chat").json() == {"endpoint": "POST /api/ai/chat"}
+        # Rótulo pela rota, não pelo id: cardinalidade limitada
+        for projection_id in ("a1", "b2"):
+            assert client.get(f"/api/projections/{projection_id}/compare").json() == {
+                "endpoint": "GET /api/projections/{projection_id}/compare"
+            }
+    assert current_endpoint() == "-"
@@ -0,0 +1,117 @@
+"""
+Testes para o scheduler de requisições ao LLM
+"""
+import asyncio
+
+from app.services.llm_scheduler import LLMScheduler, LLMPriority
+
+
+async def _run_jobs(scheduler, jobs):
+    """Enfileira jobs (prioridade, usuário, nome) com o scheduler ocupado e retorna a ordem de atendimento"""
+    order = []
+    gate = asyncio.Event()
+
+    async def blocker():
+        async with scheduler.slot(LLMPriority.CHAT, "blocker"):
+            await gate.wait()
+
+    async def job(priority, user, name):
+        async with scheduler.slot(priority, user):
+            order.append(name)
+            await asyncio.sleep(0)
+
+    blocking = asyncio.create_task(blocker())
+    await asyncio.sleep(0)
+
+    tasks = [asyncio.create_task(job(*spec)) for spec in jobs]
+    await asyncio.sleep(0)
+    gate.set()
+
+    await asyncio.gather(blocking, *tasks)
+    return order
+
+
+def test_interactive_requests_jump_bulk_queue():
+    """Testar que chat é atendido antes de lote e análise"""
+    scheduler = LLMScheduler(max_in_flight=1, reserved_interactive=0)
+    order = asyncio.run(_run_jobs(scheduler, [
+        (LLMPriority.BULK, "u1", "bulk-1"),
+        (LLMPriority.ANALYZE, "u1", "analyze"),
+        (LLMPriority.BULK, "u1", "bulk-2"),
+        (LLMPriority.CHAT, "u2", "chat"),
+    ]))
+    assert order == ["chat", "analyze", "bulk-1", "bulk-2"]
+
+
+def test_users_share_bulk_capacity_round_robin():
+    """Testar fila justa entre usuários na mesma prioridade"""
+    scheduler = LLMScheduler(max_in_flight=1, reserved_interactive=0)
+    order = asyncio.run(_run_jobs(scheduler, [
+        (LLMPriority.BULK, "heavy", "h1"),
+        (LLMPriority.BULK, "heavy", "h2"),
+        (LLMPriority.BULK, "heavy", "h3"),
+        (LLMPriority.BULK, "light", "l1"),
+    ]))
+    assert order == ["h1", "l1", "h2", "h3"]
+
+
+def test_bulk_never_uses_reserved_slots():
+    """Testar que o lote respeita os slots reservados para uso interativo"""
+    scheduler = LLMScheduler(max_in_flight=3, reserved_interactive=1)
+
+    async def scenario():
+        peak = 0
+        gate = asyncio.Event()
+
+        async def bulk():
+            nonlocal peak
+            async with scheduler.slot(LLMPriority.BULK, "u1"):
+                peak = max(peak, scheduler.in_flight)
+                await gate.wait()
+
+        tasks = [asyncio.create_task(bulk()) for _ in range(5)]
+        await asyncio.sleep(0)
+        assert scheduler.in_flight == 2
+        assert scheduler.queue_depth(LLMPriority.BULK) == 3
+
+        # Chat ainda encontra slot livre com o lote saturado
+        async with scheduler.slot(LLMPriority.CHAT, "u2") as waited:
+            assert scheduler.in_flight == 3
+        assert waited < 0.1
+
+        gate.set()
+        await asyncio.gather(*tasks)
+        return peak
+
+    assert asyncio.run(scenario()) == 2
+    assert scheduler.in_flight == 0
+
+
+def test_cancelled_waiter_releases_queue_position():
+    """Testar que cancelar uma espera não vaza slot"""
+    scheduler = LLMScheduler(max_in_flight=1, reserved_interactive=0)
+
+    async def scenario():
+        gate = asyncio.Event()
+
+        async def holder():
+            async with scheduler.slot(LLMPriority.CHAT, "u1"):
+                await gate.wait()
+
+        async def waiter():
+            async with scheduler.slot(LLMPriority.BULK, "u2"):
+                pass
+
+        held = asyncio.create_task(holder())
+        await asyncio.sleep(0)
+        waiting = asyncio.create_task(waiter())
+        await asyncio.sleep(0)
+        waiting.cancel()
+        gate.set()
+        await held
+        await asyncio.gather(waiting, return_exceptions=True)
+
+    asyncio.run(scenario())
+    assert scheduler.in_flight == 0
+    assert scheduler.queue_depth() == 0
+
@@ -0,0 +1,39 @@
+"""
+Testes para o serviço do LLM (prompts de categorização)
+"""
+import asyncio
+
+from app.services.llm_service import LLMService, categorization_prefix
+
+
+def test_categorization_prompt_has_stable_prefix(metrics_registry):
+    """Testar prefixo estável por conjunto de categorias e sufixo por transação"""
+    sent = []
+
+    class FakeClient:
+        async def chat(self, **kwargs):
+            sent.append(kwargs["messages"])
+            return {"message": {"content": "Transporte"}, "prompt_eval_count": 18}
+
+    async def scenario():
+        service = LLMService()
+        service.health.record_success()
+        service._client = FakeClient()
+        service._client_loop = asyncio.get_running_loop()
+        return await service.categorize_transactions(
+            [{"description": "UBER *TRIP", "amount": -25.0},
+             {"description": "POSTO SHELL", "amount": -150.0}],
+            ["Alimentação", "Transporte"],
+            user_id="u1"
+        )
+
+    assert asyncio.run(scenario()) == ["Transporte", "Transporte"]
+    assert sent[0][0] == sent[1][0]
+    assert sent[0][0]["content"] is categorization_prefix(("Alimentação", "Transporte"))
+    assert "UBER *TRIP" in sent[0][1]["content"]
+    assert "UBER" not in sent[0][0]["content"]
+    prompt_tokens = [
+        dist for key, dist in metrics_registry.snapshot()["distributions"].items()
+        if key.startswith("llm.prompt_tokens{") and "operation=categorize" in key
+    ]
+    assert sum(dist["count"] for dist in prompt_tokens) >= 2
@@ -0,0 +1,82 @@
+"""
+Testes para o pré-carregamento do modelo (warm-up / keep-alive)
+"""
+import asyncio
+
+from app.services.llm_warmup import ModelWarmer, ModelLoadState, keep_alive_value
+
+
+class FakeClient:
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.calls = []
+
+    async def generate(self, **kwargs):
+        self.calls.append(kwargs)
+        if self.fail:
+            raise ConnectionError("ollama down")
+        return {"response": ""}
+
+
+def test_keep_alive_value_parsing():
+    """Testar conversão do keep_alive configurado"""
+    assert keep_alive_value("30m") == "30m"
+    assert keep_alive_value("-1") == -1
+    assert keep_alive_value("600") == 600
+
+
+def test_warm_loads_model_with_keep_alive():
+    """Testar carga do modelo com prompt vazio e keep_alive"""
+    warmer = ModelWarmer(model="llama3.2:3b", keep_alive="1h", ping_interval=60)
+    client = FakeClient()
+
+    assert warmer.state == ModelLoadState.COLD
+    assert asyncio.run(warmer.warm(client)) is True
+    assert warmer.state == ModelLoadState.READY
+    assert client.calls == [{"model": "llama3.2:3b", "prompt": "", "keep_alive": "1h"}]
+    assert warmer.snapshot()["state"] == "ready"
+
+
+def test_warm_failure_is_reported():
+    """Testar estado de erro quando o Ollama não responde"""
+    warmer = ModelWarmer(ping_interval=60)
+
+    assert asyncio.run(warmer.warm(FakeClient(fail=True))) is False
+    assert warmer.state == ModelLoadState.ERROR
+    assert "ollama down" in warmer.snapshot()["last_error"]
+
+
+def test_status_exposes_model_load_state(client):
+    """Testar estado de carga em /api/ai/status"""
+    data = client.get("/api/ai/status").json()
+    assert data["model_load"]["state"] in {s.value for s in ModelLoadState}
+
+
+def test_calls_wait_for_initial_load(monkeypatch):
+    """Testar chamada logo após a subida esperando a carga inicial (com limite)"""
+    loaded = asyncio.Event()
+
+    async def slow_warm(self, client):
+        await loaded.wait()
+        self.state = ModelLoadState.READY
+        return True
+
+    monkeypatch.setattr(ModelWarmer, "warm", slow_warm)
+
+    async def scenario():
+        warmer = ModelWarmer(ping_interval=60)
+        warmer.start()
+        await warmer.wait_ready(timeout=0.01)       # Carga demorando: segue após o limite
+        assert warmer.state == ModelLoadState.COLD
+
+        waiting = asyncio.create_task(warmer.wait_ready(timeout=5))
+        await asyncio.sleep(0)
+        assert not waiting.done()
+        loaded.set()
+        await waiting
+        assert warmer.state == ModelLoadState.READY
+
+        await warmer.wait_ready(timeout=0)          # Já carregado: retorna na hora
+        await warmer.stop()
+
+    asyncio.run(scenario())
@@ -0,0 +1,104 @@
+"""
+Testes das migrations do Alembic (alembic/versions) num SQLite temporário
+"""
+import os
+import uuid
+
+import pytest
+from alembic import command
+from alembic.autogenerate import compare_metadata
+from alembic.config import Config
+from alembic.migration import MigrationContext
+from sqlalchemy import create_engine, inspect, text
+
+from app.core.config import settings
+from app.db.base import Base
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+BRANCHES_REVISION = "9f883a865af8"  # anterior à projection_items
+
+
+@pytest.fixture
+def alembic_config(tmp_path, monkeypatch):
+    """Config sem arquivo .ini (não reconfigura o logging); env.py lê a URL de settings"""
+    monkeypatch.setattr(settings, "DATABASE_URL", f"sqlite:///{tmp_path / 'migrations.db'}")
+    config = Config()
+    config.set_main_option("script_location", os.path.join(BACKEND_DIR, "alembic"))
+    return config
+
+
+@pytest.fixture
+def migration_engine(alembic_config):
+    engine = create_engine(settings.DATABASE_URL)
+    yield engine
+    engine.dispose()
+
+
+def test_head_matches_models(alembic_config, migration_engine):
+    """Testar que `upgrade head` gera o mesmo esquema dos modelos e que o downgrade volta ao zero"""
+    command.upgrade(alembic_config, "head")
+    with migration_engine.connect() as connection:
+        # Tipos ficam de fora: UUID do Postgres é refletido como NUMERIC no SQLite
+        context = MigrationContext.configure(connection, opts={"compare_type": False})
+        assert compare_metadata(context, Base.metadata) == []
+
+    command.downgrade(alembic_config, "base")
+    assert inspect(migration_engine).get_table_names() == ["alembic_version"]
+
+
+def test_projection_items_migration_moves_rows_and_keeps_overrides(alembic_config, migration_engine):
+    """Testar a migração dos itens de projeção (ids, is_manual e overrides preservados nos dois sentidos)"""
+    command.upgrade(alembic_config, BRANCHES_REVISION)
+
+    user_id, projection_id, branch_id, legacy_id, real_id, override_id = (uuid.uuid4().hex for _ in range(6))
+    with migration_engine.begin() as connection:
+        connection.execute(
+            text("INSERT INTO users (id, email, hashed_password, ledger_version) VALUES (:id, 'a@b.c', 'x', 0)"),
+            {"id": user_id},
+        )
+        connection.execute(
+            text("INSERT INTO projections (id, user_id, name) VALUES (:id, :user_id, :name)"),
+            [
+                {"id": projection_id, "user_id": user_id, "name": "Base"},
+                {"id": branch_id, "user_id": user_id, "name": "Variação"},
+            ],
+        )
+        connection.execute(text("UPDATE projections SET parent_id = :parent WHERE id = :id"),
+                           {"parent": projection_id, "id": branch_id})
+        connection.execute(
+            text(
+                "INSERT INTO transactions (id, user_id, projection_id, date, description, amount, is_manual, is_projection) "
+                "VALUES (:id, :user_id, :projection_id, '2025-03-01', :description, :amount, 0, :is_projection)"
+            ),
+            [
+                {"id": legacy_id, "user_id": user_id, "projection_id": projection_id,
+                 "description": "Antiga", "amount": "-20.00", "is_projection": True},
+                {"id": real_id, "user_id": user_id, "projection_id": None,
+                 "description": "Real", "amount": "-5.00", "is_projection": False},
+            ],
+        )
+        connection.execute(
+            text("INSERT INTO projection_overrides (id, projection_id, item_id, action) "
+                 "VALUES (:id, :projection_id, :item_id, 'remove')"),
+            {"id": override_id, "projection_id": branch_id, "item_id": legacy_id},
+        )
+
+    command.upgrade(alembic_config, "head")
+    with migration_engine.connect() as connection:
+        assert connection.execute(text("SELECT id FROM transactions")).scalars().all() == [real_id]
+        assert connection.execute(text("SELECT id, is_manual FROM projection_items")).all() == [(legacy_id, 0)]
+        assert connection.execute(text("SELECT item_id FROM projection_overrides")).scalars().all() == [legacy_id]
+    foreign_keys = inspect(migration_engine).get_foreign_keys("projection_overrides")
+    assert {fk["referred_table"] for fk in foreign_keys if fk["constrained_columns"] == ["item_id"]} == {"projection_items"}
+
+    command.downgrade(alembic_config, BRANCHES_REVISION)
+    with migration_engine.connect() as connection:
+        rows = connection.execute(
+            text("SELECT id, is_manual, is_projection FROM transactions ORDER BY description")
+        ).all()
+        assert rows == [(legacy_id, 0, 1), (real_id, 0, 0)]
+        assert connection.execute(text("SELECT item_id FROM projection_overrides")).scalars().all() == [legacy_id]
+    assert "projection_items" not in inspect(migration_engine).get_table_names()
+    foreign_keys = inspect(migration_engine).get_foreign_keys("projection_overrides")
+    assert {fk["referred_table"] for fk in foreign_keys if fk["constrained_columns"] == ["item_id"]} == {"transactions"}
@@ -0,0 +1,341 @@
+"""
+Testes para projeções (cenários what-if)
+"""
+from contextlib import contextmanager
+from datetime import date
+from decimal import Decimal
+from uuid import UUID
+
+import pytest
+from fastapi import status
+from sqlalchemy import event
+
+from app.models.category import Category
+from app.models.projection import Projection
+from app.models.projection_item import ProjectionItem
+from app.models.projection_override import ProjectionOverride
+from app.models.transaction import Transaction
+from app.models.user import User
+from tests.conftest import engine
+
+
+@contextmanager
+def count_queries():
+    """Conta os comandos SQL executados no banco de teste"""
+    statements = []
+
+    def before_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine.sync_engine, "before_cursor_execute", before_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", before_execute)
+
+
+def _projection(db, user, name, amounts):
+    projection = Projection(user_id=user.id, name=name, start_date=date(2025, 3, 1), end_date=date(2025, 3, 31))
+    db.add(projection)
+    db.flush()
+    for amount in amounts:
+        db.add(ProjectionItem(
+            user_id=user.id,
+            projection_id=projection.id,
+            date=date(2025, 3, 10),
+            description=f"{name} {amount}",
+            amount=Decimal(str(amount))
+        ))
+    db.commit()
+    return projection
+
+
+@pytest.fixture
+def projections(db, test_user):
+    return [
+        _projection(db, test_user, "Conservador", [5000, -1200, -300.5]),
+        _projection(db, test_user, "Vazio", []),
+    ]
+
+
+def test_list_projections_with_stats(client, auth_headers, projections):
+    """Testar estatísticas agregadas por cenário"""
+    response = client.get("/api/projections/", headers=auth_headers)
+    assert response.status_code == status.HTTP_200_OK
+
+    data = {p["name"]: p for p in response.json()}
+    assert data["Conservador"]["total_transactions"] == 3
+    assert data["Conservador"]["total_income"] == 5000
+    assert data["Conservador"]["total_expenses"] == 1500.5
+    assert data["Conservador"]["balance"] == 3499.5
+    assert data["Vazio"]["total_transactions"] == 0
+    assert data["Vazio"]["balance"] == 0
+    assert "_sa_instance_state" not in data["Vazio"]
+
+
+def test_list_projections_single_query(client, auth_headers, db, test_user, projections):
+    """Testar custo constante da listagem, qualquer que seja o número de cenários"""
+    client.get("/api/projections/", headers=auth_headers)   # Principal já em cache nas duas medições
+    with count_queries() as few:
+        client.get("/api/projections/", headers=auth_headers)
+
+    for i in range(5):
+        _projection(db, test_user, f"Extra {i}", [100, -50])
+
+    with count_queries() as many:
+        response = client.get("/api/projections/", headers=auth_headers)
+
+    assert len(response.json()) == 7
+    assert len(many) == len(few)
+
+
+def test_delete_projection_cascades_items(client, auth_headers, db, projections):
+    """Testar exclusão de cenário com itens (cascata pela sessão assíncrona)"""
+    conservative = projections[0]
+    response = client.delete(f"/api/projections/{conservative.id}", headers=auth_headers)
+    assert response.status_code == status.HTTP_204_NO_CONTENT
+
+    assert db.query(ProjectionItem).filter(ProjectionItem.projection_id == conservative.id).count() == 0
+    assert client.get(f"/api/projections/{conservative.id}", headers=auth_headers).status_code == 404
+
+
+def test_get_projection_uses_aggregate(client, auth_headers, projections):
+    """Testar detalhe do cenário e 404 para cenário inexistente"""
+    response = client.get(f"/api/projections/{projections[0].id}", headers=auth_headers)
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["total_transactions"] == 3
+
+    missing = client.get("/api/projections/00000000-0000-0000-0000-000000000000", headers=auth_headers)
+    assert missing.status_code == status.HTTP_404_NOT_FOUND
+
+
+def test_create_projection_from_month_range_with_scale(client, auth_headers, db, test_user):
+    """Testar cópia de vários meses com reajuste em um único INSERT ... SELECT"""
+    for day, amount in [
+        (date(2025, 1, 10), "-100.00"),
+        (date(2025, 2, 5), "-200.00"),
+        (date(2025, 2, 20), "3000.00"),
+        (date(2025, 3, 1), "-50.00"),     # Fora do período
+    ]:
+        db.add(Transaction(
+            user_id=test_user.id, date=day, description=f"origem {amount}", amount=Decimal(amount)
+        ))
+    _projection(db, test_user, "Outro cenário", [-999])   # Item de projeção: não copia
+
+    with count_queries() as statements:
+        response = client.post(
+            "/api/projections/from-month/2025/1",
+            params={"name": "Inflação", "months": 2, "scale": "1.05"},
+            headers=auth_headers
+        )
+
+    assert response.status_code == status.HTTP_200_OK
+    data = response.json()
+    assert data["start_date"] == "2025-01-01"
+    assert data["end_date"] == "2025-02-28"
+    assert "02/2025" in data["description"]
+
+    inserts = [s for s in statements if s.lstrip().upper().startswith("INSERT INTO PROJECTION_ITEMS")]
+    assert len(inserts) == 1
+    assert db.query(Transaction).count() == 4
+
+    copies = db.query(ProjectionItem).filter(ProjectionItem.projection_id == UUID(data["id"])).all()
+    assert sorted(float(t.amount) for t in copies) == [-210.0, -105.0, 3150.0]
+    assert all(t.is_projection and t.is_manual for t in copies)
+    assert len({t.id for t in copies}) == 3
+
+    stats = client.get(f"/api/projections/{data['id']}", headers=auth_headers).json()
+    assert stats["total_transactions"] == 3
+    assert stats["balance"] == 2835.0
+
+
+def test_create_projection_from_month_validates_month(client, auth_headers):
+    """Testar mês inválido"""
+    response = client.post("/api/projections/from-month/2025/13", params={"name": "X"}, headers=auth_headers)
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+@pytest.fixture
+def comparison_data(db, test_user):
+    from app.models.category import Category
+    from app.models.projection_rule import ProjectionRule
+
+    food = Category(user_id=test_user.id, name="Alimentação")
+    db.add(food)
+    db.flush()
+    for day, amount, category in [
+        (date(2025, 3, 3), "-100.00", food.id),     # Segunda-feira
+        (date(2025, 3, 9), "-50.00", food.id),      # Domingo da mesma semana
+        (date(2025, 4, 15), "4000.00", None),
+        (date(2025, 5, 2), "-999.00", food.id),     # Fora da janela
+    ]:
+        db.add(Transaction(user_id=test_user.id, date=day, description="real", amount=Decimal(amount), category_id=category))
+
+    base = Projection(user_id=test_user.id, name="Base", start_date=date(2025, 3, 1), end_date=date(2025, 4, 30))
+    other = Projection(user_id=test_user.id, name="Outro", start_date=date(2025, 4, 1), end_date=date(2025, 4, 30))
+    db.add_all([base, other])
+    db.flush()
+    db.add(ProjectionItem(
+        user_id=test_user.id, projection_id=base.id, date=date(2025, 3, 5), description="previsto",
+        amount=Decimal("-80.00"), category_id=food.id
+    ))
+    db.add(ProjectionRule(
+        user_id=test_user.id, projection_id=base.id, description="Salário", amount=Decimal("4500"),
+        frequency="monthly", interval=1, start_date=date(2025, 3, 5), growth_rate=Decimal("0")
+    ))
+    db.commit()
+    return base, other
+
+
+def test_compare_breakdown_by_category_and_month(client, auth_headers, comparison_data):
+    """Testar deltas por categoria e por mês, com regras no lado projetado"""
+    base, _ = comparison_data
+    data = client.get(f"/api/projections/{base.id}/compare", headers=auth_headers).json()
+
+    assert data["projection"]["total_income"] == 9000
+    assert data["projection"]["transactions_count"] == 3
+    assert data["real"]["total_income"] == 4000
+    assert data["real"]["total_expenses"] == 150
+    assert data["difference"]["balance"] == (9000 - 80) - (4000 - 150)
+
+    food = next(c for c in data["by_category"] if c["category"] == "Alimentação")
+    assert food["projection"]["total_expenses"] == 80
+    assert food["real"]["total_expenses"] == 150
+    assert food["difference"]["expenses"] == -70
+
+    assert [p["period"] for p in data["by_period"]] == ["2025-03", "2025-04"]
+    march = data["by_period"][0]
+    assert march["projection"]["balance"] == 4420
+    assert march["real"]["balance"] == -150
+
+
+def test_compare_by_week_and_several_projections(client, auth_headers, comparison_data):
+    """Testar semanas começando na segunda e vários cenários em uma consulta"""
+    base, other = comparison_data
+    with count_queries() as statements:
+        response = client.get(
+            "/api/projections/compare",
+            params={"projection_ids": [str(base.id), str(other.id)], "granularity": "week"},
+            headers=auth_headers
+        )
+    assert response.status_code == status.HTTP_200_OK
+    data = response.json()["projections"]
+    assert [p["name"] for p in data] == ["Base", "Outro"]
+
+    week = next(p for p in data[0]["by_period"] if p["period"] == "2025-03-03")
+    assert week["real"]["total_expenses"] == 150
+    assert week["projection"]["total_income"] == 4500
+
+    assert data[1]["real"]["total_income"] == 4000
+    assert data[1]["real"]["total_expenses"] == 0
+    assert len([s for s in statements if "FILTER (WHERE" in s.upper()]) == 1
+
+    missing = client.get(
+        "/api/projections/compare",
+        params={"projection_ids": [str(base.id), "00000000-0000-0000-0000-000000000000"]},
+        headers=auth_headers
+    )
+    assert missing.status_code == status.HTTP_404_NOT_FOUND
+
+
+def test_branch_is_copy_on_write(client, auth_headers, db, test_user):
+    """Testar variação sem cópia: herda itens, guarda só overrides e adições"""
+    base = _projection(db, test_user, "Base", [5000, -1200, -300])
+    items = {int(t.amount): t.id for t in db.query(ProjectionItem).filter(ProjectionItem.projection_id == base.id)}
+    stored = db.query(ProjectionItem).count()
+
+    with_car = client.post(f"/api/projections/{base.id}/branch", params={"name": "Com carro"}, headers=auth_headers).json()
+    assert with_car["parent_id"] == str(base.id)
+    assert db.query(ProjectionItem).count() == stored
+
+    # Adição própria + remoção e alteração de itens herdados
+    client.post("/api/transactions/", json={
+        "date": "2025-03-15", "description": "Parcela carro", "amount": "-900.00",
+        "is_projection": True, "projection_id": with_car["id"]
+    }, headers=auth_headers)
+    assert client.delete(f"/api/projections/{with_car['id']}/items/{items[-300]}", headers=auth_headers).status_code == 204
+    modified = client.put(
+        f"/api/projections/{with_car['id']}/items/{items[-1200]}", json={"amount": "-1300.00"}, headers=auth_headers
+    ).json()
+    assert modified["inherited"] is True and modified["modified"] is True
+
+    # Variação da variação: herda pela cadeia e altera de novo o mesmo item
+    raise_ = client.post(f"/api/projections/{with_car['id']}/branch", params={"name": "Carro + aumento"}, headers=auth_headers).json()
+    client.put(f"/api/projections/{raise_['id']}/items/{items[5000]}", json={"amount": "5500.00"}, headers=auth_headers)
+
+    def amounts(projection_id):
+        rows = client.get(f"/api/projections/{projection_id}/items", headers=auth_headers).json()
+        return sorted(float(r["amount"]) for r in rows)
+
+    assert amounts(base.id) == [-1200, -300, 5000]
+    assert amounts(with_car["id"]) == [-1300, -900, 5000]
+    assert amounts(raise_["id"]) == [-1300, -900, 5500]
+
+    stats = {p["name"]: p for p in client.get("/api/projections/", headers=auth_headers).json()}
+    assert stats["Base"]["balance"] == 3500
+    assert stats["Com carro"]["total_transactions"] == 3
+    assert stats["Com carro"]["balance"] == 2800
+    assert stats["Carro + aumento"]["balance"] == 3300
+
+    compare = client.get(f"/api/projections/{raise_['id']}/compare", headers=auth_headers).json()
+    assert compare["projection"]["balance"] == 3300
+
+    # Pai com variações não pode ser excluído
+    assert client.delete(f"/api/projections/{base.id}", headers=auth_headers).status_code == 409
+
+
+def test_item_rejects_foreign_category(client, auth_headers, db, test_user):
+    """Testar item próprio e herdado recusando categoria de outro usuário"""
+    other = User(email="outro@example.com", name="Outro", hashed_password="x")
+    db.add(other)
+    db.flush()
+    foreign = Category(user_id=other.id, name="Dele")
+    db.add(foreign)
+    base = _projection(db, test_user, "Base", [-1200])
+    item_id = db.query(ProjectionItem.id).filter(ProjectionItem.projection_id == base.id).scalar()
+    branch = client.post(f"/api/projections/{base.id}/branch", params={"name": "Variação"}, headers=auth_headers).json()
+
+    for projection_id in (base.id, branch["id"]):
+        response = client.put(
+            f"/api/projections/{projection_id}/items/{item_id}",
+            json={"category_id": str(foreign.id)}, headers=auth_headers
+        )
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    db.expire_all()
+    assert db.query(ProjectionItem).get(item_id).category_id is None
+    assert db.query(ProjectionOverride).count() == 0
+
+
+def test_overrides_stack_across_branch_levels(client, auth_headers, db, test_user):
+    """Testar edições em três níveis: cada campo vem do override mais próximo que o altera"""
+    base = _projection(db, test_user, "Base", [-1200])
+    item_id = db.query(ProjectionItem.id).filter(ProjectionItem.projection_id == base.id).scalar()
+
+    def branch(parent_id, name):
+        return client.post(f"/api/projections/{parent_id}/branch", params={"name": name}, headers=auth_headers).json()["id"]
+
+    def edit(projection_id, changes):
+        response = client.put(f"/api/projections/{projection_id}/items/{item_id}", json=changes, headers=auth_headers)
+        assert response.status_code == status.HTTP_200_OK
+        return response.json()
+
+    child = branch(base.id, "Filho")
+    grandchild = branch(child, "Neto")
+    great_grandchild = branch(grandchild, "Bisneto")
+
+    edit(child, {"amount": "-1300.00"})
+    renamed = edit(grandchild, {"description": "Aluguel novo"})
+    assert (float(renamed["amount"]), renamed["description"]) == (-1300, "Aluguel novo")
+
+    moradia = Category(user_id=test_user.id, name="Moradia")
+    db.add(moradia)
+    db.commit()
+    tagged = edit(great_grandchild, {"category_id": str(moradia.id)})
+    assert (float(tagged["amount"]), tagged["description"], tagged["category_id"]) == (-1300, "Aluguel novo", str(moradia.id))
+
+    # Override mais próximo ainda vence no mesmo campo
+    assert float(edit(grandchild, {"amount": "-1400.00"})["amount"]) == -1400
+    items = client.get(f"/api/projections/{great_grandchild}/items", headers=auth_headers).json()
+    assert [(float(i["amount"]), i["description"]) for i in items] == [(-1400, "Aluguel novo")]
+    assert float(client.get(f"/api/projections/{child}/items", headers=auth_headers).json()[0]["amount"]) == -1300
@@ -0,0 +1,136 @@
+"""
+Testes para o roteamento de leituras (réplica + ler o que acabou de escrever)
+"""
+import asyncio
+from datetime import date
+from decimal import Decimal
+
+import pytest
+from fastapi import status
+from sqlalchemy import create_engine
+from sqlalchemy.exc import InvalidRequestError
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import NullPool
+
+from app.main import app
+from app.core.deps import get_read_router
+from app.db.base import Base
+from app.db.routing import ReadRouter, RecentWrites
+from app.models.category import Category
+from app.models.transaction import Transaction
+from app.models.user import User
+from tests.conftest import engine, run_async
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def replica(tmp_path, test_user):
+    """Segundo banco SQLite com o usuário e uma receita que só existe nele"""
+    url = f"sqlite:///{tmp_path}/replica.db"
+    sync_engine = create_engine(url, poolclass=NullPool)
+    Base.metadata.create_all(bind=sync_engine)
+    with sync_engine.begin() as conn:
+        conn.execute(User.__table__.insert().values(
+            id=test_user.id, email=test_user.email, name=test_user.name,
+            hashed_password=test_user.hashed_password
+        ))
+        conn.execute(Transaction.__table__.insert().values(
+            user_id=test_user.id, date=date(2025, 1, 5), description="RÉPLICA",
+            amount=Decimal("100.00"), is_manual=False, is_projection=False
+        ))
+    sync_engine.dispose()
+
+    replica_engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path}/replica.db", poolclass=NullPool)
+    yield replica_engine
+    asyncio.run(replica_engine.dispose())
+
+
+def test_recent_writes_window():
+    """Testar janela de leitura no primário após escrita"""
+    clock = FakeClock()
+    writes = RecentWrites(window=5, clock=clock)
+    writes.mark("a")
+    assert writes.active("a")
+    assert not writes.active("b")
+
+    clock.now += 5
+    assert not writes.active("a")
+    writes.mark("b")
+    assert "a" not in writes._deadlines
+
+    router = ReadRouter(engine, engine, writes=writes)
+    assert router.target("b") == "primary"
+    assert router.target("a") == "replica"
+    assert ReadRouter(engine, writes=writes).target("a") == "primary"
+
+
+def test_reads_go_to_replica_until_user_writes(client, auth_headers, replica, metrics_registry):
+    """Testar estatísticas lidas da réplica e do primário logo após escrita do usuário"""
+    app.dependency_overrides[get_read_router] = lambda: ReadRouter(engine, replica)
+    metrics_registry.reset()
+
+    summary = client.get("/api/transactions/stats/summary", headers=auth_headers).json()
+    assert summary["total_income"] == 100.0
+
+    response = client.post(
+        "/api/transactions",
+        headers=auth_headers,
+        json={"date": "2025-01-20", "description": "MERCADO", "amount": -50.00, "is_manual": True}
+    )
+    assert response.status_code == status.HTTP_201_CREATED
+
+    summary = client.get("/api/transactions/stats/summary", headers=auth_headers).json()
+    assert summary["total_income"] == 0
+    assert summary["total_expenses"] == 50.0
+
+    counters = metrics_registry.snapshot()["counters"]
+    assert counters["db.routing.reads{target=replica}"] == 1
+    assert counters["db.routing.reads{target=primary}"] == 1
+
+
+def test_read_session_rejects_writes(db, test_user):
+    """Testar sessão de leitura recusando flush e escrita em massa"""
+    router = ReadRouter(engine)
+
+    async def add_category(_):
+        async with router.session(test_user.id) as session:
+            session.add(Category(user_id=test_user.id, name="Mercado"))
+            await session.flush()
+
+    with pytest.raises(InvalidRequestError):
+        run_async(add_category)
+    assert db.query(Category).count() == 0
+
+
+def test_analysis_uses_primary_ledger_version(client, auth_headers, db, test_user, replica, monkeypatch):
+    """Testar réplica atrasada: versão e resumo da análise vêm do primário"""
+    from app.services.llm_service import llm_service
+
+    app.dependency_overrides[get_read_router] = lambda: ReadRouter(engine, replica)
+    db.add_all([
+        Transaction(user_id=test_user.id, date=date.today(), description="MERCADO", amount=Decimal("-50.00")),
+        Transaction(user_id=test_user.id, date=date.today(), description="FARMÁCIA", amount=Decimal("-20.00")),
+    ])
+    db.commit()
+    db.refresh(test_user)
+
+    calls = []
+
+    async def fake_analyze(**kwargs):
+        calls.append(kwargs)
+        return "ok"
+
+    monkeypatch.setattr(llm_service, "check_availability", lambda: True)
+    monkeypatch.setattr(llm_service, "analyze_transactions", fake_analyze)
+
+    response = client.post("/api/ai/analyze", params={"question": "Onde economizar?"}, headers=auth_headers)
+    assert response.status_code == status.HTTP_200_OK
+    assert calls[0]["ledger_version"] == test_user.ledger_version > 0
+    assert "Total de transações: 2" in calls[0]["transactions_summary"]
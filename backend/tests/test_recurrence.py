@@ -0,0 +1,140 @@
+"""
+Testes para regras recorrentes dos cenários (expansão na consulta)
+"""
+from datetime import date
+from decimal import Decimal
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+from fastapi import status
+
+from app.models.category import Category
+from app.models.projection import Projection
+from app.models.projection_item import ProjectionItem
+from app.models.user import User
+from app.services.recurrence import anniversaries, expand, occurrence_dates
+
+
+def _rule(**kwargs):
+    defaults = dict(frequency="monthly", interval=1, start_date=date(2025, 1, 31), end_date=None,
+                    amount=Decimal("-100.00"), growth_rate=Decimal("0"))
+    return SimpleNamespace(**{**defaults, **kwargs})
+
+
+def test_monthly_dates_clamp_to_month_end():
+    """Testar dia 31 limitado ao fim do mês sem perder o dia nos meses longos"""
+    dates = occurrence_dates("monthly", 1, date(2024, 1, 31), date(2024, 5, 1))
+    assert [d.item() for d in dates] == [
+        date(2024, 1, 31), date(2024, 2, 29), date(2024, 3, 31), date(2024, 4, 30)
+    ]
+
+    weekly = occurrence_dates("weekly", 2, date(2025, 1, 1), date(2025, 2, 1))
+    assert [d.item().day for d in weekly] == [1, 15, 29]
+
+    yearly = occurrence_dates("yearly", 1, date(2024, 2, 29), date(2027, 12, 31))
+    assert [d.item() for d in yearly] == [date(2024, 2, 29), date(2025, 2, 28), date(2026, 2, 28), date(2027, 2, 28)]
+
+
+def test_growth_applies_on_anniversaries():
+    """Testar reajuste composto a cada aniversário do início da regra"""
+    dates = occurrence_dates("monthly", 1, date(2025, 3, 10), date(2027, 3, 10))
+    assert list(anniversaries(dates, date(2025, 3, 10))[[0, 11, 12, 24]]) == [0, 0, 1, 2]
+
+    occ = expand([_rule(start_date=date(2025, 3, 10), growth_rate=Decimal("0.10"))], None, date(2027, 3, 10))
+    assert len(occ) == 25
+    assert list(occ.amounts[[0, 12, 24]]) == [-100.0, -110.0, -121.0]
+
+
+def test_expand_respects_projection_window():
+    """Testar recorte pela janela do cenário e horizonte padrão de regra sem fim"""
+    rules = [_rule(start_date=date(2025, 1, 5)), _rule(start_date=date(2025, 1, 5), end_date=date(2025, 3, 31), amount=Decimal("50"))]
+    occ = expand(rules, date(2025, 2, 1), date(2025, 6, 30))
+    assert list(np.bincount(occ.rule_index)) == [5, 2]
+    assert occ.summary() == {"count": 7, "income": 100.0, "expenses": 500.0}
+
+    unbounded = expand([_rule(start_date=date(2025, 1, 5))], max_years=2)
+    assert len(unbounded) == 24
+
+
+@pytest.fixture
+def car_projection(db, test_user):
+    projection = Projection(user_id=test_user.id, name="Carro", start_date=date(2025, 1, 1), end_date=date(2029, 12, 31))
+    db.add(projection)
+    db.flush()
+    db.add(ProjectionItem(
+        user_id=test_user.id, projection_id=projection.id, date=date(2025, 1, 2),
+        description="Entrada", amount=Decimal("-10000")
+    ))
+    db.commit()
+    return projection
+
+
+def test_rule_endpoints_feed_stats_and_compare(client, auth_headers, db, car_projection):
+    """Testar cenário de 5 anos com uma regra em vez de 60 transações"""
+    url = f"/api/projections/{car_projection.id}/rules"
+    response = client.post(url, json={
+        "description": "Parcela do carro",
+        "amount": "-1500.00",
+        "frequency": "monthly",
+        "start_date": "2025-01-10",
+        "growth_rate": "0.05"
+    }, headers=auth_headers)
+    assert response.status_code == status.HTTP_201_CREATED
+    rule_id = response.json()["id"]
+
+    assert db.query(ProjectionItem).filter(ProjectionItem.projection_id == car_projection.id).count() == 1
+
+    stats = client.get(f"/api/projections/{car_projection.id}", headers=auth_headers).json()
+    assert stats["total_rules"] == 1
+    assert stats["total_transactions"] == 61
+    # 12 parcelas por ano: 1500, 1575, 1653.75, 1736.44, 1823.26
+    assert stats["total_expenses"] == pytest.approx(10000 + 12 * (1500 + 1575 + 1653.75 + 1736.44 + 1823.26), abs=0.01)
+
+    compare = client.get(f"/api/projections/{car_projection.id}/compare", headers=auth_headers).json()
+    assert compare["projection"]["transactions_count"] == 61
+    assert compare["projection"]["total_expenses"] == stats["total_expenses"]
+
+    occurrences = client.get(
+        f"/api/projections/{car_projection.id}/occurrences",
+        params={"start_date": "2026-01-01", "end_date": "2026-03-31"},
+        headers=auth_headers
+    ).json()
+    assert [o["date"] for o in occurrences["occurrences"]] == ["2026-01-10", "2026-02-10", "2026-03-10"]
+    assert occurrences["occurrences"][0]["amount"] == -1575.0
+
+    invalid = client.put(f"{url}/{rule_id}", json={"end_date": "2024-01-01"}, headers=auth_headers)
+    assert invalid.status_code == status.HTTP_400_BAD_REQUEST
+
+    assert client.delete(f"{url}/{rule_id}", headers=auth_headers).status_code == status.HTTP_204_NO_CONTENT
+    assert client.get(url, headers=auth_headers).json() == []
+
+
+def test_rule_rejects_nulls_and_foreign_categories(client, auth_headers, db, car_projection):
+    """Testar null em campo obrigatório (422) e categoria de outro usuário (404)"""
+    other = User(email="outro@example.com", name="Outro", hashed_password="x")
+    db.add(other)
+    db.flush()
+    foreign = Category(user_id=other.id, name="Dele")
+    own = Category(user_id=car_projection.user_id, name="Carro")
+    db.add_all([foreign, own])
+    db.commit()
+
+    url = f"/api/projections/{car_projection.id}/rules"
+    body = {"description": "Seguro", "amount": "-200.00", "start_date": "2025-01-10"}
+    assert client.post(
+        url, json={**body, "category_id": str(foreign.id)}, headers=auth_headers
+    ).status_code == status.HTTP_404_NOT_FOUND
+
+    rule_id = client.post(url, json={**body, "category_id": str(own.id)}, headers=auth_headers).json()["id"]
+    for field in ("start_date", "amount", "frequency"):
+        response = client.put(f"{url}/{rule_id}", json={field: None}, headers=auth_headers)
+        assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+    assert client.put(
+        f"{url}/{rule_id}", json={"category_id": str(foreign.id)}, headers=auth_headers
+    ).status_code == status.HTTP_404_NOT_FOUND
+
+    # Campos anuláveis continuam aceitando null
+    response = client.put(f"{url}/{rule_id}", json={"category_id": None, "end_date": None}, headers=auth_headers)
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["category_id"] is None
@@ -158,3 +158,74 @@ def test_unauthorized_access(client):
     """Testar acesso não autorizado"""
     response = client.get("/api/transactions")
     assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+
+def test_projection_items_compatibility(client, auth_headers, db):
+    """Testar itens de projeção servidos pelos endpoints de transação, fora da tabela real"""
+    from app.models.projection_item import ProjectionItem
+    from app.models.transaction import Transaction
+
+    projection = client.post("/api/projections/", json={"name": "Cenário"}, headers=auth_headers).json()
+    response = client.post(
+        "/api/transactions",
+        headers=auth_headers,
+        json={
+            "date": "2025-02-01",
+            "description": "Projetada",
+            "amount": -50.00,
+            "is_projection": True,
+            "projection_id": projection["id"]
+        }
+    )
+    assert response.status_code == status.HTTP_201_CREATED
+    item = response.json()
+    assert item["is_projection"] is True
+    assert db.query(Transaction).count() == 0
+    assert db.query(ProjectionItem).count() == 1
+
+    listed = client.get("/api/transactions?is_projection=true", headers=auth_headers).json()
+    assert [t["id"] for t in listed["transactions"]] == [item["id"]]
+    assert client.get("/api/transactions?is_projection=false", headers=auth_headers).json()["total"] == 0
+
+    summary = client.get("/api/transactions/stats/summary?is_projection=true", headers=auth_headers).json()
+    assert summary["total_expenses"] == 50
+
+    updated = client.put(f"/api/transactions/{item['id']}", json={"amount": -75.00}, headers=auth_headers)
+    assert updated.json()["amount"] == "-75.00"
+    assert client.delete(f"/api/transactions/{item['id']}", headers=auth_headers).status_code == status.HTTP_204_NO_CONTENT
+    assert db.query(ProjectionItem).count() == 0
+
+
+def test_projection_item_writes_respect_branches_and_categories(client, auth_headers, db):
+    """Testar item compartilhado com variações (409) e categoria de outro usuário (404)"""
+    from app.models.category import Category
+    from app.models.projection_item import ProjectionItem
+    from app.models.user import User
+
+    other = User(email="outro@example.com", name="Outro", hashed_password="x")
+    db.add(other)
+    db.flush()
+    foreign = Category(user_id=other.id, name="Dele")
+    db.add(foreign)
+    db.commit()
+
+    projection = client.post("/api/projections/", json={"name": "Cenário"}, headers=auth_headers).json()
+    body = {"date": "2025-02-01", "description": "Projetada", "amount": -50.00,
+            "is_projection": True, "projection_id": projection["id"]}
+    assert client.post(
+        "/api/transactions", json={**body, "category_id": str(foreign.id)}, headers=auth_headers
+    ).status_code == status.HTTP_404_NOT_FOUND
+    item = client.post("/api/transactions", json=body, headers=auth_headers).json()
+    assert client.put(
+        f"/api/transactions/{item['id']}", json={"category_id": str(foreign.id)}, headers=auth_headers
+    ).status_code == status.HTTP_404_NOT_FOUND
+
+    # Com uma variação herdando o item, alterar ou remover por aqui pularia o copy-on-write
+    client.post(f"/api/projections/{projection['id']}/branch", params={"name": "Variação"}, headers=auth_headers)
+    assert client.put(
+        f"/api/transactions/{item['id']}", json={"amount": -75.00}, headers=auth_headers
+    ).status_code == status.HTTP_409_CONFLICT
+    assert client.delete(f"/api/transactions/{item['id']}", headers=auth_headers).status_code == status.HTTP_409_CONFLICT
+
+    stored = db.query(ProjectionItem).one()
+    assert (stored.amount, stored.category_id) == (Decimal("-50.00"), None)
@@ -18,6 +18,7 @@ export function ChatWidget() {
   const [input, setInput] = useState("");
   const [loading, setLoading] = useState(false);
   const [aiAvailable, setAiAvailable] = useState<boolean | null>(null);
+  const [sessionId, setSessionId] = useState<string | null>(null);
   const messagesEndRef = useRef<HTMLDivElement>(null);
 
   useEffect(() => {
@@ -57,13 +58,16 @@ export function ChatWidget() {
           Authorization: `Bearer ${token}`,
           "Content-Type": "application/json",
         },
-        body: JSON.stringify({
-          message: input,
-          conversation_history: messages,
-        }),
+        // Com sessão aberta o histórico é carregado pelo servidor
+        body: JSON.stringify(
+          sessionId
+            ? { message: input, session_id: sessionId }
+            : { message: input, conversation_history: messages }
+        ),
       });
 
       const data = await response.json();
+      if (data.session_id) setSessionId(data.session_id);
 
       const assistantMessage: Message = {
         role: "assistant",